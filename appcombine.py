@@ -1,8 +1,8 @@
 # app.py
 import streamlit as st
 import pandas as pd
+import os
 from io import BytesIO
-import traceback # Important pour afficher les erreurs détaillées
 import numpy as np # Importation de numpy pour gérer l'infini
 
 # --- Configuration de la Page ---
@@ -20,39 +20,35 @@ except ImportError:
     st.error("ERREUR CRITIQUE: Le fichier 'combainaisonexceldescente.py' est introuvable.")
     st.info("Veuillez vous assurer que ce fichier se trouve dans le même dossier que 'app.py'.")
     st.stop()
+import cache_simulation
+import ingestion
+import jobs_simulation
+
+INGESTION_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_donnees')
+CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.points_reprise')
 
 # --- Fonctions Utilitaires ---
 
 @st.cache_data # Mise en cache pour ne pas recharger les fichiers à chaque action
 def load_and_clean_data(relations_file, origins_file, destinations_file):
-    """Charge et nettoie les données à partir des fichiers CSV téléversés."""
+    """Charge et nettoie les données à partir des fichiers CSV téléversés (instantané Parquet réutilisé si les fichiers sont identiques)."""
     try:
-        def clean_numeric_column(series):
-            return pd.to_numeric(series.astype(str).str.replace('\u202f', '', regex=False).str.replace(',', '.', regex=False).str.strip(), errors='coerce')
-
-        relations_df = pd.read_csv(relations_file, dtype=str)
-        relations_df['origin'] = relations_df['origin'].str.strip()
-        relations_df['destination'] = relations_df['destination'].str.strip()
-        relations_df['distance_km'] = clean_numeric_column(relations_df['distance_km'])
-        relations_df['profitability'] = clean_numeric_column(relations_df['profitability'])
-
-        origins_df_raw = pd.read_csv(origins_file, dtype=str)
-        origins_df_raw['id'] = origins_df_raw['id'].str.strip()
-        origins_df_raw['daily_loading_capacity_tons'] = clean_numeric_column(origins_df_raw['daily_loading_capacity_tons'])
-        origins_df_raw['initial_available_product_tons'] = clean_numeric_column(origins_df_raw['initial_available_product_tons'])
-        origins_df = origins_df_raw.set_index('id')
-
-        destinations_df_raw = pd.read_csv(destinations_file, dtype=str)
-        destinations_df_raw['id'] = destinations_df_raw['id'].str.strip()
-        destinations_df_raw['daily_unloading_capacity_tons'] = clean_numeric_column(destinations_df_raw['daily_unloading_capacity_tons'])
-        destinations_df_raw['annual_demand_tons'] = clean_numeric_column(destinations_df_raw['annual_demand_tons'])
-        destinations_df = destinations_df_raw.set_index('id')
-
+        relations_df, origins_df, destinations_df = ingestion.load_network(relations_file, origins_file, destinations_file, cache_dir=INGESTION_CACHE_DIR)
+        for message in ingestion.validate_network(relations_df, origins_df, destinations_df): st.warning(f"⚠️ {message}")
         return relations_df, origins_df, destinations_df
     except Exception as e:
         st.error(f"Erreur lors de la lecture des fichiers CSV : {e}")
         return None, None, None
 
+@st.cache_resource # Un seul cache de résultats partagé par toutes les sessions
+def get_simulation_cache():
+    """Cache des résultats de simulation (mémoire + disque) partagé entre les relances du script."""
+    return cache_simulation.SimulationCache(cache_dir=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_simulation'))
+
+@st.cache_resource # Pool de travaux en arrière-plan partagé par toutes les sessions
+def get_job_manager():
+    return jobs_simulation.JobManager(max_workers=2)
+
 def generate_list_from_config(df, config_tuple):
     """Génère une liste d'identifiants triée selon une configuration."""
     sort_column, ascending_order = config_tuple
@@ -72,11 +68,91 @@ def create_excel_download_link(sim_results, origins_initial_df, destinations_ini
     sim.ecrire_resultats_excel(output, "resultats_simulation", sim_results, origins_initial_df, destinations_initial_df)
     return output.getvalue()
 
+def get_excel_report_builder(sim_results, origins_initial_df, destinations_initial_df):
+    """Renvoie une fonction sans argument produisant le rapport Excel : généré au premier téléchargement, puis conservé pour ce résultat."""
+    report = st.session_state.get('excel_report')
+    if report is None or report['results'] is not sim_results:
+        report = st.session_state.excel_report = {'results': sim_results, 'bytes': None}
+    def build_report():
+        if report['bytes'] is None: report['bytes'] = create_excel_download_link(sim_results, origins_initial_df, destinations_initial_df)
+        return report['bytes']
+    return build_report
+
+CHART_MAX_BARS = 50  # Au-delà, les graphiques en barres ne montrent que les premières valeurs
+TRANSPORT_PAGE_SIZES = (100, 500, 1000, 5000)
+
+def float_columns_config(df, fmt="%.2f"):
+    """Format d'affichage des colonnes réelles pour st.dataframe (au lieu de Styler, qui convertit chaque cellule en HTML)."""
+    return {name: st.column_config.NumberColumn(format=fmt) for name in df.columns if pd.api.types.is_float_dtype(df[name])}
+
+def build_results_views(sim_results, initial_orig_df):
+    """Tables dérivées des résultats (agrégats des graphiques, indicateurs des origines, journal des wagons), calculées en vectoriel."""
+    views = {}
+    shipments_df = sim_results.get('shipments_df'); final_dest_df = sim_results.get('final_destinations_df'); final_orig_df = sim_results.get('final_origins_df')
+    if shipments_df is not None and not shipments_df.empty:
+        views['tons_per_dest'] = shipments_df.groupby('destination', observed=True)['quantity_tons'].sum().sort_values(ascending=False)
+        views['tons_per_origin'] = shipments_df.groupby('origin', observed=True)['quantity_tons'].sum().sort_values(ascending=False)
+        views['tons_per_day'] = shipments_df.groupby('ship_day')['quantity_tons'].sum()
+        views['filter_options'] = {name: sorted(shipments_df[name].unique().tolist(), key=str) for name in ('origin', 'destination', 'type')}
+    if final_dest_df is not None and all(c in final_dest_df.columns for c in ['annual_demand_tons', 'delivered_so_far_tons']):
+        demand = final_dest_df['annual_demand_tons']
+        views['satisfaction_rate'] = (final_dest_df['delivered_so_far_tons'] / demand * 100).where(demand > 0, 0).fillna(0).rename('satisfaction_rate')
+    col_stock_initial = col_stock_final = 'initial_available_product_tons'
+    if final_orig_df is not None and initial_orig_df is not None and col_stock_initial in initial_orig_df.columns and col_stock_final in final_orig_df.columns:
+        origins_display_df = final_orig_df.copy()
+        origins_display_df['stock_initial_t'] = initial_orig_df[col_stock_initial]
+        origins_display_df['stock_final_t'] = origins_display_df[col_stock_final]
+        origins_display_df['stock_utilise_t'] = origins_display_df['stock_initial_t'] - origins_display_df['stock_final_t']
+        origins_display_df['utilisation_stock_%'] = (origins_display_df['stock_utilise_t'] / origins_display_df['stock_initial_t'] * 100).where(origins_display_df['stock_initial_t'] > 0, 0)
+        days_sim = sim_results.get('days_taken_simulation_loop')
+        if 'tons_per_origin' in views and days_sim is not None and days_sim > 0:
+            daily_flow = origins_display_df.index.map(views['tons_per_origin'] / days_sim).to_series(index=origins_display_df.index).fillna(0)
+            origins_display_df['autonomie_restante_j'] = (origins_display_df['stock_final_t'] / daily_flow).where(daily_flow > 0, np.inf)
+        else:
+            origins_display_df['autonomie_restante_j'] = np.nan
+        cols_to_display = ['stock_initial_t', 'stock_final_t', 'stock_utilise_t', 'utilisation_stock_%', 'autonomie_restante_j', 'daily_loading_capacity_tons']
+        final_cols_order = [c for c in cols_to_display if c in origins_display_df.columns]
+        views['origins_display'] = origins_display_df[final_cols_order + [c for c in origins_display_df.columns if c not in final_cols_order]]
+    wagon_log = (sim_results.get('final_tracking_vars') or {}).get('daily_wagon_log')
+    views['wagon_log'] = pd.DataFrame(wagon_log) if wagon_log is not None else None
+    return views
+
+def get_results_views(sim_results, initial_orig_df):
+    """Tables dérivées des résultats affichés : calculées une fois par résultat et conservées dans la session."""
+    views = st.session_state.get('results_views')
+    if views is None or views['results'] is not sim_results:
+        views = st.session_state.results_views = {'results': sim_results, 'tables': build_results_views(sim_results, initial_orig_df), 'filtered': None}
+    return views
+
+def filtered_shipments(views, shipments_df, origins, destinations, types, day_range):
+    """Expéditions correspondant aux filtres (masques vectoriels) ; le dernier résultat filtré est conservé."""
+    key = (tuple(origins), tuple(destinations), tuple(types), day_range)
+    if views['filtered'] is None or views['filtered'][0] != key:
+        mask = np.ones(len(shipments_df), dtype=bool)
+        if origins: mask &= shipments_df['origin'].isin(origins).to_numpy()
+        if destinations: mask &= shipments_df['destination'].isin(destinations).to_numpy()
+        if types: mask &= shipments_df['type'].isin(types).to_numpy()
+        if day_range is not None: mask &= shipments_df['ship_day'].between(*day_range).to_numpy()
+        views['filtered'] = (key, shipments_df if mask.all() else shipments_df[mask])
+    return views['filtered'][1]
+
+def parse_checkpoint_days(text):
+    """Jours de reprise saisis (« 30, 60, 90 ») triés et sans doublon ; ValueError si un jour n'est pas un entier positif."""
+    days = sorted({int(part) for part in text.replace(';', ',').replace(' ', ',').split(',') if part})
+    if not days or days[0] < 1: raise ValueError(text)
+    return days
+
 # --- Initialisation de l'état de la session ---
 if 'results' not in st.session_state:
     st.session_state.results = None
 if 'initial_data' not in st.session_state:
     st.session_state.initial_data = None
+if 'network_data' not in st.session_state:
+    st.session_state.network_data = None
+if 'active_job_id' not in st.session_state:
+    st.session_state.active_job_id = None
+if 'job_error' not in st.session_state:
+    st.session_state.job_error = None
 
 # ==============================================================================
 # --- INTERFACE UTILISATEUR (UI) ---
@@ -97,18 +173,25 @@ with st.sidebar:
         relations_df_raw, origins_df_raw, destinations_df_raw = load_and_clean_data(relations_file, origins_file, destinations_file)
         
         # Copie des dataframes pour éviter la corruption du cache
-        relations_df = relations_df_raw.copy()
-        origins_df = origins_df_raw.copy()
-        destinations_df = destinations_df_raw.copy()
+        relations_df, origins_df, destinations_df = [df.copy() if df is not None else None for df in (relations_df_raw, origins_df_raw, destinations_df_raw)]
         
         if relations_df is not None:
             st.success("✅ Fichiers chargés.")
             
             st.subheader("2. Paramètres Globaux")
             num_wagons = st.number_input("Nombre de wagons initiaux", min_value=10, max_value=5000, value=500, step=10)
+            profiling_enabled = st.checkbox("Mesurer les performances (onglet Diagnostics)", value=False)
+            upper_bound_enabled = st.checkbox("Comparer à la borne supérieure (programme linéaire)", value=False,
+                                              help="Résout aussi le programme linéaire du réseau : son optimum majore le profit de toute simulation H1 / H2.")
+            checkpoints_enabled = st.checkbox("Enregistrer des points de reprise (branches « et si »)", value=False,
+                                              help="Sauvegarde l'état de la simulation au début des jours indiqués : on peut ensuite relancer la fin de la simulation depuis l'un de ces jours avec d'autres paramètres.")
+            checkpoint_days_text = st.text_input("Jours de reprise", value="30, 60, 90, 120, 150, 180", disabled=not checkpoints_enabled)
+            try: checkpoint_days = parse_checkpoint_days(checkpoint_days_text) if checkpoints_enabled else None
+            except ValueError: checkpoint_days = None; st.warning("⚠️ Jours de reprise invalides (entiers positifs séparés par des virgules).")
             
             st.subheader("3. Choix de l'Heuristique")
-            heuristique_choice = st.radio("Heuristique à utiliser :", ("H1", "H2"), horizontal=True)
+            heuristique_choice = st.radio("Heuristique à utiliser :", ("H1", "H2", "Planificateur LP"), horizontal=True,
+                                          help="Le planificateur LP optimise toutes les expéditions de l'horizon en une résolution (les ordres de priorité ne s'appliquent pas).")
             
             st.subheader("4. Stratégie de Priorisation")
             sort_options = {
@@ -121,44 +204,99 @@ with st.sidebar:
             qmin_sort_choice = st.selectbox("Ordre de priorité pour QMIN (Phase 1):", sort_options.keys(), key="qmin_order")
             phase2_sort_choice = st.selectbox("Ordre de priorité pour expéditions (Phase 2):", sort_options.keys(), key="phase2_order")
             
-            if st.button("🚀 Lancer la Simulation", use_container_width=True, type="primary"):
+            st.subheader("5. Optimisation (optionnelle)")
+            optimize_orders = st.checkbox("Optimiser les ordres de priorité", value=False, disabled=heuristique_choice == "Planificateur LP",
+                                          help="Part des ordres choisis ci-dessus et les modifie tant que le profit augmente.")
+            search_methods = {
+                "Montée complète (échanges)": None,
+                "Première amélioration (budget)": 'first_improvement',
+                "Voisinage échantillonné (budget)": 'sampled',
+                "Recuit simulé (budget)": 'annealing',
+                "Recherche tabou (budget)": 'tabu',
+            }
+            search_choice = st.selectbox("Méthode", search_methods.keys(), disabled=not optimize_orders,
+                                         help="La montée complète évalue tous les échanges à chaque itération ; les autres méthodes tirent les voisins (échange, insertion, inversion) un par un et s'arrêtent au budget de temps.")
+            if search_methods[search_choice] is None:
+                max_iterations = st.number_input("Itérations maximales", min_value=1, max_value=50, value=5, step=1, disabled=not optimize_orders)
+            else:
+                time_budget_s = st.number_input("Budget de temps (secondes)", min_value=5, max_value=3600, value=60, step=5, disabled=not optimize_orders)
+
+            st.subheader("6. Dimensionnement de la flotte (optionnel)")
+            size_fleet = st.checkbox("Chercher la plus petite flotte satisfaisant la demande", value=False,
+                                     disabled=heuristique_choice == "Planificateur LP" or optimize_orders,
+                                     help="Recherche exponentielle à partir du nombre de wagons initial puis dichotomie ; les tailles candidates sont simulées en parallèle. La simulation affichée utilise la flotte trouvée.")
+            max_fleet = st.number_input("Flotte maximale", min_value=10, max_value=20000, value=5000, step=100, disabled=not size_fleet)
+
+            active_job = get_job_manager().get(st.session_state.active_job_id) if st.session_state.active_job_id else None
+            if st.button("🚀 Lancer la Simulation", use_container_width=True, type="primary", disabled=active_job is not None and not active_job.finished):
                 qmin_config = sort_options[qmin_sort_choice]
                 phase2_config = sort_options[phase2_sort_choice]
                 
                 # Sauvegarde des données initiales PURES avant toute modification
                 st.session_state.initial_data = (origins_df.copy(), destinations_df.copy())
-
-                with st.spinner("Simulation en cours..."):
-                    try:
-                        if heuristique_choice == "H1":
-                            results = sim.run_simulation_h1(
-                                relations_df, origins_df.copy(), destinations_df.copy(),
-                                qmin_common_config=qmin_config,
-                                phase2_config=phase2_config,
-                                num_initial_wagons_param=num_wagons,
-                                silent_mode=True
-                            )
-                        else: # Heuristique H2
-                            qmin_list = generate_list_from_config(destinations_df, qmin_config)
-                            phase2_list = generate_list_from_config(destinations_df, phase2_config)
-                            results = sim.run_simulation_h2(
-                                relations_df, origins_df.copy(), destinations_df.copy(),
-                                qmin_user_priority_order=qmin_list,
-                                standard_shipment_dest_priority_order=phase2_list,
-                                num_initial_wagons_param=num_wagons,
-                                silent_mode=True
-                            )
-                        
-                        st.session_state.results = results
-                        
-                    except Exception as e:
-                        st.error(f"❌ Une erreur est survenue pendant la simulation :")
-                        st.error(str(e))
-                        st.code(traceback.format_exc())
-                        st.session_state.results = None
-                
+                st.session_state.job_error = None
+                # Points de reprise pour les simulations simples uniquement (ni planificateur LP ni optimisation)
+                checkpoint_options = ({'checkpoint_days': checkpoint_days, 'checkpoint_dir': CHECKPOINT_DIR}
+                                      if checkpoint_days and heuristique_choice != "Planificateur LP" and not optimize_orders else {})
+                st.session_state.network_data = (relations_df.copy(), origins_df.copy(), destinations_df.copy()) if checkpoint_options else None
+
+                # Travail en arrière-plan : la page reste utilisable, la progression s'affiche ci-contre
+                heuristic = 'h1' if heuristique_choice == "H1" else 'h2'
+                simulation_cache = get_simulation_cache()
+                if heuristique_choice == "Planificateur LP":
+                    job = get_job_manager().submit("Planificateur LP", jobs_simulation.planner_job, relations_df, origins_df, destinations_df, num_wagons)
+                elif size_fleet and not optimize_orders:
+                    job = get_job_manager().submit(
+                        f"Dimensionnement {heuristique_choice}", jobs_simulation.fleet_sizing_job, simulation_cache, heuristic,
+                        relations_df, origins_df, destinations_df,
+                        *((qmin_config, phase2_config) if heuristic == 'h1' else (generate_list_from_config(destinations_df, qmin_config), generate_list_from_config(destinations_df, phase2_config))),
+                        int(max_fleet), start_wagons=int(num_wagons)
+                    )
+                elif optimize_orders:
+                    job = get_job_manager().submit(
+                        f"Optimisation {heuristique_choice}", jobs_simulation.optimization_job, simulation_cache, heuristic,
+                        relations_df, origins_df, destinations_df,
+                        generate_list_from_config(destinations_df, qmin_config), generate_list_from_config(destinations_df, phase2_config),
+                        num_wagons, upper_bound=upper_bound_enabled, **({'max_iterations': int(max_iterations)} if search_methods[search_choice] is None
+                                       else {'search': {'strategy': search_methods[search_choice], 'time_budget_s': float(time_budget_s)}})
+                    )
+                elif heuristic == 'h1':
+                    job = get_job_manager().submit(
+                        "Simulation H1", jobs_simulation.simulation_job, simulation_cache, 'h1', relations_df, origins_df, destinations_df,
+                        qmin_config, phase2_config, num_wagons, profiling=profiling_enabled, upper_bound=upper_bound_enabled, **checkpoint_options
+                    )
+                else: # Heuristique H2
+                    qmin_list = generate_list_from_config(destinations_df, qmin_config)
+                    phase2_list = generate_list_from_config(destinations_df, phase2_config)
+                    job = get_job_manager().submit(
+                        "Simulation H2", jobs_simulation.simulation_job, simulation_cache, 'h2', relations_df, origins_df, destinations_df,
+                        qmin_list, phase2_list, num_wagons, profiling=profiling_enabled, upper_bound=upper_bound_enabled, **checkpoint_options
+                    )
+                st.session_state.active_job_id = job.job_id
                 st.rerun()
 
+@st.fragment(run_every=1.0)
+def show_active_job():
+    """Progression du travail en cours ; à la fin, le résultat est rangé dans la session et la page est redessinée."""
+    job = get_job_manager().get(st.session_state.active_job_id) if st.session_state.active_job_id else None
+    if job is None: return
+    if not job.finished:
+        st.progress(job.progress, text=f"⏳ {job.label} — {job.stage} ({job.progress:.0%})")
+        if st.button("⛔ Annuler", key=f"cancel_job_{job.job_id}"): job.cancel()
+        return
+    if job.status == jobs_simulation.JOB_DONE: st.session_state.results = job.result
+    elif job.status == jobs_simulation.JOB_FAILED: st.session_state.job_error = job.error
+    else: st.session_state.job_error = None; st.session_state.job_cancelled = True
+    st.session_state.active_job_id = None; get_job_manager().forget(job.job_id)
+    st.rerun()
+
+show_active_job()
+if st.session_state.job_error:
+    st.error("❌ Une erreur est survenue pendant la simulation :")
+    st.code(st.session_state.job_error)
+if st.session_state.pop('job_cancelled', False):
+    st.warning("Travail annulé.")
+
 if not (relations_file and origins_file and destinations_file):
     st.info("👋 Bienvenue ! Veuillez téléverser vos 3 fichiers CSV dans la barre latérale pour commencer.")
 
@@ -171,19 +309,93 @@ if st.session_state.results:
     st.header("📊 Résultats de la Simulation")
 
     # KPIs
+    base = res.get('branch', {}).get('base')
     col1, col2, col3 = st.columns(3)
-    col1.metric("Profit Final (Tonnes * km)", f"{res.get('profit', 0):,.0f}".replace(',', ' '))
-    col2.metric("Jours de simulation", f"{res.get('days_taken_simulation_loop', 'N/A')}")
+    col1.metric("Profit Final (Tonnes * km)", f"{res.get('profit', 0):,.0f}".replace(',', ' '),
+                delta=f"{res['profit'] - base['profit']:+,.0f} vs base".replace(',', ' ') if base else None)
+    col2.metric("Jours de simulation", f"{res.get('days_taken_simulation_loop', 'N/A')}",
+                delta=f"{res['days_taken_simulation_loop'] - base['days_taken_simulation_loop']:+d} vs base" if base else None, delta_color="inverse")
     col3.metric("Demande satisfaite ?", "✅ Oui" if res.get('all_demand_met', False) else "❌ Non")
+
+    planner = res.get('planner')
+    if planner:
+        bound = planner['upper_bound']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Borne supérieure LP (Tonnes * km)", f"{bound:,.0f}".replace(',', ' '))
+        col2.metric("Écart à la borne", f"{(bound - res.get('profit', 0)) / bound:.1%}" if bound > 0 else "N/A")
+        col3.metric("Profit du plan LP", f"{planner['plan_profit']:,.0f}".replace(',', ' '))
+        st.caption(f"Programme linéaire : {planner['iterations']} itérations en {planner['seconds']:.1f} s ; la borne majore le profit de toute simulation H1 / H2 avec la même flotte.")
+        if not planner.get('converged', True):
+            st.warning(f"Le programme linéaire n'a pas convergé en {planner['iterations']} itérations (dépassement des contraintes : {planner['max_violation']:.1%}) : "
+                       "la borne reste valable mais peut être large, et le plan LP n'est pas optimal.")
+
+    optimization = res.get('optimization')
+    if optimization:
+        title = (f"montée, {optimization['max_iterations']} itérations max." if optimization['method'] == 'hill_climbing'
+                 else f"recherche {optimization['method']}, {optimization['evaluations']} évaluations")
+        with st.expander(f"🧭 Ordres retenus ({title})"):
+            st.write("**Ordre QMIN :** " + ", ".join(map(str, optimization['qmin_order'])))
+            st.write("**Ordre Phase 2 :** " + ", ".join(map(str, optimization['phase2_order'])))
+
+    fleet_sizing = res.get('fleet_sizing')
+    if fleet_sizing:
+        with st.expander(f"🚃 Dimensionnement de la flotte ({fleet_sizing['evaluations']} simulations)", expanded=True):
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Plus petite flotte satisfaisant la demande", fleet_sizing['min_fleet_all_demand_met'] or "Aucune")
+            col2.metric("Flotte de saturation", fleet_sizing['saturation_fleet'] or "Non atteinte",
+                        help="À partir de cette flotte, des wagons restent toujours disponibles : les résultats ne changent plus.")
+            best = fleet_sizing['best_profit_per_wagon']
+            col3.metric("Meilleur profit par wagon", f"{best['profit_per_wagon']:,.0f}".replace(',', ' '), delta=f"{best['num_wagons']} wagons", delta_color="off")
+            curve = fleet_sizing['curve']
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**Profit selon la flotte**"); st.line_chart(curve.set_index('num_wagons')['profit'])
+            with col2:
+                st.write("**Jours de simulation selon la flotte**"); st.line_chart(curve.set_index('num_wagons')['days_taken_simulation_loop'])
+            st.dataframe(curve, column_config=float_columns_config(curve, "%.0f"), hide_index=True)
+            st.caption(f"Résultats ci-dessous : simulation complète avec {fleet_sizing['num_wagons']} wagons. La recherche suppose que la demande, "
+                       "satisfaite avec une flotte, l'est aussi avec toute flotte plus grande.")
+
+    checkpoints = res.get('checkpoints')
+    if checkpoints and st.session_state.network_data:
+        branch = res.get('branch')
+        with st.expander("🔀 Branche « et si » depuis un point de reprise", expanded=branch is not None):
+            if branch:
+                changes = [f"{branch['extra_wagons']:+d} wagons"] if branch['extra_wagons'] else []
+                changes += [f"chargement {o} : {c:.0f} t/j" for o, c in branch['origin_load_caps'].items()] + [f"déchargement {d} : {c:.0f} t/j" for d, c in branch['dest_unload_caps'].items()]
+                base_profit = f"{branch['base']['profit']:,.0f}".replace(',', ' ')
+                st.caption(f"Résultats affichés : reprise au jour {branch['from_day']} ({', '.join(changes) or 'sans modification'}), "
+                           f"{branch['days_simulated']} jours resimulés ; profit de la simulation de base : {base_profit}.")
+            relations_data, origins_data, destinations_data = st.session_state.network_data
+            col1, col2 = st.columns(2)
+            from_day = col1.selectbox("Reprendre au début du jour", sorted(checkpoints))
+            extra_wagons = col2.number_input("Wagons ajoutés (négatif : retirés)", value=0, step=10)
+            col1, col2 = st.columns(2)
+            branch_origin = col1.selectbox("Origine à modifier", [None] + origins_data.index.tolist(), format_func=lambda x: "(aucune)" if x is None else str(x))
+            origin_capacity = col2.number_input("Capacité de chargement (t/jour)", min_value=0.0, disabled=branch_origin is None,
+                                                value=float(origins_data.loc[branch_origin, 'daily_loading_capacity_tons']) if branch_origin is not None else 0.0)
+            col1, col2 = st.columns(2)
+            branch_dest = col1.selectbox("Destination à modifier", [None] + destinations_data.index.tolist(), format_func=lambda x: "(aucune)" if x is None else str(x))
+            dest_capacity = col2.number_input("Capacité de déchargement (t/jour)", min_value=0.0, disabled=branch_dest is None,
+                                              value=float(destinations_data.loc[branch_dest, 'daily_unloading_capacity_tons']) if branch_dest is not None else 0.0)
+            active_job = get_job_manager().get(st.session_state.active_job_id) if st.session_state.active_job_id else None
+            if st.button("🔀 Lancer la branche", disabled=active_job is not None and not active_job.finished):
+                st.session_state.job_error = None
+                job = get_job_manager().submit(
+                    f"Branche depuis le jour {from_day}", jobs_simulation.branch_job, checkpoints[from_day], relations_data, origins_data, destinations_data, res,
+                    extra_wagons=int(extra_wagons), origin_load_caps={branch_origin: origin_capacity} if branch_origin is not None else None,
+                    dest_unload_caps={branch_dest: dest_capacity} if branch_dest is not None else None
+                )
+                st.session_state.active_job_id = job.job_id
+                st.rerun()
     
     st.divider()
 
     if st.session_state.initial_data:
         initial_orig, initial_dest = st.session_state.initial_data
-        excel_data = create_excel_download_link(res, initial_orig, initial_dest)
         st.download_button(
             label="📥 Télécharger le rapport complet (Excel)",
-            data=excel_data,
+            data=get_excel_report_builder(res, initial_orig, initial_dest),
             file_name="resultats_simulation.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             use_container_width=True
@@ -192,108 +404,81 @@ if st.session_state.results:
     shipments_df = res.get('shipments_df')
     final_dest_df = res.get('final_destinations_df')
     final_orig_df = res.get('final_origins_df')
-    tracking_vars = res.get('final_tracking_vars')
+    initial_orig_df = st.session_state.initial_data[0] if st.session_state.initial_data else None
+    views = get_results_views(res, initial_orig_df); tables = views['tables']
 
-    tab_graph, tab_transport, tab_dest, tab_orig, tab_wagon = st.tabs([
-        "📈 Graphiques", "🚚 Détail des Transports", "🎯 Destinations", "🏭 Origines", "🛤️ Suivi Wagons"
+    tab_graph, tab_transport, tab_dest, tab_orig, tab_wagon, tab_diag = st.tabs([
+        "📈 Graphiques", "🚚 Détail des Transports", "🎯 Destinations", "🏭 Origines", "🛤️ Suivi Wagons", "🩺 Diagnostics"
     ])
 
     with tab_graph:
         st.subheader("Analyse Visuelle")
-        if shipments_df is not None and not shipments_df.empty:
-            # ... (code de l'onglet graphiques inchangé) ...
+        if 'tons_per_day' in tables:
             col1_graph, col2_graph = st.columns(2)
             with col1_graph:
                 st.write("**Quantité livrée par destination**")
-                tons_per_dest = shipments_df.groupby('destination')['quantity_tons'].sum().sort_values(ascending=False)
-                st.bar_chart(tons_per_dest)
+                st.bar_chart(tables['tons_per_dest'].head(CHART_MAX_BARS))
+                if len(tables['tons_per_dest']) > CHART_MAX_BARS: st.caption(f"{CHART_MAX_BARS} premières destinations sur {len(tables['tons_per_dest'])}.")
                 st.write("**Quantité expédiée par origine**")
-                tons_per_origin = shipments_df.groupby('origin')['quantity_tons'].sum().sort_values(ascending=False)
-                st.bar_chart(tons_per_origin)
+                st.bar_chart(tables['tons_per_origin'].head(CHART_MAX_BARS))
+                if len(tables['tons_per_origin']) > CHART_MAX_BARS: st.caption(f"{CHART_MAX_BARS} premières origines sur {len(tables['tons_per_origin'])}.")
             with col2_graph:
                 st.write("**Taux de satisfaction de la demande (%)**")
-                if final_dest_df is not None and all(c in final_dest_df.columns for c in ['annual_demand_tons', 'delivered_so_far_tons']):
-                    recap_df = final_dest_df.copy()
-                    recap_df['satisfaction_rate'] = recap_df.apply(lambda row: (row['delivered_so_far_tons'] / row['annual_demand_tons'] * 100) if row['annual_demand_tons'] > 0 else 0, axis=1).fillna(0)
-                    st.bar_chart(recap_df, y='satisfaction_rate')
+                if 'satisfaction_rate' in tables:
+                    satisfaction_rate = tables['satisfaction_rate']
+                    if len(satisfaction_rate) > CHART_MAX_BARS:
+                        satisfaction_rate = satisfaction_rate.nsmallest(CHART_MAX_BARS)
+                        st.caption(f"{CHART_MAX_BARS} destinations les moins satisfaites sur {len(tables['satisfaction_rate'])}.")
+                    st.bar_chart(satisfaction_rate)
                 else:
                     st.warning("Données manquantes pour le graphique de satisfaction.")
             st.write("**Flux d'expédition par jour (en tonnes)**")
-            tons_per_day = shipments_df.groupby('ship_day')['quantity_tons'].sum()
-            st.line_chart(tons_per_day)
+            st.line_chart(tables['tons_per_day'])
         else:
             st.info("Aucune expédition n'a été réalisée.")
 
 
     with tab_transport:
         st.subheader("Détail de toutes les Expéditions")
-        if shipments_df is not None:
-            st.dataframe(shipments_df.style.format(precision=2))
+        if shipments_df is not None and 'filter_options' in tables:
+            options = tables['filter_options']
+            col1_filter, col2_filter, col3_filter = st.columns(3)
+            origin_filter = col1_filter.multiselect("Origines", options['origin'], placeholder="Toutes")
+            dest_filter = col2_filter.multiselect("Destinations", options['destination'], placeholder="Toutes")
+            type_filter = col3_filter.multiselect("Types d'expédition", options['type'], placeholder="Tous")
+            first_day, last_day = int(shipments_df['ship_day'].min()), int(shipments_df['ship_day'].max())
+            day_range = st.slider("Jours d'expédition", first_day, last_day, (first_day, last_day)) if first_day < last_day else None
+            page_df = filtered_shipments(views, shipments_df, origin_filter, dest_filter, type_filter, day_range)
+            col1_page, col2_page = st.columns(2)
+            page_size = col1_page.selectbox("Lignes par page", TRANSPORT_PAGE_SIZES, index=1)
+            page_count = max(1, -(-len(page_df) // page_size))
+            page = col2_page.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+            start = (page - 1) * page_size
+            st.dataframe(page_df.iloc[start:start + page_size], column_config=float_columns_config(shipments_df))
+            st.caption(f"Lignes {min(start + 1, len(page_df))} à {min(start + page_size, len(page_df))} sur {len(page_df)} (expéditions au total : {len(shipments_df)}).")
+        elif shipments_df is not None:
+            st.info("Aucune expédition n'a été réalisée.")
 
     with tab_dest:
         st.subheader("État Final par Destination")
         if final_dest_df is not None:
-            st.dataframe(final_dest_df.style.format(precision=2))
+            st.dataframe(final_dest_df, column_config=float_columns_config(final_dest_df))
 
     # --- BLOC "ORIGINES" MODIFIÉ AVEC DÉBOGAGE INTÉGRÉ ---
     with tab_orig:
         st.subheader("État Final par Origine")
         
-        if final_orig_df is not None and st.session_state.initial_data:
-            initial_orig_df, _ = st.session_state.initial_data
-            origins_display_df = final_orig_df.copy()
-
-            # --- PARAMÈTRES À VÉRIFIER ---
-            # Nom de la colonne du stock DANS LE FICHIER INITIAL
-            col_stock_initial = 'initial_available_product_tons'
-            
-            # Nom de la colonne du stock DANS LE FICHIER FINAL (retourné par la simulation)
-            # 💡 HYPOTHÈSE : C'est 'initial_available_product_tons'. Si ça ne marche pas,
-            #    l'application affichera la liste des colonnes disponibles et vous pourrez
-            #    corriger le nom ici.
-            col_stock_final = 'initial_available_product_tons' 
-            # --- FIN DES PARAMÈTRES ---
-
-            # On vérifie que les colonnes existent avant de continuer
-            if col_stock_initial in initial_orig_df.columns and col_stock_final in origins_display_df.columns:
-                
-                origins_display_df['stock_initial_t'] = initial_orig_df[col_stock_initial]
-                origins_display_df['stock_final_t'] = origins_display_df[col_stock_final]
-                origins_display_df['stock_utilise_t'] = origins_display_df['stock_initial_t'] - origins_display_df['stock_final_t']
-
-                origins_display_df['utilisation_stock_%'] = origins_display_df.apply(
-                    lambda row: (row['stock_utilise_t'] / row['stock_initial_t'] * 100) if row['stock_initial_t'] > 0 else 0,
-                    axis=1
-                )
-                
-                days_sim = res.get('days_taken_simulation_loop')
-                if shipments_df is not None and not shipments_df.empty and days_sim is not None and days_sim > 0:
-                    daily_flow_per_origin = shipments_df.groupby('origin')['quantity_tons'].sum() / days_sim
-                    origins_display_df['debit_moyen_jour'] = origins_display_df.index.map(daily_flow_per_origin).fillna(0)
-                    origins_display_df['autonomie_restante_j'] = origins_display_df.apply(
-                        lambda row: row['stock_final_t'] / row['debit_moyen_jour'] if row['debit_moyen_jour'] > 0 else np.inf,
-                        axis=1
-                    )
-                    origins_display_df = origins_display_df.drop(columns=['debit_moyen_jour'])
-                else:
-                    origins_display_df['autonomie_restante_j'] = np.nan
-
-                cols_to_display = [
-                    'stock_initial_t', 'stock_final_t', 'stock_utilise_t', 'utilisation_stock_%',
-                    'autonomie_restante_j', 'daily_loading_capacity_tons'
-                ]
-                # On ne garde que les colonnes existantes et on ajoute les autres
-                final_cols_order = [c for c in cols_to_display if c in origins_display_df.columns]
-                other_cols = [c for c in origins_display_df.columns if c not in final_cols_order]
-                
-                st.dataframe(origins_display_df[final_cols_order + other_cols].style.format({
-                    'stock_initial_t': '{:,.0f}',
-                    'stock_final_t': '{:,.0f}',
-                    'stock_utilise_t': '{:,.0f}',
-                    'daily_loading_capacity_tons': '{:,.0f}',
-                    'utilisation_stock_%': '{:.1f}%',
-                    'autonomie_restante_j': '{:.1f}'
-                }, na_rep="N/A").set_properties(**{'text-align': 'right'}))
+        if final_orig_df is not None and initial_orig_df is not None:
+            # Colonne du stock dans le fichier initial et dans le fichier final (voir build_results_views)
+            col_stock_initial = col_stock_final = 'initial_available_product_tons'
+
+            if 'origins_display' in tables:
+                tonnes = st.column_config.NumberColumn(format="%.0f")
+                st.dataframe(tables['origins_display'], column_config={
+                    'stock_initial_t': tonnes, 'stock_final_t': tonnes, 'stock_utilise_t': tonnes, 'daily_loading_capacity_tons': tonnes,
+                    'utilisation_stock_%': st.column_config.NumberColumn(format="%.1f%%"),
+                    'autonomie_restante_j': st.column_config.NumberColumn(format="%.1f"),
+                })
 
             else:
                 # --- GUIDE DE DÉBOGAGE ---
@@ -306,12 +491,12 @@ if st.session_state.results:
                 st.info(f"**Action à faire :**\n"
                         f"1. Regardez la liste des 'Colonnes disponibles' ci-dessous.\n"
                         f"2. Identifiez le vrai nom de la colonne qui contient le stock final.\n"
-                        f"3. Dans le code `app.py`, trouvez la ligne `col_stock_final = ...` (dans l'onglet 'Origines') "
+                        f"3. Dans le code `app.py`, trouvez la ligne `col_stock_final = ...` (dans build_results_views) "
                         f"et remplacez la valeur par le nom correct que vous avez trouvé.", icon="💡")
 
                 st.subheader("Données pour le débogage :")
                 st.write(f"**Nom de colonne de stock initial cherché :** `{col_stock_initial}` (Présent: {col_stock_initial in initial_orig_df.columns})")
-                st.write(f"**Nom de colonne de stock final cherché :** `{col_stock_final}` (Présent: {col_stock_final in origins_display_df.columns})")
+                st.write(f"**Nom de colonne de stock final cherché :** `{col_stock_final}` (Présent: {col_stock_final in final_orig_df.columns})")
                 
                 st.subheader("Colonnes disponibles dans le dataframe final (`final_orig_df`):")
                 st.code(final_orig_df.columns.tolist())
@@ -323,8 +508,8 @@ if st.session_state.results:
             
     with tab_wagon:
         st.subheader("Suivi Quotidien des Wagons")
-        if tracking_vars and 'daily_wagon_log' in tracking_vars:
-            wagon_log_df = pd.DataFrame(tracking_vars['daily_wagon_log'])
+        wagon_log_df = tables['wagon_log']
+        if wagon_log_df is not None:
             if not wagon_log_df.empty:
                 st.line_chart(wagon_log_df.set_index('day'), y=['available_start', 'in_transit_end'])
                 with st.expander("Voir les données détaillées"):
@@ -333,13 +518,24 @@ if st.session_state.results:
                 st.info("Aucune donnée de suivi des wagons n'a été enregistrée.")
         else:
             st.info("Le suivi des wagons n'était pas activé ou n'a retourné aucune donnée.")
-   
 
-
-    
-
-             
-   
-             
-         
-       
+    with tab_diag:
+        st.subheader("Diagnostics de Performance")
+        profiling = res.get('profiling')
+        if profiling:
+            col1_diag, col2_diag, col3_diag, col4_diag = st.columns(4)
+            col1_diag.metric("Durée totale (s)", f"{profiling['total_seconds']:.3f}")
+            col2_diag.metric("Jours simulés", f"{profiling['days_simulated']}")
+            col3_diag.metric("Appels process_shipment", f"{profiling['process_shipment_calls']:,}".replace(',', ' '))
+            col4_diag.metric("Appels rejetés", f"{profiling['process_shipment_rejections']:,}".replace(',', ' '))
+            if profiling.get('peak_memory_bytes') is not None:
+                st.metric("Pic mémoire (Mo)", f"{profiling['peak_memory_bytes'] / 1024 ** 2:.2f}")
+            phase_labels = {'qmin_initial': "QMIN initial (jour 1)", 'qmin_daily': "QMIN quotidien", 'phase2': "Phase 2",
+                            'wagons': "Gestion des wagons", 'results': "Calcul du profit et tables finales"}
+            phase_df = pd.DataFrame({'phase': [phase_labels.get(name, name) for name in profiling['phase_seconds']],
+                                     'secondes': list(profiling['phase_seconds'].values())}).set_index('phase')
+            st.write("**Temps par phase (s)**")
+            st.bar_chart(phase_df)
+            st.dataframe(phase_df.style.format(precision=4))
+        else:
+            st.info("Cochez « Mesurer les performances » dans la barre latérale puis relancez la simulation pour obtenir les mesures.")
@@ -0,0 +1,214 @@
+# Fichier : batch_runner.py
+# Exécution sans interface d'un manifeste de scénarios (run_simulation_h1 / run_simulation_h2, montée optionnelle).
+#
+# Manifeste JSON ; chemins relatifs au dossier du manifeste :
+# {
+#   "datasets": {"reseau": {"relations": "relations.csv", "origins": "origines.csv", "destinations": "destinations.csv"}},
+#   "defaults": {"dataset": "reseau", "heuristic": "h1", "num_wagons": 500},
+#   "scenarios": [
+#     {"id": "h1_demande", "qmin": ["annual_demand_tons", false], "phase2": ["q_min_initial_target_tons", false]},
+#     {"id": "h2_opt", "heuristic": "h2", "qmin": ["D1", "D2"], "phase2": ["annual_demand_tons", false],
+#      "optimize": {"max_iterations": 5}},
+#     {"id": "h2_recuit", "heuristic": "h2", "qmin": ["D1", "D2", "D3"], "phase2": ["D3", "D2", "D1"],
+#      "optimize": {"strategy": "annealing", "time_budget_s": 60, "seed": 1}}
+#   ]
+# }
+# "optimize" avec "strategy" : arguments de budgeted_order_search (strategy, max_evaluations, time_budget_s, seed, ...).
+# H1 : "qmin" / "phase2" = [colonne, croissant] ou ["custom_order", [ids]].
+# H2 : liste d'identifiants, ou [colonne, croissant] converti en liste triée des destinations.
+# "heuristic": "lp" : plan du planificateur par programme linéaire (ordres et optimisation ignorés) ;
+# "upper_bound": true ajoute au résumé la borne supérieure du profit (programme linéaire).
+# Avec --listen hôte:port --authkey CLE, les évaluations des optimisations sont réparties sur les processus de calcul
+# connectés (calcul_distribue.py) ; --local-workers en lance sur cette machine.
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import calcul_distribue
+import combainaisonexceldescente as sim
+import ingestion
+import planificateur_flux
+
+SUMMARY_FILE = 'summary.json'
+_DATASETS = {}  # Par processus : (nom du jeu de données, clé de contenu) -> (relations, origines, destinations, index des relations)
+
+# --- Manifeste ---
+def load_manifest(manifest_path):
+    """Scénarios complets (valeurs par défaut appliquées, chemins absolus) dans l'ordre du manifeste."""
+    with open(manifest_path, encoding='utf-8') as f: manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    datasets = {name: {table: os.path.join(base_dir, path) for table, path in files.items()} for name, files in manifest.get('datasets', {}).items()}
+    defaults = {'heuristic': 'h1', 'num_wagons': 500, 'qmin': None, 'phase2': None, 'optimize': False, 'upper_bound': False, **manifest.get('defaults', {})}
+    scenarios = []; seen_ids = set()
+    for k, entry in enumerate(manifest.get('scenarios', [])):
+        scenario = {**defaults, **entry}; scenario.setdefault('id', f"scenario_{k + 1:04d}")
+        if scenario['id'] in seen_ids: raise ValueError(f"Identifiant de scénario en double : {scenario['id']}")
+        if scenario.get('dataset') not in datasets: raise ValueError(f"Scénario {scenario['id']} : jeu de données inconnu {scenario.get('dataset')!r}")
+        if scenario['heuristic'] not in ('h1', 'h2', 'lp'): raise ValueError(f"Scénario {scenario['id']} : heuristique inconnue {scenario['heuristic']!r}")
+        seen_ids.add(scenario['id']); scenario['files'] = datasets[scenario['dataset']]
+        scenarios.append(scenario)
+    return scenarios
+
+def dataset_source_key(files):
+    return ingestion.sources_key(files[table] for table in ingestion.TABLES)
+
+def scenario_fingerprint(scenario, source_key):
+    # Change si la définition du scénario ou le contenu de ses fichiers d'entrée (`source_key`) change
+    payload = json.dumps({k: v for k, v in scenario.items() if k not in ('files', 'fingerprint', 'source_key')}, sort_keys=True, default=str)
+    return hashlib.sha256((payload + source_key).encode()).hexdigest()
+
+def _h1_config(config):
+    if config is None: return None
+    if config[0] == 'custom_order': return ('custom_order', list(config[1]))
+    return (config[0], bool(config[1]))
+
+def _h2_order(config, destinations_df):
+    # Liste d'identifiants, ou ordre des destinations selon [colonne, croissant] (même tri que l'application)
+    if config is None: return None
+    if len(config) == 2 and isinstance(config[1], bool):
+        column, ascending = config
+        values = destinations_df['annual_demand_tons'] * 0.20 if column == 'q_min_initial_target_tons' and column not in destinations_df.columns else destinations_df[column]
+        return [destinations_df.index[k] for k in sim.sort_order(values.to_numpy(), ascending)]
+    return list(config)
+
+# --- Exécution d'un scénario ---
+def _dataset(name, files, cache_dir, source_key):
+    # Clé de contenu comprise : un fichier modifié entre deux lots d'un même processus est relu
+    if (name, source_key) not in _DATASETS:
+        rels, origins, dests = ingestion.load_network(files['relations'], files['origins'], files['destinations'], cache_dir)
+        _DATASETS[(name, source_key)] = (rels, origins, dests, sim.RelationIndex(rels, origins.index, dests.index))
+    return _DATASETS[(name, source_key)]
+
+def run_scenario(scenario, output_dir, cache_dir=None, coordinator=None):
+    """Simule (et optimise si demandé) un scénario ; écrit expéditions, suivi des wagons et résumé dans son dossier.
+
+    Avec `coordinator` (calcul_distribue.Coordinator), les évaluations de l'optimisation lui sont confiées.
+    """
+    scenario_dir = os.path.join(output_dir, 'scenarios', scenario['id']); os.makedirs(scenario_dir, exist_ok=True)
+    t0 = time.perf_counter(); log = io.StringIO()
+    rels, origins, dests, relation_index = _dataset(scenario['dataset'], scenario['files'], cache_dir, scenario['source_key'])
+    heuristic = scenario['heuristic']; num_wagons = int(scenario['num_wagons'])
+    if heuristic == 'h1': qmin_cfg = _h1_config(scenario['qmin']); phase2_cfg = _h1_config(scenario['phase2'])
+    elif heuristic == 'h2': qmin_cfg = _h2_order(scenario['qmin'], dests); phase2_cfg = _h2_order(scenario['phase2'], dests)
+    else: qmin_cfg = phase2_cfg = None
+    if heuristic == 'lp':
+        results = planificateur_flux.plan_network_flow(rels, origins, dests, num_wagons, relation_index=relation_index)
+    else:
+        with contextlib.redirect_stdout(log):
+            optimize = scenario['optimize'] if isinstance(scenario['optimize'], dict) else {}
+            if scenario['optimize'] and 'strategy' in optimize:
+                found = sim.budgeted_order_search(heuristic, rels, origins, dests, qmin_cfg, phase2_cfg, num_wagons, coordinator=coordinator, **optimize)
+                qmin_cfg, phase2_cfg = found['qmin_config'], found['phase2_config']
+            elif scenario['optimize']:
+                max_iterations = optimize.get('max_iterations', 10)
+                if heuristic == 'h1': _, qmin_cfg, phase2_cfg = sim.hill_climbing_maximizer_h1(rels, origins, dests, qmin_cfg, phase2_cfg, num_wagons, max_iterations, coordinator=coordinator)
+                else: qmin_cfg, phase2_cfg = sim.hill_climbing_maximizer_h2(rels, origins, dests, qmin_cfg, phase2_cfg, num_wagons, max_iterations, coordinator=coordinator)
+            run_simulation = sim.run_simulation_h1 if heuristic == 'h1' else sim.run_simulation_h2
+            results = run_simulation(rels, origins, dests, qmin_cfg, phase2_cfg, num_wagons, True, False, relation_index)
+        if scenario['upper_bound']: results['planner'] = planificateur_flux.plan_network_flow(rels, origins, dests, num_wagons, relation_index=relation_index)['planner']
+    results['shipments_df'].to_csv(os.path.join(scenario_dir, 'shipments.csv'), index=False)
+    pd.DataFrame(results['final_tracking_vars']['daily_wagon_log']).to_csv(os.path.join(scenario_dir, 'wagons.csv'), index=False)
+    with open(os.path.join(scenario_dir, 'log.txt'), 'w', encoding='utf-8') as f: f.write(log.getvalue())
+    summary = {'id': scenario['id'], 'dataset': scenario['dataset'], 'heuristic': heuristic, 'num_wagons': num_wagons,
+               'optimized': bool(scenario['optimize']), 'qmin': qmin_cfg, 'phase2': phase2_cfg,
+               'profit': float(results['profit']), 'all_demand_met': bool(results['all_demand_met']),
+               'days': int(results['days_taken_simulation_loop']), 'shipments': len(results['shipments_df']),
+               'seconds': time.perf_counter() - t0, 'fingerprint': scenario['fingerprint']}
+    if 'planner' in results: summary['upper_bound'] = float(results['planner']['upper_bound']); summary['upper_bound_converged'] = bool(results['planner']['converged'])
+    # Le résumé est écrit en dernier : sa présence marque le scénario comme terminé
+    tmp_path = os.path.join(scenario_dir, SUMMARY_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(summary, f, indent=2, default=str)
+    os.replace(tmp_path, os.path.join(scenario_dir, SUMMARY_FILE))
+    with contextlib.suppress(FileNotFoundError): os.remove(os.path.join(scenario_dir, 'error.json'))
+    return summary
+
+def _run_scenario_safely(scenario, output_dir, cache_dir, coordinator=None):
+    try: return run_scenario(scenario, output_dir, cache_dir, coordinator)
+    except Exception as e:
+        error = {'id': scenario['id'], 'error': str(e), 'traceback': traceback.format_exc()}
+        scenario_dir = os.path.join(output_dir, 'scenarios', scenario['id']); os.makedirs(scenario_dir, exist_ok=True)
+        with open(os.path.join(scenario_dir, 'error.json'), 'w', encoding='utf-8') as f: json.dump(error, f, indent=2)
+        return error
+
+def completed_summary(scenario, output_dir):
+    # Résumé d'une exécution précédente du même scénario sur les mêmes fichiers, sinon None
+    path = os.path.join(output_dir, 'scenarios', scenario['id'], SUMMARY_FILE)
+    try:
+        with open(path, encoding='utf-8') as f: summary = json.load(f)
+    except (OSError, ValueError): return None
+    return summary if summary.get('fingerprint') == scenario['fingerprint'] else None
+
+# --- Lot complet ---
+def run_batch(manifest_path, output_dir, n_workers=1, resume=True, coordinator=None):
+    """Exécute les scénarios du manifeste ; avec `resume`, ceux déjà terminés sont repris de leur résumé. Renvoie le tableau récapitulatif.
+
+    Avec `coordinator`, les scénarios s'exécutent l'un après l'autre dans ce processus et les évaluations de leurs
+    optimisations sont réparties sur les processus de calcul du coordinateur (`n_workers` est ignoré).
+    """
+    scenarios = load_manifest(manifest_path); os.makedirs(output_dir, exist_ok=True)
+    cache_dir = os.path.join(output_dir, '.cache_donnees')
+    files_by_dataset = {scenario['dataset']: scenario['files'] for scenario in scenarios}
+    source_keys = {name: dataset_source_key(files) for name, files in files_by_dataset.items()}
+    for scenario in scenarios:
+        scenario['fingerprint'] = scenario_fingerprint(scenario, source_keys[scenario['dataset']]); scenario['source_key'] = source_keys[scenario['dataset']]
+    summaries = {}; pending = []
+    for scenario in scenarios:
+        summary = completed_summary(scenario, output_dir) if resume else None
+        if summary is not None: summaries[scenario['id']] = summary
+        else: pending.append(scenario)
+    print(f"{len(scenarios)} scénario(s), {len(summaries)} déjà terminé(s), {len(pending)} à exécuter.", flush=True)
+    # Chaque jeu de données est lu une fois ici ; les processus relisent l'instantané Parquet
+    for name in dict.fromkeys(scenario['dataset'] for scenario in pending): _dataset(name, files_by_dataset[name], cache_dir, source_keys[name])
+    t0 = time.perf_counter(); done = 0; failed = 0
+
+    def report(summary):
+        nonlocal done, failed
+        done += 1; elapsed = time.perf_counter() - t0; eta = elapsed / done * (len(pending) - done)
+        if 'error' in summary: failed += 1; status = f"ERREUR : {summary['error']}"
+        else: summaries[summary['id']] = summary; status = f"profit {summary['profit']:,.0f}".replace(',', ' ') + f", {summary['days']} j"
+        print(f"[{done}/{len(pending)}] {summary['id']} — {status} (écoulé {elapsed:.0f} s, restant ~{eta:.0f} s)", flush=True)
+
+    if coordinator is not None:
+        for scenario in pending: report(_run_scenario_safely(scenario, output_dir, cache_dir, coordinator))
+    elif n_workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_run_scenario_safely, scenario, output_dir, cache_dir) for scenario in pending]
+            for future in as_completed(futures): report(future.result())
+    else:
+        for scenario in pending: report(_run_scenario_safely(scenario, output_dir, cache_dir))
+    table = pd.DataFrame([summaries[s['id']] for s in scenarios if s['id'] in summaries])
+    if not table.empty: table.drop(columns=['fingerprint']).to_csv(os.path.join(output_dir, 'summary.csv'), index=False)
+    print(f"Terminé : {len(summaries)}/{len(scenarios)} scénario(s) disponibles, {failed} en erreur.", flush=True)
+    return table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exécute un manifeste de scénarios de simulation sans interface.")
+    parser.add_argument('manifest', help="Fichier JSON des scénarios")
+    parser.add_argument('--output', default='resultats_lot', help="Dossier de sortie")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-resume', action='store_true', help="Relance aussi les scénarios déjà terminés")
+    parser.add_argument('--listen', help="Adresse hôte:port d'écoute des processus de calcul répartis (calcul_distribue.py)")
+    parser.add_argument('--authkey', default=os.environ.get('SIMULATEUR_AUTHKEY'), help="Clé partagée avec les processus de calcul (sinon variable SIMULATEUR_AUTHKEY)")
+    parser.add_argument('--local-workers', type=int, default=0, help="Processus de calcul à lancer sur cette machine avec --listen")
+    parser.add_argument('--worker-wait', type=float, default=calcul_distribue.DEFAULT_WORKER_WAIT_S, help="Attente maximale d'un premier processus de calcul (secondes)")
+    args = parser.parse_args()
+    if args.listen is None:
+        run_batch(args.manifest, args.output, args.workers, not args.no_resume)
+    else:
+        if not args.authkey: parser.error("--listen requiert --authkey (ou SIMULATEUR_AUTHKEY).")
+        with calcul_distribue.Coordinator(args.authkey.encode(), calcul_distribue.parse_address(args.listen), worker_wait_s=args.worker_wait) as coordinator:
+            calcul_distribue.start_local_workers(coordinator.address, args.authkey.encode(), args.local_workers, os.path.join(args.output, '.cache_reseaux'))
+            print(f"En attente des processus de calcul sur {coordinator.address[0]}:{coordinator.address[1]} ({args.worker_wait:g} s au plus)...", flush=True)
+            if not coordinator.wait_for_workers(1, args.worker_wait):
+                parser.exit(1, f"Aucun processus de calcul connecté après {args.worker_wait:g} s : lancer calcul_distribue.py {coordinator.address[0]}:{coordinator.address[1]} --authkey ... "
+                               "sur les machines de calcul, ou utiliser --local-workers.\n")
+            run_batch(args.manifest, args.output, args.workers, not args.no_resume, coordinator)
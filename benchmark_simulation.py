@@ -0,0 +1,68 @@
+# Fichier : benchmark_simulation.py
+# Mesure les temps de chargement, des phases QMIN / Phase 2, d'une simulation complète et d'une itération de
+# montée sur des réseaux synthétiques de tailles croissantes.
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import combainaisonexceldescente as sim
+from generateur_reseau import write_network_csv
+
+DEFAULT_SIZES = ((10, 30), (20, 80), (40, 200))
+
+def benchmark_network(n_origins, n_destinations, density=0.3, stock_demand_ratio=1.2, num_wagons=100, seed=0, hc_order_size=8):
+    """Mesures pour un réseau généré ; renvoie une ligne par heuristique."""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = write_network_csv(tmp_dir, n_origins, n_destinations, density, stock_demand_ratio, num_wagons, seed)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()): rels, origins, dests = sim.load_data_csv(*paths)
+        load_seconds = time.perf_counter() - t0
+    hc_order = list(dests.index[:hc_order_size])
+    for heuristic in ('h1', 'h2'):
+        t0 = time.perf_counter()
+        run_simulation = sim.run_simulation_h1 if heuristic == 'h1' else sim.run_simulation_h2
+        results = run_simulation(rels, origins, dests, None, None, num_wagons, True, profiling=sim.SimulationProfiler(track_memory=False))
+        run_seconds = time.perf_counter() - t0
+        profile = results['profiling']; phase_seconds = profile['phase_seconds']
+        # Simulations réellement lancées : voisins sans effet écartés, simulations de référence comprises
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), sim.NeighborEvaluator(heuristic, rels, origins, dests, num_wagons) as evaluator:
+            if heuristic == 'h1': sim.hill_climbing_maximizer_h1(rels, origins, dests, ('custom_order', hc_order), ('custom_order', hc_order), num_wagons, max_iterations=1, evaluator=evaluator)
+            else: sim.hill_climbing_maximizer_h2(rels, origins, dests, hc_order, hc_order, num_wagons, max_iterations=1, evaluator=evaluator)
+        hc_seconds = time.perf_counter() - t0; hc_evaluations = evaluator.evaluations
+        days = results['days_taken_simulation_loop']; days_simulated = profile['days_simulated']; shipments = len(results['shipments_df'])
+        rows.append({'origins': n_origins, 'destinations': n_destinations, 'relations': len(rels), 'heuristic': heuristic,
+                     'load_s': load_seconds, 'qmin_s': phase_seconds['qmin_initial'] + phase_seconds['qmin_daily'], 'phase2_s': phase_seconds['phase2'],
+                     'run_s': run_seconds, 'days': days, 'days_simulated': days_simulated, 'shipments': shipments,
+                     'days_per_s': days_simulated / run_seconds, 'shipments_per_s': shipments / run_seconds,
+                     'hc_iteration_s': hc_seconds, 'hc_evaluations': hc_evaluations, 'hc_evaluations_per_s': hc_evaluations / hc_seconds})
+    return rows
+
+def run_benchmark(sizes=DEFAULT_SIZES, density=0.3, stock_demand_ratio=1.2, num_wagons=100, seed=0, hc_order_size=8):
+    rows = []
+    for n_origins, n_destinations in sizes:
+        rows.extend(benchmark_network(n_origins, n_destinations, density, stock_demand_ratio, num_wagons, seed, hc_order_size))
+        print(pd.DataFrame(rows[-2:]).to_string(index=False, float_format=lambda x: f"{x:.3f}"), flush=True)
+    return pd.DataFrame(rows)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Banc d'essai du simulateur sur des réseaux synthétiques.")
+    parser.add_argument('--sizes', nargs='+', default=[f"{o}x{d}" for o, d in DEFAULT_SIZES], help="Tailles origines x destinations, ex. 10x30 40x200")
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--stock-demand-ratio', type=float, default=1.2)
+    parser.add_argument('--wagons', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hc-order-size', type=int, default=8, help="Longueur des ordres personnalisés de la montée")
+    parser.add_argument('--output', help="Fichier CSV des résultats")
+    args = parser.parse_args()
+    sizes = [tuple(int(n) for n in size.lower().split('x')) for size in args.sizes]
+    report = run_benchmark(sizes, args.density, args.stock_demand_ratio, args.wagons, args.seed, args.hc_order_size)
+    print("\n" + report.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    if args.output: report.to_csv(args.output, index=False); print(f"Résultats : {os.path.abspath(args.output)}")
@@ -0,0 +1,180 @@
+# Fichier : cache_simulation.py
+# Cache des résultats de simulation, adressé par le contenu des données nettoyées et la configuration.
+
+import copy
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import combainaisonexceldescente as sim
+
+# Paramètres du moteur inclus dans chaque clé : un changement invalide les entrées existantes
+ENGINE_PARAMETERS = (sim.WAGON_CAPACITY_TONS, sim.MIN_WAGON_UTILIZATION_PERCENT, sim.MAX_SIMULATION_DAYS, sim.KM_PER_DAY_FOR_WAGON_RETURN, sim.EPSILON)
+SUMMARY_FIELDS = ('profit', 'all_demand_met', 'days_taken_simulation_loop')
+
+# --- Empreintes ---
+def dataframe_fingerprint(df):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def dataset_fingerprint(relations_df, origins_df, destinations_df):
+    """Empreinte des trois DataFrames nettoyés (colonnes, types, index et valeurs)."""
+    digest = hashlib.sha256()
+    for df in (relations_df, origins_df, destinations_df): digest.update(dataframe_fingerprint(df).encode())
+    return digest.hexdigest()
+
+def configuration_key(dataset_key, heuristic, qmin_config, phase2_config, num_wagons, profiling=False, lean=False):
+    # Les simulations profilées et les simulations `lean` des optimiseurs ont leurs propres entrées
+    payload = json.dumps([dataset_key, heuristic, qmin_config, phase2_config, int(num_wagons), ENGINE_PARAMETERS, bool(profiling), bool(lean)], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def results_summary(results):
+    # Entrée compacte : suffisante pour les optimiseurs, sans le journal des expéditions
+    summary = {field: results.get(field) for field in SUMMARY_FIELDS}
+    summary['profit'] = float(summary['profit']); summary['all_demand_met'] = bool(summary['all_demand_met'])
+    return summary
+
+# --- Cache à deux niveaux ---
+class SimulationCache:
+    """Cache des résultats de simulation : niveau mémoire LRU et niveau disque optionnel.
+
+    Chaque entrée existe sous deux formes : un résumé compact (profit, demande satisfaite, jours) et, si disponible,
+    le dictionnaire de résultats complet. Sur disque, le résumé est un petit fichier JSON et les résultats complets
+    un pickle séparé, de sorte que `get_summary` ne désérialise jamais le journal des expéditions. Au-delà de
+    `max_disk_bytes`, les entrées les moins récemment utilisées sont supprimées. Les résultats complets sont copiés à
+    l'entrée et à la sortie du cache : modifier un dictionnaire ou un DataFrame reçu ne modifie pas l'entrée.
+    """
+    def __init__(self, max_entries=32, max_summaries=100_000, cache_dir=None, max_disk_bytes=512 * 1024 ** 2):
+        self.max_entries = max_entries; self.max_summaries = max_summaries
+        self.cache_dir = cache_dir; self.max_disk_bytes = max_disk_bytes
+        self._results = OrderedDict(); self._summaries = OrderedDict(); self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0; self._disk_bytes = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def dataset_key(self, relations_df, origins_df, destinations_df):
+        return dataset_fingerprint(relations_df, origins_df, destinations_df)
+
+    def key(self, dataset_key, heuristic, qmin_config, phase2_config, num_wagons, profiling=False, lean=False):
+        return configuration_key(dataset_key, heuristic, qmin_config, phase2_config, num_wagons, profiling, lean)
+
+    def get_summary(self, key):
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None: self._summaries.move_to_end(key)
+        if summary is None:
+            summary = self._read_disk(key, '.json')
+            if summary is not None: self._remember(self._summaries, key, summary, self.max_summaries)
+        self._count(summary)
+        return dict(summary) if summary is not None else None
+
+    def get_results(self, key):
+        with self._lock:
+            results = self._results.get(key)
+            if results is not None: self._results.move_to_end(key)
+        if results is None:
+            results = self._read_disk(key, '.pkl')
+            if results is not None: self._remember(self._results, key, results, self.max_entries)
+        self._count(results)
+        return copy.deepcopy(results)
+
+    def put_summary(self, key, summary):
+        self._remember(self._summaries, key, dict(summary), self.max_summaries)
+        self._write_disk(key, '.json', summary)
+
+    def put_results(self, key, results):
+        self._remember(self._results, key, copy.deepcopy(results), self.max_entries)
+        self.put_summary(key, results_summary(results))
+        self._write_disk(key, '.pkl', results)
+
+    def run_simulation(self, heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, dataset_key=None, profiling=False, progress=None):
+        """Résultats de `run_simulation_h1` / `run_simulation_h2` pour cette configuration, calculés au besoin.
+
+        Avec `profiling`, la simulation est toujours relancée (mesures fraîches) et remplace l'entrée profilée de cette
+        configuration, distincte de celle des simulations sans mesures.
+        """
+        dataset_key = dataset_key or dataset_fingerprint(relations_df, origins_df, destinations_df)
+        key = self.key(dataset_key, heuristic, qmin_config, phase2_config, num_wagons, profiling)
+        results = None if profiling else self.get_results(key)
+        if results is None:
+            run_simulation = sim.run_simulation_h1 if heuristic == 'h1' else sim.run_simulation_h2
+            results = run_simulation(relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, True, profiling=profiling, progress=progress)
+            self.put_results(key, results)
+        return results
+
+    def clear(self):
+        with self._lock: self._results.clear(); self._summaries.clear(); self._disk_bytes = 0
+        for path in self._disk_files(): os.remove(path)
+
+    def _count(self, value):
+        if value is None: self.misses += 1
+        else: self.hits += 1
+
+    def _remember(self, store, key, value, max_size):
+        with self._lock:
+            store[key] = value; store.move_to_end(key)
+            while len(store) > max_size: store.popitem(last=False)
+
+    # --- Niveau disque ---
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _read_disk(self, key, suffix):
+        if self.cache_dir is None: return None
+        path = self._path(key, suffix)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(f.read()) if suffix == '.json' else pickle.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, suffix, value):
+        if self.cache_dir is None: return
+        path = self._path(key, suffix)
+        # Fichier temporaire propre à cette écriture : plusieurs threads ou processus peuvent écrire la même clé
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix=key, suffix='.tmp', delete=False) as f:
+            try:
+                if suffix == '.json': f.write(json.dumps(value).encode())
+                else: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException:
+                f.close(); os.remove(f.name); raise
+        with self._lock:
+            # Une clé réécrite remplace son ancien fichier : sa taille ne compte plus
+            try: old_size = os.path.getsize(path)
+            except OSError: old_size = 0
+            os.replace(f.name, path)
+            self._disk_bytes += os.path.getsize(path) - old_size
+        if self._disk_bytes > self.max_disk_bytes: self._evict_disk()
+
+    def _disk_files(self):
+        if self.cache_dir is None: return []
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(('.json', '.pkl'))]
+
+    def _disk_entries(self):
+        entries = []
+        for path in self._disk_files():
+            try: stat = os.stat(path)
+            except OSError: continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_disk(self):
+        # Supprime les fichiers les moins récemment lus ou écrits jusqu'à revenir à 90 % de la taille maximale
+        entries = self._disk_entries(); total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= 0.9 * self.max_disk_bytes: break
+            try: os.remove(path); total -= size
+            except OSError: pass
+        with self._lock: self._disk_bytes = total
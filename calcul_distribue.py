@@ -0,0 +1,257 @@
+# Fichier : calcul_distribue.py
+# Évaluations réparties sur plusieurs machines : un coordinateur distribue des tâches (simulations de voisins,
+# tailles de flotte) à des processus de calcul connectés par socket, qui gardent les réseaux en cache par empreinte.
+#
+# Sur chaque machine de calcul (plusieurs processus avec --workers) :
+#   python calcul_distribue.py coordinateur:6000 --authkey CLE --workers 8 --cache-dir .cache_reseaux
+# Côté coordinateur : with Coordinator(b"CLE", ('0.0.0.0', 6000)) as coordinateur:
+#   hill_climbing_maximizer_h1(..., coordinator=coordinateur) ; voir aussi batch_runner.py --listen.
+# Les messages sont sérialisés par pickle : la clé partagée (authentification HMAC) est obligatoire.
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import Client, Listener
+
+import cache_simulation
+import combainaisonexceldescente as sim
+import dimensionnement_flotte
+
+# --- Tâches ---
+# Une tâche reçoit le réseau (relations, origines, destinations, index des relations) puis ses arguments.
+def _evaluate_configuration_task(network, heuristic, qmin_cfg, phase2_cfg, num_wagons, checkpoint=None):
+    rels_df, orig_df, dest_df, rel_index = network
+    return sim.evaluate_configuration(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, rel_index, checkpoint)
+
+def _evaluate_fleet_task(network, heuristic, qmin_cfg, phase2_cfg, num_wagons):
+    rels_df, orig_df, dest_df, rel_index = network
+    return dimensionnement_flotte.evaluate_fleet(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, rel_index)
+
+TASK_FUNCTIONS = {'evaluate_configuration': _evaluate_configuration_task, 'evaluate_fleet': _evaluate_fleet_task}
+
+DEFAULT_WORKER_WAIT_S = 60.0
+
+class RemoteTaskError(RuntimeError):
+    """Une tâche a échoué sur un processus de calcul (le message contient la trace distante) ou a été perdue trop souvent."""
+
+class _Task:
+    def __init__(self, task_id, function_name, dataset_key, args):
+        self.task_id = task_id; self.function_name = function_name; self.dataset_key = dataset_key; self.args = args
+        self.attempts = 0; self.done = False; self.cancelled = False; self.result = None; self.error = None
+
+# --- Coordinateur ---
+class Coordinator:
+    """Distribue des tâches aux processus de calcul connectés (voir run_worker), une tâche à la fois par processus.
+
+    Un réseau n'est envoyé à un processus que s'il ne l'a pas déjà, en mémoire ou dans son dossier de cache, sous
+    son empreinte (cache_simulation.dataset_fingerprint). Un processus qui se déconnecte, ou reste muet plus de
+    `worker_timeout_s` secondes (il envoie des signes de vie pendant ses calculs), est considéré perdu : sa tâche
+    est remise en tête de file, au plus `max_attempts` fois. Des processus peuvent rejoindre le calcul à tout
+    moment. `address` = ('0.0.0.0', port) pour accepter d'autres machines ; port 0 = choisi par le système.
+    `map` attend au plus `worker_wait_s` secondes (None : sans limite) qu'un processus soit connecté, au départ
+    comme lorsque tous les processus se sont déconnectés avant la fin des tâches.
+    """
+    def __init__(self, authkey, address=('127.0.0.1', 0), worker_timeout_s=30.0, max_attempts=3, worker_wait_s=DEFAULT_WORKER_WAIT_S):
+        if not authkey: raise ValueError("Une clé d'authentification est requise.")
+        self._listener = Listener(address, authkey=authkey); self.address = self._listener.address
+        self.worker_timeout_s = worker_timeout_s; self.max_attempts = max_attempts; self.worker_wait_s = worker_wait_s
+        self._condition = threading.Condition(); self._queue = deque(); self._datasets = {}; self._workers = {}
+        self._task_ids = itertools.count(1); self._worker_ids = itertools.count(1); self._closed = False
+        self.tasks_completed = 0; self.tasks_reassigned = 0; self.workers_lost = 0
+        threading.Thread(target=self._accept_loop, name='coordinateur', daemon=True).start()
+
+    @property
+    def n_workers(self):
+        with self._condition: return len(self._workers)
+
+    def wait_for_workers(self, count, timeout=None):
+        # Vrai si au moins `count` processus de calcul sont connectés avant `timeout` secondes
+        with self._condition: return self._condition.wait_for(lambda: len(self._workers) >= count, timeout)
+
+    def register_dataset(self, relations_df, origins_df, destinations_df):
+        key = cache_simulation.dataset_fingerprint(relations_df, origins_df, destinations_df)
+        with self._condition: self._datasets.setdefault(key, (relations_df, origins_df, destinations_df))
+        return key
+
+    def map(self, function_name, dataset_key, tasks_args, timeout=None):
+        """Met en file une tâche `function_name` (TASK_FUNCTIONS) par tuple d'arguments, sur le réseau `dataset_key`
+        (voir register_dataset) ; renvoie un itérateur des résultats dans l'ordre des tâches.
+
+        Lève TimeoutError si aucun processus de calcul n'est connecté dans les `worker_wait_s` secondes, au départ ou
+        après la déconnexion du dernier ; `timeout` borne l'attente de chaque résultat (TimeoutError). Une tâche en
+        erreur lève RemoteTaskError.
+        Si l'itérateur est abandonné, les tâches encore en file sont retirées.
+        """
+        if function_name not in TASK_FUNCTIONS: raise ValueError(f"Tâche inconnue : {function_name!r}")
+        if dataset_key not in self._datasets: raise ValueError(f"Réseau non enregistré : {dataset_key}")
+        if not self.wait_for_workers(1, self.worker_wait_s): raise self._no_worker_error()
+        tasks = [_Task(next(self._task_ids), function_name, dataset_key, tuple(args)) for args in tasks_args]
+        with self._condition: self._queue.extend(tasks); self._condition.notify_all()
+        return self._results(tasks, timeout)
+
+    def _no_worker_error(self):
+        return TimeoutError(f"Aucun processus de calcul connecté à {self.address[0]}:{self.address[1]} après {self.worker_wait_s} s "
+                            "(lancer calcul_distribue.py sur les machines de calcul).")
+
+    def _results(self, tasks, timeout):
+        try:
+            for task in tasks:
+                with self._condition:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while not (task.done or self._closed):
+                        if not self._workers:
+                            # Tous les processus sont partis (la tâche est remise en file) : un autre doit se connecter
+                            if not self._condition.wait_for(lambda: task.done or self._closed or self._workers, self.worker_wait_s): raise self._no_worker_error()
+                            continue
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0: raise TimeoutError(f"Tâche {task.task_id} sans résultat après {timeout} s.")
+                        self._condition.wait(remaining)
+                    if not task.done: raise RuntimeError("Coordinateur fermé avant la fin des tâches.")
+                if task.error is not None: raise RemoteTaskError(task.error)
+                yield task.result
+        finally:
+            with self._condition:
+                for task in tasks: task.cancelled = True
+
+    def close(self):
+        with self._condition: self._closed = True; self._condition.notify_all()
+        self._listener.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try: conn = self._listener.accept()
+            except (multiprocessing.AuthenticationError, EOFError, ConnectionError): continue
+            except OSError: break  # Écoute fermée
+            threading.Thread(target=self._serve_worker, args=(conn,), name='coordinateur-calcul', daemon=True).start()
+
+    def _next_task(self, conn):
+        # Tâche suivante pour ce processus (None si le coordinateur est fermé) ; en attendant, ses signes de vie sont relevés
+        last_seen = time.monotonic()
+        with self._condition:
+            while True:
+                while self._queue and self._queue[0].cancelled: self._queue.popleft()
+                if self._closed: return None
+                if self._queue: return self._queue.popleft()
+                self._condition.wait(1.0)
+                while conn.poll(0): conn.recv(); last_seen = time.monotonic()
+                if time.monotonic() - last_seen > self.worker_timeout_s: raise TimeoutError("Processus de calcul muet.")
+
+    def _serve_worker(self, conn):
+        worker_id = next(self._worker_ids); task = None
+        try:
+            if not conn.poll(self.worker_timeout_s): return
+            _, name = conn.recv()
+            with self._condition: self._workers[worker_id] = name; self._condition.notify_all()
+            while True:
+                task = self._next_task(conn)
+                if task is None: conn.send(('stop',)); return
+                task.attempts += 1
+                conn.send(('task', task.task_id, task.function_name, task.dataset_key, task.args))
+                while True:
+                    if not conn.poll(self.worker_timeout_s): raise TimeoutError("Processus de calcul muet.")
+                    message = conn.recv()
+                    if message[0] == 'need_dataset': conn.send(('dataset', message[1], self._datasets[message[1]]))
+                    elif message[0] in ('result', 'error'): break
+                with self._condition:
+                    if message[0] == 'result': task.result = message[2]
+                    else: task.error = message[2]
+                    task.done = True; self.tasks_completed += 1; self._condition.notify_all()
+                task = None
+        except (EOFError, OSError, pickle.UnpicklingError):
+            pass
+        finally:
+            with self._condition:
+                if self._workers.pop(worker_id, None) is not None and not self._closed: self.workers_lost += 1
+                if task is not None and not task.cancelled:
+                    if task.attempts >= self.max_attempts: task.error = f"Tâche {task.task_id} perdue {task.attempts} fois (processus de calcul déconnectés)."; task.done = True
+                    else: self._queue.appendleft(task); self.tasks_reassigned += 1
+                self._condition.notify_all()
+            conn.close()
+
+# --- Processus de calcul ---
+def _network(dataset_key, cache_dir, send, conn):
+    # Réseau demandé au coordinateur seulement s'il n'est pas dans le dossier de cache ; l'empreinte est vérifiée
+    path = os.path.join(cache_dir, f"{dataset_key}.pkl") if cache_dir else None
+    tables = None
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'rb') as f: tables = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError): tables = None
+        if tables is not None and cache_simulation.dataset_fingerprint(*tables) != dataset_key: tables = None
+    if tables is None:
+        send(('need_dataset', dataset_key)); _, _, tables = conn.recv()
+        if cache_simulation.dataset_fingerprint(*tables) != dataset_key: raise ValueError(f"Réseau reçu différent de son empreinte {dataset_key}.")
+        if path:
+            # Nom temporaire unique : plusieurs processus de calcul d'une machine partagent le dossier de cache
+            os.makedirs(cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=dataset_key, suffix='.tmp', delete=False) as f:
+                try: pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except BaseException: f.close(); os.remove(f.name); raise
+            os.replace(f.name, path)
+    relations_df, origins_df, destinations_df = tables
+    return relations_df, origins_df, destinations_df, sim.RelationIndex(relations_df, origins_df.index, destinations_df.index)
+
+def run_worker(address, authkey, cache_dir=None, heartbeat_s=5.0, name=None):
+    """Processus de calcul : exécute les tâches du coordinateur jusqu'à son ordre d'arrêt ou la déconnexion.
+
+    Un signe de vie est envoyé toutes les `heartbeat_s` secondes (à garder sous le worker_timeout_s du
+    coordinateur). Les réseaux reçus restent en mémoire et, avec `cache_dir`, sur disque. Renvoie le nombre de tâches exécutées.
+    """
+    conn = Client(address, authkey=authkey); send_lock = threading.Lock(); stopped = threading.Event()
+    def send(message):
+        with send_lock: conn.send(message)
+    def heartbeat():
+        while not stopped.wait(heartbeat_s):
+            try: send(('heartbeat',))
+            except OSError: return
+    threading.Thread(target=heartbeat, name='signe-de-vie', daemon=True).start()
+    networks = {}; tasks_done = 0
+    try:
+        send(('hello', name or f"{socket.gethostname()}:{os.getpid()}"))
+        while True:
+            message = conn.recv()
+            if message[0] == 'stop': break
+            _, task_id, function_name, dataset_key, args = message
+            try:
+                if dataset_key not in networks: networks[dataset_key] = _network(dataset_key, cache_dir, send, conn)
+                reply = ('result', task_id, TASK_FUNCTIONS[function_name](networks[dataset_key], *args))
+            except Exception:
+                reply = ('error', task_id, traceback.format_exc())
+            send(reply); tasks_done += 1
+    except (EOFError, OSError):
+        pass
+    finally:
+        stopped.set(); conn.close()
+    return tasks_done
+
+def start_local_workers(address, authkey, count, cache_dir=None, heartbeat_s=5.0):
+    """Lance `count` processus de calcul sur cette machine (nœud à plusieurs cœurs, ou essais sur une seule machine)."""
+    processes = [multiprocessing.Process(target=run_worker, args=(address, authkey, cache_dir, heartbeat_s), name=f"calcul-{k + 1}", daemon=True) for k in range(count)]
+    for process in processes: process.start()
+    return processes
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Processus de calcul pour les évaluations réparties d'un coordinateur.")
+    parser.add_argument('address', help="Adresse du coordinateur, hôte:port")
+    parser.add_argument('--authkey', default=os.environ.get('SIMULATEUR_AUTHKEY'), help="Clé partagée (sinon variable SIMULATEUR_AUTHKEY)")
+    parser.add_argument('--workers', type=int, default=1, help="Nombre de processus de calcul sur cette machine")
+    parser.add_argument('--cache-dir', default='.cache_reseaux', help="Dossier de cache des réseaux reçus")
+    parser.add_argument('--heartbeat', type=float, default=5.0, help="Intervalle des signes de vie (secondes)")
+    args = parser.parse_args()
+    if not args.authkey: parser.error("--authkey (ou SIMULATEUR_AUTHKEY) est requis.")
+    for process in start_local_workers(parse_address(args.address), args.authkey.encode(), args.workers, args.cache_dir, args.heartbeat): process.join()
@@ -1,8 +1,17 @@
 # Fichier : simulation_logic.py
 
 import pandas as pd
+import numpy as np
 import math
 import itertools
+import os
+import time
+import contextlib
+import tracemalloc
+from array import array
+
+import ingestion
+from concurrent.futures import ProcessPoolExecutor
 
 # --- Configuration Globale ---
 WAGON_CAPACITY_TONS = 50
@@ -13,113 +22,779 @@ KM_PER_DAY_FOR_WAGON_RETURN = 200
 EPSILON = 1e-9
 
 # --- 1. Charger et Nettoyer les données depuis CSV ---
-def load_data_csv(fichier_relations_path, fichier_origines_path, fichier_destinations_path):
+def load_data_csv(fichier_relations_path, fichier_origines_path, fichier_destinations_path, cache_dir=None):
+    # Nettoyage commun avec l'application (voir ingestion.load_network) ; `cache_dir` active l'instantané Parquet
     print(f"\n--- Chargement et Nettoyage des Données depuis Fichiers CSV ---")
     try:
-        def clean_numeric_column(series):
-            return series.astype(str).str.replace('\u202f', '', regex=False).str.replace(',', '.', regex=False).str.strip()
-        relations_df = pd.read_csv(fichier_relations_path, dtype=str)
-        relations_df['origin'] = relations_df['origin'].str.strip()
-        relations_df['destination'] = relations_df['destination'].str.strip()
-        relations_df['distance_km'] = clean_numeric_column(relations_df['distance_km']).astype(float)
-        relations_df['profitability'] = clean_numeric_column(relations_df['profitability']).astype(int)
-        origins_df_raw = pd.read_csv(fichier_origines_path, dtype=str)
-        origins_df_raw['id'] = origins_df_raw['id'].str.strip()
-        origins_df_raw['daily_loading_capacity_tons'] = clean_numeric_column(origins_df_raw['daily_loading_capacity_tons']).astype(float)
-        origins_df_raw['initial_available_product_tons'] = clean_numeric_column(origins_df_raw['initial_available_product_tons']).astype(float)
-        origins_df = origins_df_raw.set_index('id')
-        destinations_df_raw = pd.read_csv(fichier_destinations_path, dtype=str)
-        destinations_df_raw['id'] = destinations_df_raw['id'].str.strip()
-        destinations_df_raw['daily_unloading_capacity_tons'] = clean_numeric_column(destinations_df_raw['daily_unloading_capacity_tons']).astype(float)
-        destinations_df_raw['annual_demand_tons'] = clean_numeric_column(destinations_df_raw['annual_demand_tons']).astype(float)
-        destinations_df = destinations_df_raw.set_index('id')
-        return relations_df, origins_df, destinations_df
+        return ingestion.load_network(fichier_relations_path, fichier_origines_path, fichier_destinations_path, cache_dir)
     except Exception as e:
         print(f"Erreur CSV: {e}")
         raise
 
-# --- 2. Initialiser les variables de suivi (Commun) ---
-def initialize_tracking_variables(origins_df, destinations_df, num_initial_wagons=100):
-    origins_df_sim = origins_df.copy()
-    destinations_df_sim = destinations_df.copy()
-    origins_df_sim['current_available_product_tons'] = origins_df_sim['initial_available_product_tons'].astype(float)
-    destinations_df_sim['delivered_so_far_tons'] = 0.0
-    destinations_df_sim['remaining_annual_demand_tons'] = destinations_df_sim['annual_demand_tons'].astype(float)
-    destinations_df_sim['q_min_initial_target_tons'] = 0.20 * destinations_df_sim['annual_demand_tons']
-    destinations_df_sim['q_min_initial_delivered_tons'] = 0.0
-    tracking_vars = {'wagons_available': num_initial_wagons, 'wagons_in_transit': [], 'shipments_log': [], 'daily_wagon_log': [] }
-    return origins_df_sim, destinations_df_sim, tracking_vars
+# --- 2. Initialiser l'état de simulation (Commun) ---
+def sort_order(values, ascending=True):
+    # Reproduit exactement l'ordre de DataFrame.sort_values (nargsort, kind='quicksort', NaN en dernier), égalités comprises
+    values = np.asarray(values)
+    if values.dtype.kind == 'f' and not np.isnan(values).any():
+        # Cas courant (réels sans NaN) : mêmes appels à argsort, sans masque ni concaténation
+        if ascending: return values.argsort(kind='quicksort').tolist()
+        return (len(values) - 1 - values[::-1].argsort(kind='quicksort'))[::-1].tolist()
+    mask = pd.isna(values); idx = np.arange(len(values))
+    non_nans = values[~mask]; non_nan_idx = idx[~mask]
+    if not ascending: non_nans = non_nans[::-1]; non_nan_idx = non_nan_idx[::-1]
+    indexer = non_nan_idx[non_nans.argsort(kind='quicksort')]
+    if not ascending: indexer = indexer[::-1]
+    return np.concatenate([indexer, np.nonzero(mask)[0]]).tolist()
+
+class DescendingOrder:
+    """Ordre décroissant, tenu à jour d'un appel à l'autre, des entrées > EPSILON d'un tableau qui change peu.
+
+    `full_order(values)` donne l'ordre de référence (appel à sort_order) ; il n'est recalculé que si deux entrées
+    retenues sont égales (l'ordre des égalités dépend alors de l'algorithme de tri) ou en présence de NaN. Sinon,
+    seules les entrées modifiées depuis l'appel précédent sont retirées, triées et réinsérées : sans égalité,
+    l'ordre décroissant est unique et identique à celui de `full_order`.
+    """
+    def __init__(self, full_order):
+        self.full_order = full_order; self.values = None; self.order = None
+
+    def __call__(self, values):
+        if self.values is not None and len(values) == len(self.values):
+            changed = np.flatnonzero(values != self.values)
+            if not len(changed): return self.order.tolist()
+            kept = np.ones(len(values), dtype=bool); kept[changed] = False; kept = self.order[kept[self.order]]
+            moved = changed[values[changed] > EPSILON]; moved = moved[np.argsort(-values[moved], kind='stable')]
+            order = np.insert(kept, np.searchsorted(-values[kept], -values[moved]), moved)
+            ordered = values[order]
+            if (ordered[:-1] > ordered[1:]).all(): self.values = values.copy(); self.order = order; return order.tolist()
+        if np.isnan(values).any(): self.values = None; return self.full_order(values)
+        self.values = values.copy(); self.order = np.array([k for k in self.full_order(values) if values[k] > EPSILON], dtype=np.intp)
+        return self.order.tolist()
+
+def open_destinations_order(remaining):
+    # Destinations de demande restante > EPSILON, par demande restante décroissante (ordre Phase 2 H2 par défaut)
+    open_slots = np.flatnonzero(remaining > EPSILON)
+    return open_slots[sort_order(remaining[open_slots], False)].tolist()
+
+class SimulationCancelled(Exception):
+    """Levée par un rappel de progression pour interrompre une simulation ou une optimisation en cours."""
+
+# --- Instrumentation optionnelle (Commun) ---
+NO_PROFILING = contextlib.nullcontext()
+
+class SimulationProfiler:
+    """Temps par phase, appels à `process_shipment` et pic mémoire (tracemalloc) d'une simulation.
+
+    Phases : 'qmin_initial' (passage du jour 1), 'qmin_daily', 'phase2', 'wagons' (retours, capacités, journal
+    des wagons, jours sautés) et 'results' (calcul du profit et tables finales).
+    """
+    PHASES = ('qmin_initial', 'qmin_daily', 'phase2', 'wagons', 'results')
+
+    def __init__(self, track_memory=True):
+        self.phase_seconds = dict.fromkeys(self.PHASES, 0.0); self.shipment_calls = 0
+        self.track_memory = track_memory; self.peak_memory_bytes = None; self.total_seconds = 0.0
+        self._started_at = None; self._owns_tracemalloc = False
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        if self.track_memory:
+            if not tracemalloc.is_tracing(): tracemalloc.start(); self._owns_tracemalloc = True
+            tracemalloc.reset_peak()
+
+    def stop(self):
+        if self._started_at is not None: self.total_seconds = time.perf_counter() - self._started_at
+        if self.track_memory and tracemalloc.is_tracing():
+            self.peak_memory_bytes = tracemalloc.get_traced_memory()[1]
+            if self._owns_tracemalloc: tracemalloc.stop(); self._owns_tracemalloc = False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.phase_seconds[name] += time.perf_counter() - t0
+
+    def report(self, num_shipments, days_simulated):
+        return {'phase_seconds': dict(self.phase_seconds), 'total_seconds': self.total_seconds, 'days_simulated': days_simulated,
+                'process_shipment_calls': self.shipment_calls, 'process_shipment_rejections': self.shipment_calls - num_shipments,
+                'peak_memory_bytes': self.peak_memory_bytes}
+
+def profiled(profiler, phase):
+    # Contexte de mesure de la phase, ou contexte vide si l'instrumentation est désactivée
+    return NO_PROFILING if profiler is None else profiler.phase(phase)
+
+class WagonFleet:
+    """Flotte de wagons : retours rangés par jour (calendrier) et compteur courant des wagons en transit.
+
+    Libérer les retours du jour et journaliser la flotte coûtent O(1) par jour, quel que soit le nombre
+    d'expéditions en cours.
+    """
+    def __init__(self, num_wagons):
+        self.available = num_wagons; self.in_transit = 0; self.returns_by_day = {}
+
+    def dispatch(self, num_wagons, return_day):
+        self.available -= num_wagons; self.in_transit += num_wagons
+        self.returns_by_day[return_day] = self.returns_by_day.get(return_day, 0) + num_wagons
+
+    def release(self, day_t):
+        returned_wagons = self.returns_by_day.pop(day_t, 0)
+        self.available += returned_wagons; self.in_transit -= returned_wagons
+        return returned_wagons
+
+    def next_return_day(self):
+        return min(self.returns_by_day) if self.returns_by_day else None
+
+    def transit_records(self):
+        # Wagons en transit au format historique de `tracking_vars['wagons_in_transit']` (un enregistrement par jour de retour)
+        return [{'return_day': return_day, 'num_wagons': num_wagons} for return_day, num_wagons in sorted(self.returns_by_day.items())]
+
+# --- Journal des expéditions en colonnes (Commun) ---
+SHIPMENT_COLUMNS = ('ship_day', 'arrival_day', 'origin', 'destination', 'quantity_tons', 'wagons_used', 'type')
+SHIPMENT_SPILL_CHUNK_ROWS = 65_536
+
+class ShipmentRecorder:
+    """Journal des expéditions en colonnes typées (array.array), origines, destinations et types codés par entiers.
+
+    Se parcourt et se découpe (`log[:n]`) comme l'ancienne liste de dictionnaires ; `to_frame` construit
+    `shipments_df` avec des colonnes catégorielles. Avec `spill_path` (.parquet ou .csv), les lignes sont écrites
+    par blocs de `chunk_rows` pendant la simulation, puis relues par `to_frame`.
+    """
+    def __init__(self, origin_ids, dest_ids, spill_path=None, chunk_rows=SHIPMENT_SPILL_CHUNK_ROWS):
+        self.origin_ids = np.array(origin_ids, dtype=object); self.dest_ids = np.array(dest_ids, dtype=object)
+        self.type_names = []; self._type_codes = {}
+        self.columns = {'ship_day': array('i'), 'arrival_day': array('i'), 'origin': array('i'), 'destination': array('i'),
+                        'quantity_tons': array('d'), 'wagons_used': array('i'), 'type': array('i')}
+        self.spill_path = spill_path; self.chunk_rows = chunk_rows; self.spilled_rows = 0; self._writer = None
+
+    def append(self, ship_day, arrival_day, o, d, quantity_tons, wagons_used, type_name):
+        type_code = self._type_codes.get(type_name)
+        if type_code is None: type_code = self._type_codes[type_name] = len(self.type_names); self.type_names.append(type_name)
+        columns = self.columns
+        columns['ship_day'].append(ship_day); columns['arrival_day'].append(arrival_day); columns['origin'].append(o); columns['destination'].append(d)
+        columns['quantity_tons'].append(quantity_tons); columns['wagons_used'].append(wagons_used); columns['type'].append(type_code)
+        if self.spill_path is not None and len(columns['ship_day']) >= self.chunk_rows: self._spill()
+
+    def __len__(self):
+        return self.spilled_rows + len(self.columns['ship_day'])
+
+    def to_arrays(self):
+        """Colonnes en tableaux NumPy (origines, destinations et types codés) et noms des types ; journal en mémoire uniquement."""
+        if self.spilled_rows: raise ValueError("Un journal écrit sur disque ne peut pas être exporté en tableaux.")
+        return {name: np.frombuffer(values, dtype=np.intc if values.typecode == 'i' else float).copy() for name, values in self.columns.items()}, list(self.type_names)
+
+    @classmethod
+    def from_arrays(cls, origin_ids, dest_ids, columns, type_names):
+        recorder = cls(origin_ids, dest_ids)
+        for name, values in columns.items():
+            column = recorder.columns[name]; column.frombytes(np.ascontiguousarray(values, dtype=np.intc if column.typecode == 'i' else float).tobytes())
+        recorder.type_names = list(type_names); recorder._type_codes = {type_name: code for code, type_name in enumerate(recorder.type_names)}
+        return recorder
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            # Copie tronquée (reprise depuis un point de sauvegarde) ; impossible au-delà des lignes déjà écrites sur disque
+            start, stop, step = key.indices(len(self))
+            if start != 0 or step != 1 or stop < self.spilled_rows: raise ValueError("Seuls les préfixes du journal en mémoire peuvent être extraits.")
+            prefix = ShipmentRecorder.__new__(ShipmentRecorder); prefix.__dict__.update(self.__dict__)
+            prefix.type_names = list(self.type_names); prefix._type_codes = dict(self._type_codes); prefix._writer = None
+            prefix.columns = {name: values[:stop - self.spilled_rows] for name, values in self.columns.items()}
+            return prefix
+        row = key - self.spilled_rows if key >= 0 else len(self.columns['ship_day']) + key
+        if not 0 <= row < len(self.columns['ship_day']): raise IndexError(key)
+        return self._decode_row(row)
+
+    def __iter__(self):
+        if self.spilled_rows: yield from self.to_frame().to_dict('records'); return
+        for row in range(len(self.columns['ship_day'])): yield self._decode_row(row)
+
+    def _decode_row(self, row):
+        values = {name: column[row] for name, column in self.columns.items()}
+        values['origin'] = self.origin_ids[values['origin']]; values['destination'] = self.dest_ids[values['destination']]
+        values['type'] = self.type_names[values['type']]
+        return {name: values[name] for name in SHIPMENT_COLUMNS}
+
+    def _memory_frame(self, categorical):
+        columns = {name: np.frombuffer(values, dtype=np.intc if values.typecode == 'i' else float).astype(np.int64 if values.typecode == 'i' else float) for name, values in self.columns.items()}
+        origins = self.origin_ids[columns['origin']]; destinations = self.dest_ids[columns['destination']]
+        if categorical:
+            columns['origin'] = pd.Categorical(origins); columns['destination'] = pd.Categorical(destinations)
+            columns['type'] = pd.Categorical.from_codes(columns['type'], categories=self.type_names) if self.type_names else pd.Categorical([])
+        else:
+            columns['origin'] = origins; columns['destination'] = destinations; columns['type'] = np.array(self.type_names, dtype=object)[columns['type']]
+        return pd.DataFrame({name: columns[name] for name in SHIPMENT_COLUMNS})
+
+    def _spill(self):
+        chunk = self._memory_frame(categorical=False)
+        if self.spill_path.endswith('.parquet'):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None: self._writer = pq.ParquetWriter(self.spill_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.spill_path, mode='a' if self.spilled_rows else 'w', header=not self.spilled_rows, index=False)
+        self.spilled_rows += len(chunk)
+        for values in self.columns.values(): del values[:]
+
+    def to_frame(self):
+        """DataFrame des expéditions ; en mode disque, termine l'écriture et relit le fichier."""
+        if not self.spilled_rows: return self._memory_frame(categorical=True)
+        if self._writer is not None: self._writer.close(); self._writer = None
+        if self.spill_path.endswith('.parquet'): spilled = pd.read_parquet(self.spill_path)
+        else: spilled = pd.read_csv(self.spill_path, dtype={'origin': str, 'destination': str, 'type': str})
+        frame = pd.concat([spilled, self._memory_frame(categorical=False)], ignore_index=True)
+        for name in ('origin', 'destination'): frame[name] = frame[name].astype('category')
+        frame['type'] = pd.Categorical(frame['type'], categories=self.type_names)  # Types dans l'ordre d'apparition, comme en mémoire
+        return frame
+
+class ProfitRecorder:
+    """Journal réduit des évaluations d'optimisation (mode `lean`) : origine, destination et tonnage de chaque expédition.
+
+    Même ajout et même découpage en préfixe que ShipmentRecorder ; `profit` donne le profit sans construire
+    `shipments_df` ni faire de jointure avec les relations (voir RelationIndex.shipment_profit).
+    """
+    def __init__(self):
+        self.origins = array('i'); self.dests = array('i'); self.quantities = array('d')
+
+    def append(self, ship_day, arrival_day, o, d, quantity_tons, wagons_used, type_name):
+        self.origins.append(o); self.dests.append(d); self.quantities.append(quantity_tons)
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __getitem__(self, key):
+        # Préfixe du journal (reprise depuis un point de sauvegarde)
+        prefix = ProfitRecorder.__new__(ProfitRecorder)
+        prefix.origins = self.origins[key]; prefix.dests = self.dests[key]; prefix.quantities = self.quantities[key]
+        return prefix
+
+    def profit(self, relation_index):
+        return relation_index.shipment_profit(np.frombuffer(self.origins, dtype=np.intc), np.frombuffer(self.dests, dtype=np.intc), np.frombuffer(self.quantities, dtype=float))
+
+class SimulationState:
+    """État de simulation indexé par entiers.
+
+    Les identifiants d'origines et de destinations sont associés à des positions fixes ; stocks, demandes,
+    progression QMIN et capacités journalières restantes sont des tableaux NumPy contigus. Les DataFrames
+    `final_origins_df` / `final_destinations_df` ne sont reconstruits qu'en fin de simulation (`to_frames`).
+    Avec `lean`, seul un ProfitRecorder est tenu (ni journal détaillé des expéditions, ni journal des wagons).
+    """
+    def __init__(self, origins_df, destinations_df, num_initial_wagons=100, shipments_spill_path=None, lean=False):
+        self.origins_base_df = origins_df; self.destinations_base_df = destinations_df
+        self.origin_ids = origins_df.index.tolist(); self.dest_ids = destinations_df.index.tolist()
+        self.origin_slot = {orig_id: i for i, orig_id in enumerate(self.origin_ids)}
+        self.dest_slot = {dest_id: i for i, dest_id in enumerate(self.dest_ids)}
+        self.orig_stock = origins_df['initial_available_product_tons'].to_numpy(dtype=float, copy=True)
+        self.orig_load_cap = origins_df['daily_loading_capacity_tons'].to_numpy(dtype=float, copy=True)
+        self.dest_unload_cap = destinations_df['daily_unloading_capacity_tons'].to_numpy(dtype=float, copy=True)
+        self.dest_annual_demand = destinations_df['annual_demand_tons'].to_numpy(dtype=float, copy=True)
+        self.dest_delivered = np.zeros(len(self.dest_ids))
+        self.dest_remaining = self.dest_annual_demand.copy()
+        self.dest_qmin_target = 0.20 * self.dest_annual_demand
+        self.dest_qmin_delivered = np.zeros(len(self.dest_ids))
+        self.orig_load_remaining = self.orig_load_cap.copy(); self.dest_unload_remaining = self.dest_unload_cap.copy()
+        self.fleet = WagonFleet(num_initial_wagons)
+        if lean: self.tracking_vars = {'shipments_log': ProfitRecorder()}
+        else: self.tracking_vars = {'shipments_log': ShipmentRecorder(self.origin_ids, self.dest_ids, shipments_spill_path), 'daily_wagon_log': []}
+        self.profiler = None
+        self._qmin_target_order = None; self.qmin_relation_plans = {}
+
+    def reset_daily_capacities(self):
+        np.copyto(self.orig_load_remaining, self.orig_load_cap); np.copyto(self.dest_unload_remaining, self.dest_unload_cap)
+
+    def dest_column(self, column):
+        # Colonne de tri des destinations : valeurs courantes de la simulation, sinon colonne du fichier d'entrée
+        columns = {'annual_demand_tons': self.dest_annual_demand, 'remaining_annual_demand_tons': self.dest_remaining,
+                   'q_min_initial_target_tons': self.dest_qmin_target, 'q_min_initial_delivered_tons': self.dest_qmin_delivered,
+                   'delivered_so_far_tons': self.dest_delivered}
+        if column in columns: return columns[column]
+        if column in self.destinations_base_df.columns: return self.destinations_base_df[column].to_numpy()
+        return None
+
+    SNAPSHOT_ARRAYS = ('orig_stock', 'orig_load_cap', 'dest_unload_cap', 'dest_delivered', 'dest_remaining', 'dest_qmin_delivered', 'orig_load_remaining', 'dest_unload_remaining')
+
+    def snapshot(self):
+        # Les journaux ne croissent que par ajout : on conserve la liste et sa longueur plutôt qu'une copie
+        return {'arrays': {name: getattr(self, name).copy() for name in self.SNAPSHOT_ARRAYS},
+                'fleet': (self.fleet.available, self.fleet.in_transit, dict(self.fleet.returns_by_day)),
+                'logs': {name: (log, len(log)) for name, log in self.tracking_vars.items()}}
+
+    def restore(self, snapshot):
+        for name, values in snapshot['arrays'].items(): setattr(self, name, values.copy())
+        self.fleet.available, self.fleet.in_transit, returns_by_day = snapshot['fleet']; self.fleet.returns_by_day = dict(returns_by_day)
+        self.tracking_vars = {name: log[:length] for name, (log, length) in snapshot['logs'].items()}
+
+    def qmin_target_order(self):
+        # Ordre QMIN par défaut (objectif QMIN décroissant) ; l'objectif ne change pas pendant la simulation
+        if self._qmin_target_order is None: self._qmin_target_order = sort_order(self.dest_qmin_target, False)
+        return self._qmin_target_order
+
+    def qmin_needed(self, d):
+        return self.dest_qmin_target[d] - self.dest_qmin_delivered[d]
+
+    def qmin_active_mask(self):
+        # Destinations traitées par la phase QMIN (besoin QMIN restant)
+        return ~(self.dest_qmin_target - self.dest_qmin_delivered <= EPSILON)
+
+    def phase2_eligible_mask(self):
+        # Destinations pouvant recevoir en Phase 2 (QMIN atteint, capacité de déchargement et demande restantes)
+        return ~(self.dest_qmin_delivered < self.dest_qmin_target - EPSILON) & ~(self.dest_unload_remaining <= EPSILON) & ~(self.dest_remaining <= EPSILON)
+
+    def all_demand_met(self):
+        return (self.dest_remaining <= EPSILON).all()
+
+    def any_shipment_possible(self, relation_index):
+        # Faux si aucune relation ne peut plus porter une expédition minimale : stocks et demandes ne font que
+        # diminuer, les capacités journalières sont plafonnées par leur valeur nominale
+        o = relation_index.known_origin; d = relation_index.known_dest
+        best_qty = np.minimum(np.minimum(self.orig_stock[o], self.orig_load_cap[o]), np.minimum(self.dest_remaining[d], self.dest_unload_cap[d]))
+        return bool(((best_qty >= MIN_SHIPMENT_FOR_ONE_WAGON_TONS) & (best_qty > EPSILON)).any())
+
+    def to_frames(self):
+        origins_df = self.origins_base_df.copy()
+        origins_df['current_available_product_tons'] = self.orig_stock.copy()
+        destinations_df = self.destinations_base_df.copy()
+        destinations_df['delivered_so_far_tons'] = self.dest_delivered.copy()
+        destinations_df['remaining_annual_demand_tons'] = self.dest_remaining.copy()
+        destinations_df['q_min_initial_target_tons'] = self.dest_qmin_target.copy()
+        destinations_df['q_min_initial_delivered_tons'] = self.dest_qmin_delivered.copy()
+        return origins_df, destinations_df
+
+def initialize_tracking_variables(origins_df, destinations_df, num_initial_wagons=100, shipments_spill_path=None, lean=False):
+    return SimulationState(origins_df, destinations_df, num_initial_wagons, shipments_spill_path, lean)
+
+# --- Index d'adjacence des relations (Commun) ---
+def _csr_rows(keys, mask, n):
+    # Lignes retenues regroupées par clé (tri stable : l'ordre du fichier est conservé) et pointeurs de début
+    rows = np.flatnonzero(mask); rows = rows[np.argsort(keys[rows], kind='stable')]
+    ptr = np.zeros(n + 1, dtype=np.intp); ptr[1:] = np.cumsum(np.bincount(keys[rows], minlength=n))
+    return ptr, rows
+
+class RelationIndex:
+    """Listes de voisins des relations (format CSR), par destination et par origine.
+
+    Construit une fois par jeu de données : les recherches journalières coûtent le degré du nœud au lieu
+    d'un parcours complet de `relations_df`. Dans chaque liste, l'ordre des lignes du fichier est conservé.
+    """
+    def __init__(self, relations_df, origin_ids, dest_ids):
+        self.origin_ids = list(origin_ids); self.dest_ids = list(dest_ids)
+        origin_slot = {orig_id: i for i, orig_id in enumerate(self.origin_ids)}
+        dest_slot = {dest_id: i for i, dest_id in enumerate(self.dest_ids)}
+        self.rel_origin = np.array([origin_slot.get(orig_id, -1) for orig_id in relations_df['origin']], dtype=np.intp)
+        self.rel_dest = np.array([dest_slot.get(dest_id, -1) for dest_id in relations_df['destination']], dtype=np.intp)
+        self.rel_distance_km = relations_df['distance_km'].to_numpy(dtype=float)
+        self.rel_profitable = (relations_df['profitability'] == 1).to_numpy(dtype=bool)
+        known = (self.rel_origin >= 0) & (self.rel_dest >= 0)
+        self.known_origin = self.rel_origin[known]; self.known_dest = self.rel_dest[known]
+        n_orig, n_dest = len(self.origin_ids), len(self.dest_ids)
+        self.dest_ptr, self.dest_rows = _csr_rows(self.rel_dest, known, n_dest)
+        self.profitable_dest_ptr, self.profitable_dest_rows = _csr_rows(self.rel_dest, known & self.rel_profitable, n_dest)
+        self.profitable_origin_ptr, self.profitable_origin_rows = _csr_rows(self.rel_origin, known & self.rel_profitable, n_orig)
+        # Listes (position, distance) pour les boucles scalaires de la simulation
+        self.dest_neighbors = self._neighbor_lists(self.dest_ptr, self.dest_rows, self.rel_origin)
+        self.profitable_dest_neighbors = self._neighbor_lists(self.profitable_dest_ptr, self.profitable_dest_rows, self.rel_origin)
+        self.profitable_origin_neighbors = self._neighbor_lists(self.profitable_origin_ptr, self.profitable_origin_rows, self.rel_dest)
+        self.profitable_origin_dest_slots = [list(dict.fromkeys(d for d, _ in rel_list)) for rel_list in self.profitable_origin_neighbors]
+        # Mêmes voisins rentables par destination en tableaux (origines, distances) pour la sélection vectorisée H2
+        self.profitable_dest_arrays = [(self.rel_origin[rows], self.rel_distance_km[rows])
+                                       for rows in np.split(self.profitable_dest_rows, self.profitable_dest_ptr[1:-1])]
+        self._pair_table = None
+
+    def _neighbor_lists(self, ptr, rows, neighbor_slots):
+        slots = neighbor_slots[rows].tolist(); dists = self.rel_distance_km[rows].tolist(); ptr = ptr.tolist()
+        return [list(zip(slots[ptr[k]:ptr[k + 1]], dists[ptr[k]:ptr[k + 1]])) for k in range(len(ptr) - 1)]
+
+    def shipment_profit(self, origins, dests, quantities):
+        # Profit d'expéditions (positions, tonnages) égal à celui de build_simulation_results : chaque expédition compte
+        # une fois par relation de son couple (ordre du fichier, distance manquante = 0), somme dans l'ordre des expéditions
+        if self._pair_table is None:
+            rows = np.flatnonzero((self.rel_origin >= 0) & (self.rel_dest >= 0))
+            codes = self.rel_origin[rows] * len(self.dest_ids) + self.rel_dest[rows]; order = np.argsort(codes, kind='stable')
+            pair_codes, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+            distances = self.rel_distance_km[rows[order]]
+            self._pair_table = (pair_codes, starts, counts, np.where(np.isnan(distances), 0.0, distances))
+        if not len(quantities): return 0.0
+        pair_codes, starts, counts, distances = self._pair_table
+        pos = np.searchsorted(pair_codes, origins.astype(np.intp) * len(self.dest_ids) + dests); n = counts[pos]
+        rows = np.repeat(starts[pos] - (np.cumsum(n) - n), n) + np.arange(n.sum())
+        return float((np.repeat(quantities, n) * distances[rows]).sum())
+
+    def dest_neighbor_origins(self, d):
+        return self.rel_origin[self.dest_rows[self.dest_ptr[d]:self.dest_ptr[d + 1]]]
+
+    def profitable_dest_neighbor_origins(self, d):
+        return self.rel_origin[self.profitable_dest_rows[self.profitable_dest_ptr[d]:self.profitable_dest_ptr[d + 1]]]
+
+    def profitable_origin_neighbor_dests(self, o):
+        return self.rel_dest[self.profitable_origin_rows[self.profitable_origin_ptr[o]:self.profitable_origin_ptr[o + 1]]]
+
+    def matches(self, state):
+        return self.origin_ids == state.origin_ids and self.dest_ids == state.dest_ids
+
+    @classmethod
+    def for_state(cls, relation_index, relations_df, state):
+        # Réutilise l'index fourni s'il correspond aux origines/destinations de la simulation
+        if relation_index is not None and relation_index.matches(state): return relation_index
+        return cls(relations_df, state.origin_ids, state.dest_ids)
 
 # --- Fonction utilitaire pour gérer une expédition (Commun) ---
-def process_shipment(day_t, origin_id, dest_id, distance_km, desired_qty,
-                     origins_df, destinations_df, tracking_vars,
-                     origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining,
-                     log_prefix=""):
-    if desired_qty <= EPSILON or desired_qty < MIN_SHIPMENT_FOR_ONE_WAGON_TONS: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
-    if origin_id not in origins_df.index or dest_id not in destinations_df.index: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
-    qty_can_load = min(desired_qty, origin_daily_loading_cap_remaining, origins_df.loc[origin_id, 'current_available_product_tons'])
-    qty_can_unload_and_demand = min(desired_qty, dest_daily_unloading_cap_remaining, destinations_df.loc[dest_id, 'remaining_annual_demand_tons'])
+# `o` et `d` sont les positions de l'origine et de la destination dans `state`.
+def process_shipment(day_t, o, d, distance_km, desired_qty, state, log_prefix=""):
+    if state.profiler is not None: state.profiler.shipment_calls += 1
+    if desired_qty <= EPSILON or desired_qty < MIN_SHIPMENT_FOR_ONE_WAGON_TONS: return 0.0, 0
+    fleet = state.fleet
+    qty_can_load = min(desired_qty, state.orig_load_remaining[o], state.orig_stock[o])
+    qty_can_unload_and_demand = min(desired_qty, state.dest_unload_remaining[d], state.dest_remaining[d])
     potential_qty_to_ship = min(qty_can_load, qty_can_unload_and_demand)
-    if potential_qty_to_ship < MIN_SHIPMENT_FOR_ONE_WAGON_TONS or potential_qty_to_ship <= EPSILON: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
+    if potential_qty_to_ship < MIN_SHIPMENT_FOR_ONE_WAGON_TONS or potential_qty_to_ship <= EPSILON: return 0.0, 0
     wagons_needed_ideal = math.ceil(potential_qty_to_ship / WAGON_CAPACITY_TONS)
-    if tracking_vars['wagons_available'] == 0: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
-    wagons_to_use = min(wagons_needed_ideal, tracking_vars['wagons_available'])
+    if fleet.available == 0: return 0.0, 0
+    wagons_to_use = min(wagons_needed_ideal, fleet.available)
     actual_qty_to_ship = min(potential_qty_to_ship, wagons_to_use * WAGON_CAPACITY_TONS)
-    if (actual_qty_to_ship < MIN_SHIPMENT_FOR_ONE_WAGON_TONS and actual_qty_to_ship > EPSILON) or actual_qty_to_ship <= EPSILON: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
+    if (actual_qty_to_ship < MIN_SHIPMENT_FOR_ONE_WAGON_TONS and actual_qty_to_ship > EPSILON) or actual_qty_to_ship <= EPSILON: return 0.0, 0
     final_wagons_used = math.ceil(actual_qty_to_ship / WAGON_CAPACITY_TONS)
-    if final_wagons_used > tracking_vars['wagons_available']: return 0.0, 0, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
-    origins_df.loc[origin_id, 'current_available_product_tons'] -= actual_qty_to_ship
-    destinations_df.loc[dest_id, 'delivered_so_far_tons'] += actual_qty_to_ship
-    destinations_df.loc[dest_id, 'remaining_annual_demand_tons'] -= actual_qty_to_ship
-    origin_daily_loading_cap_remaining -= actual_qty_to_ship
-    dest_daily_unloading_cap_remaining -= actual_qty_to_ship
-    tracking_vars['wagons_available'] -= final_wagons_used
+    if final_wagons_used > fleet.available: return 0.0, 0
+    state.orig_stock[o] -= actual_qty_to_ship
+    state.dest_delivered[d] += actual_qty_to_ship
+    state.dest_remaining[d] -= actual_qty_to_ship
+    state.orig_load_remaining[o] -= actual_qty_to_ship
+    state.dest_unload_remaining[d] -= actual_qty_to_ship
     aller_days = max(1, math.ceil(distance_km / KM_PER_DAY_FOR_WAGON_RETURN))
     day_of_return = day_t + (2 * aller_days); day_of_arrival_at_dest = day_t + aller_days
-    tracking_vars['wagons_in_transit'].append({'return_day': day_of_return, 'num_wagons': final_wagons_used})
-    tracking_vars['shipments_log'].append({'ship_day': day_t, 'arrival_day': day_of_arrival_at_dest, 'origin': origin_id, 'destination': dest_id, 'quantity_tons': actual_qty_to_ship, 'wagons_used': final_wagons_used, 'type': log_prefix.strip() or "Standard"})
-    return actual_qty_to_ship, final_wagons_used, origin_daily_loading_cap_remaining, dest_daily_unloading_cap_remaining
+    fleet.dispatch(final_wagons_used, day_of_return)
+    state.tracking_vars['shipments_log'].append(day_t, day_of_arrival_at_dest, o, d, actual_qty_to_ship, final_wagons_used, log_prefix.strip() or "Standard")
+    return actual_qty_to_ship, final_wagons_used
 
 # --- Fonction pour obtenir l'itérateur de destinations (H1) ---
-def get_destination_iterator_h1(destinations_df_to_sort, sort_config):
+# Renvoie des positions de destinations ; `dest_slots` restreint (et ordonne) les destinations candidates.
+def get_destination_iterator_h1(state, sort_config, dest_slots=None):
     if sort_config is None: return None
     sort_type = sort_config[0]
     if sort_type == 'custom_order':
         custom_order_list = sort_config[1]
-        return [dest_id for dest_id in custom_order_list if dest_id in destinations_df_to_sort.index]
+        allowed = state.dest_slot if dest_slots is None else {state.dest_ids[d] for d in dest_slots}
+        return [state.dest_slot[dest_id] for dest_id in custom_order_list if dest_id in allowed]
     elif sort_type in ['q_min_initial_target_tons', 'annual_demand_tons', 'remaining_annual_demand_tons', 'min_distance_km']:
-        sort_column, ascending_order = sort_type, sort_config[1]
-        if sort_column in destinations_df_to_sort.columns:
-            return destinations_df_to_sort.sort_values(by=sort_column, ascending=ascending_order).index.tolist()
+        values = state.dest_column(sort_type)
+        if values is not None:
+            if dest_slots is None: return sort_order(values, sort_config[1])
+            return [dest_slots[k] for k in sort_order(values[dest_slots], sort_config[1])]
     return None
 
+def qmin_relations_for_destination(relation_index, state, d):
+    # Relations vers `d` dont l'origine est connue, triées par stock courant de l'origine décroissant. L'ordre est
+    # conservé dans l'état et n'est recalculé que si le stock d'une de ces origines a changé depuis le dernier appel.
+    stocks = state.orig_stock[relation_index.dest_neighbor_origins(d)]; key = stocks.tobytes()
+    cached = state.qmin_relation_plans.get(d)
+    if cached is not None and cached[0] == key: return cached[1]
+    rel_list = relation_index.dest_neighbors[d]
+    plan = [rel_list[k] for k in sort_order(stocks, False)]; state.qmin_relation_plans[d] = (key, plan)
+    return plan
+
+def ship_qmin_for_destination(day_t, relation_index, state, d, log_prefix):
+    # Expéditions QMIN vers `d` ; renvoie le nombre de wagons envoyés
+    wagons_sent = 0
+    needed = state.qmin_needed(d)
+    if needed <= EPSILON: return wagons_sent
+    for o, dist_km in qmin_relations_for_destination(relation_index, state, d):
+        if needed <= EPSILON: break
+        if state.orig_load_remaining[o] <= EPSILON or state.dest_unload_remaining[d] <= EPSILON or state.orig_stock[o] <= EPSILON: continue
+        shipped, wagons_used = process_shipment(day_t, o, d, dist_km, needed, state, log_prefix)
+        if shipped > EPSILON: wagons_sent += wagons_used; state.dest_qmin_delivered[d] += shipped; needed -= shipped
+    return wagons_sent
+
 # --- Fonctions spécifiques à H1 ---
-def attempt_initial_q_min_delivery_h1(relations_df, origins_df, destinations_df, tracking_vars, dest_sort_config=None, silent_mode=False):
-    day_for_q_min_shipments = 1; q_min_origin_caps = origins_df['daily_loading_capacity_tons'].copy(); q_min_dest_caps = destinations_df['daily_unloading_capacity_tons'].copy()
-    iterator = get_destination_iterator_h1(destinations_df, dest_sort_config)
-    if iterator is None: iterator = destinations_df.sort_values(by='q_min_initial_target_tons', ascending=False).index.tolist()
-    for dest_id in iterator:
-        if dest_id not in destinations_df.index: continue
-        needed = destinations_df.loc[dest_id, 'q_min_initial_target_tons'] - destinations_df.loc[dest_id, 'q_min_initial_delivered_tons']
-        if needed <= EPSILON: continue
-        possible_rels = relations_df[relations_df['destination'] == dest_id].copy().merge(origins_df[['current_available_product_tons']], left_on='origin', right_index=True).sort_values(by='current_available_product_tons', ascending=False)
-        for _, rel in possible_rels.iterrows():
-            orig_id, dist_km = rel['origin'], rel['distance_km']
-            if needed <= EPSILON: break
-            if orig_id not in origins_df.index: continue
-            if q_min_origin_caps.get(orig_id,0) <= EPSILON or q_min_dest_caps.get(dest_id,0) <= EPSILON or origins_df.loc[orig_id, 'current_available_product_tons'] <= EPSILON: continue
-            shipped, wagons_used, new_orig_cap, new_dest_cap = process_shipment(day_for_q_min_shipments, orig_id, dest_id, dist_km, needed, origins_df, destinations_df, tracking_vars, q_min_origin_caps[orig_id], q_min_dest_caps[dest_id], "[QMIN_INIT_J1_H1]")
-            if shipped > EPSILON: q_min_origin_caps[orig_id], q_min_dest_caps[dest_id] = new_orig_cap, new_dest_cap; destinations_df.loc[dest_id, 'q_min_initial_delivered_tons'] += shipped; needed -= shipped
-    return origins_df, destinations_df, tracking_vars, q_min_origin_caps, q_min_dest_caps
+def attempt_initial_q_min_delivery_h1(relation_index, state, dest_sort_config=None, silent_mode=False):
+    # Jour 1 : les capacités consommées ici ne sont pas réinitialisées avant la boucle du jour 1
+    day_for_q_min_shipments = 1
+    iterator = get_destination_iterator_h1(state, dest_sort_config)
+    if iterator is None: iterator = state.qmin_target_order()
+    for d in iterator:
+        ship_qmin_for_destination(day_for_q_min_shipments, relation_index, state, d, "[QMIN_INIT_J1_H1]")
+    return state
 
 def filter_profitable_relations_h1(relations_df):
     return relations_df[relations_df['profitability'] == 1].copy()
 
+WAGON_LOG_FIELDS = ('day', 'available_start', 'returned', 'sent', 'available_end', 'in_transit_end')
+
+def log_wagon_day(state, day_t, wagons_available_at_start, returned_wagons, wagons_shipped_this_day):
+    if 'daily_wagon_log' not in state.tracking_vars: return  # mode `lean`
+    state.tracking_vars['daily_wagon_log'].append({'day': day_t, 'available_start': wagons_available_at_start, 'returned': returned_wagons, 'sent': wagons_shipped_this_day, 'available_end': state.fleet.available, 'in_transit_end': state.fleet.in_transit})
+
+def build_simulation_results(relations_input_df, state, all_total_dem_met, day_t):
+    shipments_summary_df = state.tracking_vars['shipments_log'].to_frame()
+    profit_metric = 0.0
+    if not shipments_summary_df.empty:
+        temp_df = shipments_summary_df.copy().merge(relations_input_df[['origin', 'destination', 'distance_km']], on=['origin', 'destination'], how='left').fillna({'distance_km': 0})
+        profit_metric = (temp_df['quantity_tons'] * temp_df['distance_km']).sum()
+    origins_df, destinations_df = state.to_frames()
+    state.tracking_vars.update({'wagons_available': state.fleet.available, 'wagons_in_transit': state.fleet.transit_records()})
+    return {"profit": profit_metric, "shipments_df": shipments_summary_df, "final_origins_df": origins_df, "final_destinations_df": destinations_df, "final_tracking_vars": state.tracking_vars, "all_demand_met": all_total_dem_met, "days_taken_simulation_loop": day_t}
+
+def phase2_relations_for_origin_h1(relation_index, state, o, phase2_config):
+    # Relations rentables depuis `o`, dans l'ordre de la Phase 2 (config de tri, sinon demande restante décroissante)
+    rel_list = relation_index.profitable_origin_neighbors[o]
+    if not rel_list: return []
+    dest_slots_for_orig = relation_index.profitable_origin_dest_slots[o]
+    phase2_iter = get_destination_iterator_h1(state, phase2_config, dest_slots_for_orig)
+    if phase2_iter is None: return [rel_list[k] for k in sort_order(state.dest_remaining[relation_index.profitable_origin_neighbor_dests(o)], False)]
+    rels_by_dest = {}
+    for rel in rel_list: rels_by_dest.setdefault(rel[0], []).append(rel)
+    return [rel for d_ord in phase2_iter for rel in rels_by_dest.get(d_ord, ())]
+
+STATIC_SORT_COLUMNS = ('annual_demand_tons', 'q_min_initial_target_tons', 'min_distance_km')
+
+def is_static_sort(state, sort_config):
+    # Vrai si l'ordre donné par `sort_config` (H1) ne change pas pendant la simulation
+    sort_type = sort_config[0] if sort_config else None
+    return sort_type == 'custom_order' or (sort_type in STATIC_SORT_COLUMNS and state.dest_column(sort_type) is not None)
+
+class Phase2PlanCache:
+    """Relations de Phase 2 (H1) de chaque origine, réutilisées d'un jour à l'autre.
+
+    Pour un ordre personnalisé ou un tri sur une colonne fixe pendant la simulation (STATIC_SORT_COLUMNS), l'ordre
+    est calculé une fois par origine. Sinon (demande restante, tri par défaut), il ne dépend que de la demande restante
+    des destinations de l'origine : il n'est recalculé que si ces valeurs ont changé.
+    """
+    def __init__(self, relation_index, state, phase2_config):
+        self.relation_index = relation_index; self.phase2_config = phase2_config; self.plans = {}; self.keys = {}
+        self.static = is_static_sort(state, phase2_config)
+
+    def relations(self, state, o):
+        if self.static:
+            if o not in self.plans: self.plans[o] = phase2_relations_for_origin_h1(self.relation_index, state, o, self.phase2_config)
+            return self.plans[o]
+        key = state.dest_remaining[self.relation_index.profitable_origin_neighbor_dests(o)]
+        if o not in self.plans or not np.array_equal(self.keys[o], key):
+            self.plans[o] = phase2_relations_for_origin_h1(self.relation_index, state, o, self.phase2_config); self.keys[o] = key
+        return self.plans[o]
+
+VECTORIZED_SELECTION_MIN_DEGREE = 12  # En dessous, la boucle scalaire coûte moins que les opérations NumPy
+
+def select_best_origin_h2(relation_index, state, d):
+    # Origine maximisant quantité potentielle * distance (comparaison stricte : la première rencontrée gagne)
+    candidates = relation_index.profitable_dest_neighbors[d]
+    if len(candidates) >= VECTORIZED_SELECTION_MIN_DEGREE: return _select_best_origin_h2_vectorized(relation_index, state, d)
+    best_origin_for_dest = None; best_origin_dist_km = 0; max_rentabilite_metric = -1.0
+    for o, dist_km in candidates:
+        if state.orig_stock[o] <= EPSILON or state.orig_load_remaining[o] <= EPSILON: continue
+        if state.fleet.available == 0 and dist_km > 0: continue
+        potential_qty = min(state.orig_stock[o], state.orig_load_remaining[o], state.dest_unload_remaining[d], state.dest_remaining[d])
+        if potential_qty < MIN_SHIPMENT_FOR_ONE_WAGON_TONS: continue
+        current_rentabilite_metric = potential_qty * dist_km
+        if current_rentabilite_metric > max_rentabilite_metric: max_rentabilite_metric = current_rentabilite_metric; best_origin_for_dest = o; best_origin_dist_km = dist_km
+    return best_origin_for_dest, best_origin_dist_km, max_rentabilite_metric
+
+def _select_best_origin_h2_vectorized(relation_index, state, d):
+    # Même choix que la boucle : candidats exclus à -1, argmax renvoie le premier maximum (départage de `>` strict)
+    origins, dists = relation_index.profitable_dest_arrays[d]
+    stock = state.orig_stock[origins]; load = state.orig_load_remaining[origins]
+    potential_qty = np.minimum(np.minimum(stock, load), min(state.dest_unload_remaining[d], state.dest_remaining[d]))
+    eligible = (stock > EPSILON) & (load > EPSILON) & (potential_qty >= MIN_SHIPMENT_FOR_ONE_WAGON_TONS)
+    if state.fleet.available == 0: eligible &= dists <= 0
+    if not eligible.any(): return None, 0, -1.0
+    metric = np.where(eligible, potential_qty * dists, -1.0); k = int(metric.argmax())
+    return int(origins[k]), float(dists[k]), float(metric[k])
+
+# --- Moteur de simulation pas à pas (Commun) ---
+class SimulationEngine:
+    """Simulation H1 ou H2 menée jour par jour.
+
+    `start` effectue le passage QMIN initial du jour 1, `step_day` simule un jour et `results` construit le
+    dictionnaire de résultats. `snapshot` / `restore` capturent et restaurent l'état complet (stocks, demandes,
+    capacités, wagons en transit, journaux), y compris dans un moteur configuré avec d'autres ordres de priorité.
+    Avec `record_checkpoints`, un point de reprise est conservé au début de chaque jour, ainsi que, pour chaque
+    phase, les destinations actives et celles qui ont été livrées (voir `swap_resume_days`).
+    Avec `event_driven` (sans `record_checkpoints`), les jours où rien ne peut partir ne sont pas simulés : sans
+    wagon disponible, on saute au prochain jour de retour ; si plus aucune relation ne peut porter d'expédition,
+    on s'arrête. Le journal des wagons de ces jours est rempli directement ; les résultats sont identiques.
+    Avec `profiling`, les résultats contiennent une clé 'profiling' (voir SimulationProfiler) ; `profiling` peut être
+    un SimulationProfiler déjà configuré, par exemple SimulationProfiler(track_memory=False) pour des temps sans
+    le surcoût de tracemalloc. Avec `shipments_spill_path`, le journal des expéditions est écrit sur disque par
+    blocs (voir ShipmentRecorder).
+    Avec `checkpoint_days`, un point de reprise est conservé au début de chacun de ces jours (sans désactiver
+    `event_driven` : les sauts de jours s'arrêtent avant eux) ; voir points_reprise pour l'écriture sur disque.
+    Avec `lean` (évaluations des optimiseurs), `results` ne renvoie que profit, all_demand_met et
+    days_taken_simulation_loop, sans journaux ni tables finales ; le profit est identique.
+    `peak_wagons_in_transit` est le plus grand nombre de wagons en transit à la fin des phases d'un jour simulé : si
+    la simulation complète reste en dessous de la flotte, aucune expédition n'a manqué de wagons et toute flotte
+    d'au moins ce nombre donne les mêmes expéditions (voir dimensionnement_flotte).
+    `progress(jour, MAX_SIMULATION_DAYS, étape)` est appelé après chaque jour simulé par `run` ; il peut lever
+    SimulationCancelled pour interrompre la simulation.
+    """
+    def __init__(self, heuristic, relations_df, origins_df, destinations_df, qmin_config=None, phase2_config=None,
+                 num_initial_wagons=500, relation_index=None, record_checkpoints=False, event_driven=True, profiling=False,
+                 shipments_spill_path=None, progress=None, lean=False, checkpoint_days=None):
+        self.heuristic = heuristic; self.qmin_config = qmin_config; self.phase2_config = phase2_config; self.lean = lean
+        self.state = initialize_tracking_variables(origins_df, destinations_df, num_initial_wagons, shipments_spill_path, lean)
+        self.relation_index = RelationIndex.for_state(relation_index, relations_df, self.state)
+        self.day_t = 0; self.started = False; self.finished = False; self.all_demand_met = False; self.days_simulated = 0; self.peak_wagons_in_transit = 0
+        self.record_checkpoints = record_checkpoints; self.checkpoints = {}; self.event_driven = event_driven
+        self.checkpoint_days = frozenset(checkpoint_days or ())
+        self.profiler = self.state.profiler = profiling if isinstance(profiling, SimulationProfiler) else SimulationProfiler() if profiling else None
+        self.progress = progress
+        self.phase2_plans = Phase2PlanCache(self.relation_index, self.state, phase2_config) if heuristic == 'h1' else None
+        # Ordre Phase 2 du jour : origines par stock décroissant (H1), destinations ouvertes par demande restante décroissante (H2)
+        self.phase2_order = DescendingOrder(lambda stock: sort_order(stock, False)) if heuristic == 'h1' else DescendingOrder(open_destinations_order)
+        self.static_qmin_order = get_destination_iterator_h1(self.state, qmin_config) if heuristic == 'h1' and is_static_sort(self.state, qmin_config) else None
+        # Par phase, un masque de destinations (actives, livrées) par jour ; jour 0 = passage QMIN initial
+        self.activity = {'qmin': [], 'phase2': []}; self.deliveries = {'qmin': [], 'phase2': []}
+
+    def _record_phase_start(self, phase, active_mask):
+        if self.record_checkpoints: self.activity[phase].append(active_mask()); self._delivered_before = self.state.dest_delivered.copy()
+
+    def _record_phase_end(self, phase):
+        if self.record_checkpoints: self.deliveries[phase].append(self.state.dest_delivered != self._delivered_before)
+
+    def start(self):
+        if self.heuristic == 'h1': qmin_config_for_attempt = self.qmin_config
+        else: qmin_config_for_attempt = ('custom_order', self.qmin_config) if self.qmin_config else None
+        if self.profiler is not None: self.profiler.start()
+        self._record_phase_start('qmin', self.state.qmin_active_mask)
+        with profiled(self.profiler, 'qmin_initial'): attempt_initial_q_min_delivery_h1(self.relation_index, self.state, qmin_config_for_attempt)
+        self._record_phase_end('qmin')
+        self.started = True
+        if 1 in self.checkpoint_days: self.checkpoints[1] = self.snapshot()
+        if self.record_checkpoints:
+            no_dest = np.zeros(len(self.state.dest_ids), dtype=bool)
+            self.activity['phase2'].append(no_dest); self.deliveries['phase2'].append(no_dest)
+            self.checkpoints[1] = self.snapshot()
+
+    def step_day(self):
+        self.day_t += 1; self.days_simulated += 1
+        day_t = self.day_t; state = self.state
+        with profiled(self.profiler, 'wagons'):
+            returned_wagons = state.fleet.release(day_t)
+            wagons_available_at_start = state.fleet.available
+            if day_t > 1: state.reset_daily_capacities()
+        wagons_shipped_this_day = self.run_day_phases(day_t)
+        with profiled(self.profiler, 'wagons'):
+            log_wagon_day(state, day_t, wagons_available_at_start, returned_wagons, wagons_shipped_this_day)
+            self.all_demand_met = state.all_demand_met()
+            self.finished = self.all_demand_met or (wagons_shipped_this_day == 0 and (state.fleet.available == 0 and state.fleet.in_transit == 0)) or day_t >= MAX_SIMULATION_DAYS
+            if self.record_checkpoints and not self.finished: self.checkpoints[day_t + 1] = self.snapshot()
+            elif self.event_driven and not self.finished: self._skip_idle_days(wagons_shipped_this_day)
+            if not self.finished and self.day_t + 1 in self.checkpoint_days: self.checkpoints[self.day_t + 1] = self.snapshot()
+
+    def _skip_idle_days(self, wagons_shipped_today):
+        # Jours suivants sans expédition possible : seuls les retours de wagons changent l'état
+        state = self.state; fleet = state.fleet
+        if wagons_shipped_today == 0 and not state.any_shipment_possible(self.relation_index): last_idle_day = MAX_SIMULATION_DAYS
+        elif fleet.available == 0 and fleet.next_return_day() is not None: last_idle_day = min(fleet.next_return_day() - 1, MAX_SIMULATION_DAYS)
+        else: return
+        next_checkpoint_day = min((day for day in self.checkpoint_days if day > self.day_t), default=None)
+        if next_checkpoint_day is not None: last_idle_day = min(last_idle_day, next_checkpoint_day - 1)
+        for day_t in range(self.day_t + 1, last_idle_day + 1):
+            returned_wagons = fleet.release(day_t)
+            log_wagon_day(state, day_t, fleet.available, returned_wagons, 0)
+        self.day_t = max(self.day_t, last_idle_day); self.finished = self.day_t >= MAX_SIMULATION_DAYS
+
+    def run_day_phases(self, day_t):
+        # Phase QMIN puis Phase 2 du jour `day_t` (retours de wagons et capacités déjà mis à jour) ; renvoie les wagons envoyés
+        state = self.state
+        self._record_phase_start('qmin', state.qmin_active_mask)
+        with profiled(self.profiler, 'qmin_daily'): wagons_shipped_this_day = self._qmin_phase_h1(day_t) if self.heuristic == 'h1' else self._qmin_phase_h2(day_t)
+        self._record_phase_end('qmin'); self._record_phase_start('phase2', state.phase2_eligible_mask)
+        with profiled(self.profiler, 'phase2'): wagons_shipped_this_day += self._phase2_h1(day_t) if self.heuristic == 'h1' else self._phase2_h2(day_t)
+        self._record_phase_end('phase2')
+        if state.fleet.in_transit > self.peak_wagons_in_transit: self.peak_wagons_in_transit = state.fleet.in_transit
+        return wagons_shipped_this_day
+
+    def run(self):
+        if not self.started: self.start()
+        while not self.finished and self.day_t < MAX_SIMULATION_DAYS:
+            self.step_day()
+            if self.progress is not None: self.progress(self.day_t, MAX_SIMULATION_DAYS, "Simulation")
+        return self
+
+    def results(self, relations_input_df):
+        with profiled(self.profiler, 'results'):
+            if self.lean: results = {'profit': self.state.tracking_vars['shipments_log'].profit(self.relation_index), 'all_demand_met': self.all_demand_met, 'days_taken_simulation_loop': self.day_t}
+            else: results = build_simulation_results(relations_input_df, self.state, self.all_demand_met, self.day_t)
+        if self.profiler is not None:
+            self.profiler.stop(); results['profiling'] = self.profiler.report(len(self.state.tracking_vars['shipments_log']), self.days_simulated)
+        return results
+
+    def snapshot(self):
+        return {'day_t': self.day_t, 'finished': self.finished, 'all_demand_met': self.all_demand_met, 'state': self.state.snapshot()}
+
+    def restore(self, checkpoint):
+        self.day_t = checkpoint['day_t']; self.finished = checkpoint['finished']; self.all_demand_met = checkpoint['all_demand_met']
+        self.state.restore(checkpoint['state']); self.started = True
+        return self
+
+    def order_profile(self, phase, order):
+        # Par jour de cette simulation de référence (ligne 0 = passage initial) et par position de `order` dans la
+        # phase ('qmin' ou 'phase2') : destinations actives, puis nombres cumulés d'actives et de livrées avant chaque position
+        activity = np.array(self.activity[phase]); deliveries = np.array(self.deliveries[phase])
+        slots = np.array([self.state.dest_slot.get(dest_id, -1) for dest_id in order], dtype=np.intp); known = slots >= 0
+        active_at = np.zeros((len(activity), len(order)), dtype=bool); active_at[:, known] = activity[:, slots[known]]
+        delivered_at = np.zeros((len(activity), len(order)), dtype=np.intp); delivered_at[:, known] = deliveries[:, slots[known]]
+        zeros = np.zeros((len(activity), 1), dtype=np.intp)
+        active_before = np.concatenate([zeros, np.cumsum(active_at, axis=1)], axis=1)
+        delivered_before = np.concatenate([zeros, np.cumsum(delivered_at, axis=1)], axis=1)
+        return active_at, active_before, delivered_before
+
+    def swap_resume_days(self, phase, order):
+        # Pour chaque échange (i < j) de `order` dans l'ordre de la phase ('qmin' ou 'phase2'), listé comme dans
+        # generate_custom_order_neighbors : premier jour de cette simulation de référence que l'échange peut modifier.
+        # Un jour n'est pas modifié si les deux destinations échangées y sont inactives (une destination inactive en
+        # début de phase le reste), ou si aucune destination placée entre les positions i et j n'a été livrée dans la
+        # phase (ces destinations restent sans effet quel que soit leur ordre, les ressources ne faisant que diminuer
+        # au cours d'une phase). 0 = dès le passage initial, None = jamais (simulation identique à la référence).
+        active_at, _, delivered_before = self.order_profile(phase, order)
+        i, j = np.triu_indices(len(order), k=1)
+        affected = (active_at[:, i] | active_at[:, j]) & (delivered_before[:, j + 1] - delivered_before[:, i] > 0)
+        first_day = affected.argmax(axis=0)
+        return [int(t) if hit else None for t, hit in zip(first_day, affected.any(axis=0))]
+
+    def _qmin_phase_h1(self, day_t):
+        state = self.state; wagons_sent = 0
+        qmin_daily_iter = self.static_qmin_order
+        if qmin_daily_iter is None: qmin_daily_iter = get_destination_iterator_h1(state, self.qmin_config)
+        if qmin_daily_iter is None: qmin_daily_iter = state.qmin_target_order()
+        for d in qmin_daily_iter:
+            wagons_sent += ship_qmin_for_destination(day_t, self.relation_index, state, d, "[QMIN_DAILY_H1]")
+        return wagons_sent
+
+    def _phase2_h1(self, day_t):
+        state = self.state; wagons_sent = 0
+        for o in self.phase2_order(state.orig_stock):
+            if state.orig_stock[o] <= EPSILON or state.orig_load_remaining[o] <= EPSILON: continue
+            for d, dist_km in self.phase2_plans.relations(state, o):
+                if state.dest_qmin_delivered[d] < (state.dest_qmin_target[d] - EPSILON): continue
+                if state.orig_load_remaining[o] <= EPSILON or (state.fleet.available == 0 and dist_km > 0): break
+                if state.dest_remaining[d] <= EPSILON or state.dest_unload_remaining[d] <= EPSILON: continue
+                desired_qty = state.dest_remaining[d]
+                shipped, wagons_used = process_shipment(day_t, o, d, dist_km, desired_qty, state, "[SIM_PROFIT_H1]")
+                if shipped > EPSILON: wagons_sent += wagons_used
+        return wagons_sent
+
+    def _qmin_phase_h2(self, day_t):
+        state = self.state; wagons_sent = 0
+        qmin_daily_iter_h2 = [state.dest_slot[dest_id] for dest_id in (self.qmin_config or []) if dest_id in state.dest_slot]
+        if not qmin_daily_iter_h2: qmin_daily_iter_h2 = state.qmin_target_order()
+        for d in qmin_daily_iter_h2:
+            wagons_sent += ship_qmin_for_destination(day_t, self.relation_index, state, d, "[QMIN_DAILY_H2]")
+        return wagons_sent
+
+    def _phase2_h2(self, day_t):
+        state = self.state; wagons_sent = 0
+        phase2_dest_iter_h2 = [state.dest_slot[dest_id] for dest_id in (self.phase2_config or []) if dest_id in state.dest_slot and state.dest_remaining[state.dest_slot[dest_id]] > EPSILON]
+        if not phase2_dest_iter_h2: phase2_dest_iter_h2 = self.phase2_order(state.dest_remaining)
+        for d in phase2_dest_iter_h2:
+            if state.dest_qmin_delivered[d] < (state.dest_qmin_target[d] - EPSILON) or state.dest_unload_remaining[d] <= EPSILON or state.dest_remaining[d] <= EPSILON: continue
+            best_origin_for_dest, best_origin_dist_km, max_rentabilite_metric = select_best_origin_h2(self.relation_index, state, d)
+            if best_origin_for_dest is not None and max_rentabilite_metric >= 0 :
+                desired_std_qty = state.dest_remaining[d]
+                shipped_qty, wagons_used = process_shipment(day_t, best_origin_for_dest, d, best_origin_dist_km, desired_std_qty, state, log_prefix="[SIM_PROFIT_H2]")
+                if shipped_qty > EPSILON: wagons_sent += wagons_used
+        return wagons_sent
+
 # MODIFICATION : Ajout du paramètre `_internal_call_copy` pour la gestion mémoire
 def run_simulation_h1(relations_input_df, origins_input_df, destinations_input_df,
                       qmin_common_config=None, phase2_config=None,
                       num_initial_wagons_param=500, silent_mode=False,
-                      _internal_call_copy=True):
+                      _internal_call_copy=True, relation_index=None, profiling=False, shipments_spill_path=None, progress=None):
     if _internal_call_copy:
         relations_df = relations_input_df.copy()
         origins_df_sim_base = origins_input_df.copy()
@@ -128,71 +803,14 @@ def run_simulation_h1(relations_input_df, origins_input_df, destinations_input_d
         relations_df = relations_input_df
         origins_df_sim_base = origins_input_df
         destinations_df_sim_base = destinations_input_df
-    origins_df, destinations_df, tracking_vars_sim = initialize_tracking_variables(origins_df_sim_base, destinations_df_sim_base, num_initial_wagons_param)
-    origins_df, destinations_df, tracking_vars_sim, rem_load_d1, rem_unload_d1 = attempt_initial_q_min_delivery_h1(relations_df, origins_df, destinations_df, tracking_vars_sim, qmin_common_config, silent_mode)
-    profitable_relations_df = filter_profitable_relations_h1(relations_df)
-    all_total_dem_met = False; last_day_of_shipment = 0; day_t = 0
-    for day_t_loop in range(1, MAX_SIMULATION_DAYS + 1):
-        day_t = day_t_loop
-        wagons_shipped_this_day = 0; returned_wagons = 0; active_transit = []
-        for ti in tracking_vars_sim['wagons_in_transit']:
-            if ti['return_day'] == day_t: returned_wagons += ti['num_wagons']
-            elif ti['return_day'] > day_t: active_transit.append(ti)
-        wagons_available_at_start = tracking_vars_sim['wagons_available'] + returned_wagons
-        tracking_vars_sim['wagons_available'] = wagons_available_at_start; tracking_vars_sim['wagons_in_transit'] = active_transit
-        curr_orig_load = rem_load_d1.copy() if day_t == 1 else origins_df['daily_loading_capacity_tons'].copy()
-        curr_dest_unload = rem_unload_d1.copy() if day_t == 1 else destinations_df['daily_unloading_capacity_tons'].copy()
-        shipments_today = False
-        qmin_daily_iter = get_destination_iterator_h1(destinations_df, qmin_common_config)
-        if qmin_daily_iter is None: qmin_daily_iter = destinations_df.sort_values(by='q_min_initial_target_tons', ascending=False).index.tolist()
-        for dest_id in qmin_daily_iter:
-            if dest_id not in destinations_df.index: continue
-            needed = destinations_df.loc[dest_id, 'q_min_initial_target_tons'] - destinations_df.loc[dest_id, 'q_min_initial_delivered_tons']
-            if needed <= EPSILON: continue
-            rels_for_qmin = relations_df[relations_df['destination'] == dest_id].copy().merge(origins_df[['current_available_product_tons']], left_on='origin', right_index=True).sort_values(by='current_available_product_tons', ascending=False)
-            for _, rel in rels_for_qmin.iterrows():
-                orig_id, dist_km = rel['origin'], rel['distance_km']
-                if needed <= EPSILON: break
-                if orig_id not in origins_df.index: continue
-                if curr_orig_load.get(orig_id,0) <= EPSILON or curr_dest_unload.get(dest_id,0) <= EPSILON or origins_df.loc[orig_id, 'current_available_product_tons'] <= EPSILON: continue
-                shipped, wagons_used, n_orig_cap, n_dest_cap = process_shipment(day_t, orig_id, dest_id, dist_km, needed, origins_df, destinations_df, tracking_vars_sim, curr_orig_load[orig_id], curr_dest_unload[dest_id], "[QMIN_DAILY_H1]")
-                if shipped > EPSILON: wagons_shipped_this_day += wagons_used; curr_orig_load[orig_id], curr_dest_unload[dest_id] = n_orig_cap, n_dest_cap; destinations_df.loc[dest_id, 'q_min_initial_delivered_tons'] += shipped; needed -= shipped; shipments_today = True; last_day_of_shipment = day_t
-        sorted_origins = origins_df.sort_values(by='current_available_product_tons', ascending=False).index
-        for orig_id in sorted_origins:
-            if orig_id not in origins_df.index: continue
-            if origins_df.loc[orig_id, 'current_available_product_tons'] <= EPSILON or curr_orig_load.get(orig_id,0) <= EPSILON: continue
-            rels_from_orig = profitable_relations_df[profitable_relations_df['origin'] == orig_id].copy()
-            if rels_from_orig.empty: continue
-            dest_ids_for_orig = [d_id for d_id in rels_from_orig['destination'].unique() if d_id in destinations_df.index]
-            if not dest_ids_for_orig: continue
-            temp_dest_df = destinations_df.loc[dest_ids_for_orig].copy()
-            phase2_iter = get_destination_iterator_h1(temp_dest_df, phase2_config)
-            relation_iterator_data = []
-            if phase2_iter is None: relation_iterator_data = rels_from_orig[rels_from_orig['destination'].isin(dest_ids_for_orig)].merge(destinations_df[['remaining_annual_demand_tons']], left_on='destination', right_index=True).sort_values(by='remaining_annual_demand_tons', ascending=False).iterrows()
-            else: ordered_rels = [row for dest_id_ord in phase2_iter for _, row in rels_from_orig[rels_from_orig['destination'] == dest_id_ord].iterrows()]; relation_iterator_data = [(idx, series) for idx, series in enumerate(ordered_rels)]
-            for _, rel_data in relation_iterator_data:
-                dest_id, dist_km = rel_data['destination'], rel_data['distance_km']
-                if dest_id not in destinations_df.index or destinations_df.loc[dest_id, 'q_min_initial_delivered_tons'] < (destinations_df.loc[dest_id, 'q_min_initial_target_tons'] - EPSILON): continue
-                if curr_orig_load.get(orig_id,0) <= EPSILON or (tracking_vars_sim['wagons_available'] == 0 and dist_km > 0): break
-                if destinations_df.loc[dest_id, 'remaining_annual_demand_tons'] <= EPSILON or curr_dest_unload.get(dest_id,0) <= EPSILON: continue
-                desired_qty = destinations_df.loc[dest_id, 'remaining_annual_demand_tons']
-                if desired_qty <= EPSILON: continue
-                shipped, wagons_used, n_orig_cap, n_dest_cap = process_shipment(day_t, orig_id, dest_id, dist_km, desired_qty, origins_df, destinations_df, tracking_vars_sim, curr_orig_load[orig_id], curr_dest_unload[dest_id], "[SIM_PROFIT_H1]")
-                if shipped > EPSILON: wagons_shipped_this_day += wagons_used; curr_orig_load[orig_id], curr_dest_unload[dest_id] = n_orig_cap, n_dest_cap; shipments_today = True; last_day_of_shipment = day_t
-        tracking_vars_sim['daily_wagon_log'].append({'day': day_t, 'available_start': wagons_available_at_start, 'returned': returned_wagons, 'sent': wagons_shipped_this_day, 'available_end': tracking_vars_sim['wagons_available'], 'in_transit_end': sum(w['num_wagons'] for w in tracking_vars_sim['wagons_in_transit'])})
-        all_total_dem_met = (destinations_df['remaining_annual_demand_tons'] <= EPSILON).all()
-        if all_total_dem_met or (not shipments_today and (tracking_vars_sim['wagons_available'] == 0 and not tracking_vars_sim['wagons_in_transit'])): break
-    shipments_summary_df = pd.DataFrame(tracking_vars_sim['shipments_log'])
-    profit_metric = 0.0
-    if not shipments_summary_df.empty:
-        temp_df = shipments_summary_df.copy().merge(relations_input_df[['origin', 'destination', 'distance_km']], on=['origin', 'destination'], how='left').fillna({'distance_km': 0})
-        profit_metric = (temp_df['quantity_tons'] * temp_df['distance_km']).sum()
-    return {"profit": profit_metric, "shipments_df": shipments_summary_df, "final_origins_df": origins_df, "final_destinations_df": destinations_df, "final_tracking_vars": tracking_vars_sim, "all_demand_met": all_total_dem_met, "days_taken_simulation_loop": day_t}
+    engine = SimulationEngine('h1', relations_df, origins_df_sim_base, destinations_df_sim_base, qmin_common_config, phase2_config, num_initial_wagons_param, relation_index, profiling=profiling, shipments_spill_path=shipments_spill_path, progress=progress)
+    return engine.run().results(relations_input_df)
 
 # MODIFICATION : Ajout du paramètre `_internal_call_copy` pour la gestion mémoire
 def run_simulation_h2(relations_input_df, origins_input_df, destinations_input_df,
                       qmin_user_priority_order=None, standard_shipment_dest_priority_order=None,
-                      num_initial_wagons_param=50, silent_mode=False, _internal_call_copy=True):
+                      num_initial_wagons_param=50, silent_mode=False, _internal_call_copy=True,
+                      relation_index=None, profiling=False, shipments_spill_path=None, progress=None):
     if _internal_call_copy:
         relations_df = relations_input_df.copy()
         origins_df_sim_base = origins_input_df.copy()
@@ -201,142 +819,512 @@ def run_simulation_h2(relations_input_df, origins_input_df, destinations_input_d
         relations_df = relations_input_df
         origins_df_sim_base = origins_input_df
         destinations_df_sim_base = destinations_input_df
-    origins_df, destinations_df, tracking_vars_sim = initialize_tracking_variables(origins_df_sim_base, destinations_df_sim_base, num_initial_wagons_param)
-    qmin_config_for_attempt = ('custom_order', qmin_user_priority_order) if qmin_user_priority_order else None
-    origins_df, destinations_df, tracking_vars_sim, rem_load_d1, rem_unload_d1 = attempt_initial_q_min_delivery_h1(relations_df, origins_df, destinations_df, tracking_vars_sim, qmin_config_for_attempt, silent_mode) 
-    profitable_relations_df = filter_profitable_relations_h1(relations_df)
-    all_total_dem_met = False; last_day_of_shipment = 0; day_t = 0
-    for day_t_loop in range(1, MAX_SIMULATION_DAYS + 1):
-        day_t = day_t_loop
-        wagons_shipped_this_day = 0; returned_wagons = 0; active_transit = []
-        for ti in tracking_vars_sim['wagons_in_transit']:
-            if ti['return_day'] == day_t: returned_wagons += ti['num_wagons']
-            elif ti['return_day'] > day_t: active_transit.append(ti)
-        wagons_available_at_start = tracking_vars_sim['wagons_available'] + returned_wagons
-        tracking_vars_sim['wagons_available'] = wagons_available_at_start; tracking_vars_sim['wagons_in_transit'] = active_transit
-        curr_orig_load = rem_load_d1.copy() if day_t == 1 else origins_df['daily_loading_capacity_tons'].copy()
-        curr_dest_unload = rem_unload_d1.copy() if day_t == 1 else destinations_df['daily_unloading_capacity_tons'].copy()
-        shipments_today = False
-        qmin_daily_iter_h2 = [dest_id for dest_id in (qmin_user_priority_order or []) if dest_id in destinations_df.index]
-        if not qmin_daily_iter_h2: qmin_daily_iter_h2 = destinations_df.sort_values(by='q_min_initial_target_tons', ascending=False).index.tolist()
-        for dest_id in qmin_daily_iter_h2:
-            if dest_id not in destinations_df.index: continue
-            needed = destinations_df.loc[dest_id, 'q_min_initial_target_tons'] - destinations_df.loc[dest_id, 'q_min_initial_delivered_tons']
-            if needed <= EPSILON: continue
-            rels_for_qmin = relations_df[relations_df['destination'] == dest_id].copy().merge(origins_df[['current_available_product_tons']], left_on='origin', right_index=True).sort_values(by='current_available_product_tons', ascending=False)
-            for _, rel in rels_for_qmin.iterrows():
-                orig_id, dist_km = rel['origin'], rel['distance_km']
-                if needed <= EPSILON: break
-                if orig_id not in origins_df.index: continue
-                if curr_orig_load.get(orig_id,0) <= EPSILON or curr_dest_unload.get(dest_id,0) <= EPSILON or origins_df.loc[orig_id, 'current_available_product_tons'] <= EPSILON: continue
-                shipped, wagons_used, n_orig_cap, n_dest_cap = process_shipment(day_t, orig_id, dest_id, dist_km, needed, origins_df, destinations_df, tracking_vars_sim, curr_orig_load[orig_id], curr_dest_unload[dest_id], "[QMIN_DAILY_H2]")
-                if shipped > EPSILON: wagons_shipped_this_day += wagons_used; curr_orig_load[orig_id], curr_dest_unload[dest_id] = n_orig_cap, n_dest_cap; destinations_df.loc[dest_id, 'q_min_initial_delivered_tons'] += shipped; needed -= shipped; shipments_today = True; last_day_of_shipment = day_t
-        phase2_dest_iter_h2 = [dest_id for dest_id in (standard_shipment_dest_priority_order or []) if dest_id in destinations_df.index and destinations_df.loc[dest_id, 'remaining_annual_demand_tons'] > EPSILON]
-        if not phase2_dest_iter_h2: phase2_dest_iter_h2 = destinations_df[destinations_df['remaining_annual_demand_tons'] > EPSILON].sort_values(by='remaining_annual_demand_tons', ascending=False).index
-        for dest_id in phase2_dest_iter_h2:
-            if dest_id not in destinations_df.index or destinations_df.loc[dest_id, 'q_min_initial_delivered_tons'] < (destinations_df.loc[dest_id, 'q_min_initial_target_tons'] - EPSILON) or curr_dest_unload.get(dest_id, 0) <= EPSILON or destinations_df.loc[dest_id, 'remaining_annual_demand_tons'] <= EPSILON: continue
-            best_origin_for_dest = None; best_origin_dist_km = 0; max_rentabilite_metric = -1.0
-            candidate_relations = profitable_relations_df[profitable_relations_df['destination'] == dest_id]
-            for _, rel in candidate_relations.iterrows():
-                orig_id, dist_km = rel['origin'], rel['distance_km']
-                if orig_id not in origins_df.index or origins_df.loc[orig_id, 'current_available_product_tons'] <= EPSILON or curr_orig_load.get(orig_id, 0) <= EPSILON: continue
-                if tracking_vars_sim['wagons_available'] == 0 and dist_km > 0: continue
-                potential_qty = min(origins_df.loc[orig_id, 'current_available_product_tons'], curr_orig_load.get(orig_id, 0), curr_dest_unload.get(dest_id, 0), destinations_df.loc[dest_id, 'remaining_annual_demand_tons'])
-                if potential_qty < MIN_SHIPMENT_FOR_ONE_WAGON_TONS: continue
-                current_rentabilite_metric = potential_qty * dist_km 
-                if current_rentabilite_metric > max_rentabilite_metric: max_rentabilite_metric = current_rentabilite_metric; best_origin_for_dest = orig_id; best_origin_dist_km = dist_km
-            if best_origin_for_dest is not None and max_rentabilite_metric >= 0 :
-                desired_std_qty = destinations_df.loc[dest_id, 'remaining_annual_demand_tons']
-                shipped_qty, wagons_used, n_orig_cap, n_dest_cap = process_shipment(day_t, best_origin_for_dest, dest_id, best_origin_dist_km, desired_std_qty, origins_df, destinations_df, tracking_vars_sim, curr_orig_load[best_origin_for_dest], curr_dest_unload[dest_id], log_prefix="[SIM_PROFIT_H2]")
-                if shipped_qty > EPSILON: wagons_shipped_this_day += wagons_used; curr_orig_load[best_origin_for_dest] = n_orig_cap; curr_dest_unload[dest_id] = n_dest_cap; shipments_today = True
-        tracking_vars_sim['daily_wagon_log'].append({'day': day_t, 'available_start': wagons_available_at_start, 'returned': returned_wagons, 'sent': wagons_shipped_this_day, 'available_end': tracking_vars_sim['wagons_available'], 'in_transit_end': sum(w['num_wagons'] for w in tracking_vars_sim['wagons_in_transit'])})
-        all_total_dem_met = (destinations_df['remaining_annual_demand_tons'] <= EPSILON).all()
-        if all_total_dem_met or (not shipments_today and (tracking_vars_sim['wagons_available'] == 0 and not tracking_vars_sim['wagons_in_transit'])): break
-    shipments_summary_df = pd.DataFrame(tracking_vars_sim['shipments_log'])
-    profit_metric = 0.0
-    if not shipments_summary_df.empty:
-        temp_df = shipments_summary_df.copy().merge(relations_input_df[['origin', 'destination', 'distance_km']], on=['origin', 'destination'], how='left').fillna({'distance_km': 0})
-        profit_metric = (temp_df['quantity_tons'] * temp_df['distance_km']).sum()
-    return {"profit": profit_metric, "shipments_df": shipments_summary_df, "final_origins_df": origins_df, "final_destinations_df": destinations_df, "final_tracking_vars": tracking_vars_sim, "all_demand_met": all_total_dem_met, "days_taken_simulation_loop": day_t}
+    engine = SimulationEngine('h2', relations_df, origins_df_sim_base, destinations_df_sim_base, qmin_user_priority_order, standard_shipment_dest_priority_order, num_initial_wagons_param, relation_index, profiling=profiling, shipments_spill_path=shipments_spill_path, progress=progress)
+    return engine.run().results(relations_input_df)
+
+# --- Simulation groupée de plusieurs scénarios (Commun) ---
+class ScenarioWagonFleet:
+    """Vue sur la ligne `k` d'une BatchWagonFleet, avec l'interface de WagonFleet."""
+    def __init__(self, batch_fleet, k):
+        self.batch_fleet = batch_fleet; self.k = k
+
+    @property
+    def available(self): return int(self.batch_fleet.available[self.k])
+    @property
+    def in_transit(self): return int(self.batch_fleet.in_transit[self.k])
+
+    def dispatch(self, num_wagons, return_day):
+        fleet = self.batch_fleet; k = self.k
+        fleet.available[k] -= num_wagons; fleet.in_transit[k] += num_wagons; fleet.returns[k, return_day] += num_wagons
+
+    def transit_records(self):
+        returns = self.batch_fleet.returns[self.k]
+        return [{'return_day': int(return_day), 'num_wagons': int(returns[return_day])} for return_day in np.flatnonzero(returns)]
+
+class BatchWagonFleet:
+    """Flottes de N scénarios : wagons disponibles et en transit (N,) et calendrier des retours (N, jours)."""
+    def __init__(self, num_wagons_per_scenario, horizon_days):
+        self.available = np.array(num_wagons_per_scenario, dtype=np.int64)
+        self.in_transit = np.zeros(len(self.available), dtype=np.int64)
+        self.returns = np.zeros((len(self.available), horizon_days + 1), dtype=np.int64)
+
+    def release(self, day_t, active):
+        returned = np.where(active, self.returns[:, day_t], 0)
+        self.available += returned; self.in_transit -= returned; self.returns[:, day_t] -= returned
+        return returned
+
+    def row(self, k):
+        return ScenarioWagonFleet(self, k)
+
+class BatchSimulation:
+    """N scénarios sur un même réseau, avancés ensemble jour par jour.
+
+    Un scénario est un tuple (heuristique 'h1'/'h2', config/ordre QMIN, config/ordre Phase 2, nombre de wagons), avec
+    les mêmes conventions que run_simulation_h1 / run_simulation_h2. Les états sont empilés en tableaux
+    (N, origines) et (N, destinations) dont chaque SimulationState utilise une ligne : réinitialisation des
+    capacités, retours de wagons, journal des wagons et tests de fin sont vectorisés sur les scénarios encore
+    actifs. Les phases d'expédition restent gloutonnes et séquentielles à l'intérieur de chaque scénario.
+    """
+    def __init__(self, relations_df, origins_df, destinations_df, scenarios, relation_index=None):
+        self.relations_df = relations_df; self.engines = []
+        for heuristic, qmin_config, phase2_config, num_wagons in scenarios:
+            engine = SimulationEngine(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, relation_index)
+            relation_index = engine.relation_index; self.engines.append(engine)
+        states = [engine.state for engine in self.engines]
+        for name in SimulationState.SNAPSHOT_ARRAYS:
+            stacked = np.stack([getattr(state, name) for state in states]) if states else np.zeros((0, 0))
+            setattr(self, name, stacked)
+            for k, state in enumerate(states): setattr(state, name, stacked[k])
+        max_distance = np.nanmax(relation_index.rel_distance_km) if states and len(relation_index.rel_distance_km) else 0
+        max_round_trip = 2 * max(1, math.ceil(max_distance / KM_PER_DAY_FOR_WAGON_RETURN))
+        self.fleet = BatchWagonFleet([num_wagons for _, _, _, num_wagons in scenarios], MAX_SIMULATION_DAYS + max_round_trip)
+        for k, state in enumerate(states): state.fleet = self.fleet.row(k)
+        # Journal des wagons : (champ, scénario, jour)
+        self.wagon_log = np.zeros((len(WAGON_LOG_FIELDS), len(states), MAX_SIMULATION_DAYS + 1), dtype=np.int64)
+        self.finished = np.zeros(len(states), dtype=bool); self.day_t = 0
+
+    def step_day(self):
+        self.day_t += 1; day_t = self.day_t
+        active = ~self.finished; active_rows = active[:, None]
+        returned = self.fleet.release(day_t, active)
+        available_start = self.fleet.available.copy()
+        if day_t > 1:
+            np.copyto(self.orig_load_remaining, self.orig_load_cap, where=active_rows); np.copyto(self.dest_unload_remaining, self.dest_unload_cap, where=active_rows)
+        sent = np.zeros(len(self.engines), dtype=np.int64)
+        for k in np.flatnonzero(active):
+            engine = self.engines[k]; engine.day_t = day_t; engine.days_simulated += 1
+            sent[k] = engine.run_day_phases(day_t)
+        day_log = np.stack([np.full(len(sent), day_t), available_start, returned, sent, self.fleet.available, self.fleet.in_transit])
+        self.wagon_log[:, active, day_t] = day_log[:, active]
+        demand_met = (self.dest_remaining <= EPSILON).all(axis=1)
+        finished_now = active & (demand_met | ((sent == 0) & (self.fleet.available == 0) & (self.fleet.in_transit == 0)) | (day_t >= MAX_SIMULATION_DAYS))
+        for k in np.flatnonzero(active): self.engines[k].all_demand_met = demand_met[k]; self.engines[k].finished = bool(finished_now[k])
+        self.finished |= finished_now
+
+    def run(self):
+        for engine in self.engines: engine.start()
+        while not self.finished.all() and self.day_t < MAX_SIMULATION_DAYS: self.step_day()
+        return self
+
+    def results(self):
+        all_results = []
+        for k, engine in enumerate(self.engines):
+            log = self.wagon_log[:, k, 1:engine.day_t + 1].T.tolist()
+            engine.state.tracking_vars['daily_wagon_log'] = [dict(zip(WAGON_LOG_FIELDS, row)) for row in log]
+            all_results.append(engine.results(self.relations_df))
+        return all_results
+
+def run_simulation_batch(relations_input_df, origins_input_df, destinations_input_df, scenarios, relation_index=None):
+    """Simule tous les `scenarios` ensemble ; renvoie un dictionnaire de résultats par scénario (même format que run_simulation_h1/h2)."""
+    return BatchSimulation(relations_input_df, origins_input_df, destinations_input_df, scenarios, relation_index).run().results()
+
+# --- Voisinages des ordres de priorité ---
+# Un mouvement (type, i, j) sur un ordre : 'swap' échange les positions i < j, 'insertion' déplace l'élément de la
+# position i vers la position j, 'reversal' inverse le segment i..j (j - i >= 2).
+ORDER_MOVES = ('swap', 'insertion', 'reversal')
+
+def _move_count(kind, n):
+    if kind == 'swap': return n * (n - 1) // 2
+    if kind == 'insertion': return n * (n - 1)
+    return (n - 1) * (n - 2) // 2 if n >= 3 else 0
+
+def _decode_move(kind, n, k, pair_indices):
+    if kind == 'insertion':
+        i, r = divmod(k, n - 1); return (kind, i, r if r < i else r + 1)
+    offset = 1 if kind == 'swap' else 2
+    if (n, offset) not in pair_indices: pair_indices[(n, offset)] = np.triu_indices(n, offset)
+    rows, cols = pair_indices[(n, offset)]
+    return (kind, int(rows[k]), int(cols[k]))
+
+def _iter_moves(blocks, rng=None):
+    # `blocks` : [(clé, type, longueur de l'ordre)] ; produit (clé, mouvement) un par un, dans l'ordre des blocs puis
+    # des positions, ou dans un ordre aléatoire sans remise avec `rng` (seuls les numéros des mouvements sont tirés)
+    counts = [_move_count(kind, n) for _, kind, n in blocks]; starts = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+    pair_indices = {}
+    for index in (range(int(starts[-1])) if rng is None else rng.permutation(int(starts[-1]))):
+        b = int(np.searchsorted(starts, index, side='right')) - 1
+        key, kind, n = blocks[b]
+        yield key, _decode_move(kind, n, int(index - starts[b]), pair_indices)
+
+def iter_order_moves(n, moves=ORDER_MOVES, rng=None):
+    """Mouvements d'un ordre de longueur `n`, produits à la demande (aucun voisin n'est construit d'avance)."""
+    for _, move in _iter_moves([(None, kind, n) for kind in moves], rng): yield move
+
+def apply_order_move(order, move):
+    kind, i, j = move; neighbor = list(order)
+    if kind == 'swap': neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
+    elif kind == 'insertion': neighbor.insert(j, neighbor.pop(i))
+    else: neighbor[i:j + 1] = neighbor[i:j + 1][::-1]
+    return neighbor
+
+def moved_destinations(order, move):
+    # Destinations dont la place relative change vraiment (attribut tabou)
+    kind, i, j = move
+    return (order[i],) if kind == 'insertion' else (order[i], order[j])
+
+def move_resume_day(profile, move):
+    """Premier jour que `move` peut modifier dans la simulation de référence de `profile` (SimulationEngine.order_profile).
+
+    Même règle que swap_resume_days, étendue au segment i..j : sans livraison dans le segment, son ordre est sans
+    effet ; sinon il faut qu'une destination active y change de place relative (l'une des deux échangées, celle qui
+    est insérée, ou deux actives d'un segment inversé). 0 = dès le passage initial, None = jamais.
+    """
+    active_at, active_before, delivered_before = profile
+    kind, i, j = move; lo, hi = min(i, j), max(i, j)
+    if kind == 'swap': moved = active_at[:, i] | active_at[:, j]
+    elif kind == 'insertion': moved = active_at[:, i]
+    else: moved = active_before[:, hi + 1] - active_before[:, lo] >= 2
+    affected = moved & (delivered_before[:, hi + 1] - delivered_before[:, lo] > 0)
+    return int(affected.argmax()) if affected.any() else None
 
 def generate_custom_order_neighbors(current_custom_order_list):
-    neighbors = []; n = len(current_custom_order_list)
-    if n >= 2:
-        for i in range(n):
-            for j in range(i + 1, n):
-                neighbor_order = current_custom_order_list[:]; neighbor_order[i], neighbor_order[j] = neighbor_order[j], neighbor_order[i]
-                neighbors.append(neighbor_order)
-    return neighbors
+    return [apply_order_move(current_custom_order_list, move) for move in iter_order_moves(len(current_custom_order_list), ('swap',))]
+
+# --- Évaluation des voisins (série ou pool de processus) ---
+# Données réseau d'un processus du pool : envoyées une seule fois par l'initialiseur, pas à chaque tâche.
+_WORKER_NETWORK = None
+
+def evaluate_configuration(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, relation_index=None, checkpoint=None):
+    # Renvoie (résumé des résultats, jours simulés) ; avec `checkpoint`, la simulation reprend au jour enregistré
+    engine = SimulationEngine(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, relation_index, lean=True)
+    if checkpoint is not None: engine.restore(checkpoint)
+    results = engine.run().results(rels_df)
+    return {'profit': float(results['profit']), 'all_demand_met': bool(results['all_demand_met']), 'days_taken_simulation_loop': results['days_taken_simulation_loop']}, engine.days_simulated
+
+def _init_network_worker(heuristic, rels_df, orig_df, dest_df, num_wagons):
+    global _WORKER_NETWORK
+    _WORKER_NETWORK = (heuristic, rels_df, orig_df, dest_df, num_wagons, RelationIndex(rels_df, orig_df.index, dest_df.index))
+
+def _evaluate_in_worker(task):
+    heuristic, rels_df, orig_df, dest_df, num_wagons, rel_index = _WORKER_NETWORK
+    qmin_cfg, phase2_cfg, checkpoint = task
+    return evaluate_configuration(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, rel_index, checkpoint)
+
+class NeighborEvaluator:
+    """Évalue le profit de configurations (ordre QMIN, ordre Phase 2) sur un même réseau.
+
+    Les simulations tournent en mode `lean` (voir SimulationEngine) et partagent les tables du réseau sans copie.
+    Avec `n_workers` > 1, les évaluations sont réparties sur un pool de processus ; les données réseau
+    sont transmises une fois à chaque processus. Les profits sont renvoyés dans l'ordre des configurations,
+    ce qui garantit le même choix de voisin qu'en série. Avec `share_prefix`, les voisins par échange reprennent
+    la simulation de référence au dernier jour qu'ils ont en commun avec elle (`swap_neighbor_profits`).
+    Avec un `cache` (voir cache_simulation.SimulationCache), seules les configurations absentes du cache sont simulées.
+    Avec un `coordinator` (voir calcul_distribue.Coordinator), les évaluations sont confiées à ses processus de
+    calcul, éventuellement sur d'autres machines, au lieu du pool local ; `n_workers` est alors ignoré.
+    `progress(évaluées, total, étape)` est appelé après chaque configuration évaluée d'un appel à `profits`,
+    `stage` étant le libellé de l'étape en cours ; il peut lever SimulationCancelled. `evaluations` compte les
+    simulations lancées (configurations absentes du cache et simulations de référence des voisins par échange).
+    """
+    def __init__(self, heuristic, rels_df, orig_df, dest_df, num_wagons, n_workers=1, share_prefix=True, cache=None, progress=None, coordinator=None):
+        self.heuristic = heuristic; self.rels_df = rels_df; self.orig_df = orig_df; self.dest_df = dest_df; self.num_wagons = num_wagons
+        self.share_prefix = share_prefix; self.days_simulated = 0; self.evaluations = 0; self.progress = progress; self.stage = "Évaluation"
+        self.cache = cache; self.dataset_key = cache.dataset_key(rels_df, orig_df, dest_df) if cache is not None else None
+        self.rel_index = RelationIndex(rels_df, orig_df.index, dest_df.index)
+        self.n_workers = (os.cpu_count() or 1) if n_workers is None else max(1, n_workers)
+        self._pool = None; self.coordinator = coordinator
+        if coordinator is not None:
+            self.n_workers = max(1, coordinator.n_workers); self.remote_dataset_key = coordinator.register_dataset(rels_df, orig_df, dest_df)
+        elif self.n_workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_network_worker, initargs=(heuristic, rels_df, orig_df, dest_df, num_wagons))
+
+    def profits(self, configs, checkpoints=None):
+        tasks = [(qmin_cfg, phase2_cfg, checkpoint) for (qmin_cfg, phase2_cfg), checkpoint in zip(configs, checkpoints or [None] * len(configs))]
+        profits = [None] * len(tasks); keys = [None] * len(tasks)
+        if self.cache is not None:
+            for k, (qmin_cfg, phase2_cfg, _) in enumerate(tasks):
+                keys[k] = self.cache.key(self.dataset_key, self.heuristic, qmin_cfg, phase2_cfg, self.num_wagons, lean=True)
+                summary = self.cache.get_summary(keys[k])
+                if summary is not None: profits[k] = summary['profit']
+        pending = [k for k, profit in enumerate(profits) if profit is None]
+        if self.coordinator is not None and pending:
+            outcomes = self.coordinator.map('evaluate_configuration', self.remote_dataset_key, [(self.heuristic, *tasks[k][:2], self.num_wagons, tasks[k][2]) for k in pending])
+        elif self._pool is None or len(pending) < 2:
+            outcomes = (evaluate_configuration(self.heuristic, self.rels_df, self.orig_df, self.dest_df, *tasks[k][:2], self.num_wagons, self.rel_index, tasks[k][2]) for k in pending)
+        else:
+            chunksize = max(1, len(pending) // (4 * self.n_workers))
+            outcomes = self._pool.map(_evaluate_in_worker, [tasks[k] for k in pending], chunksize=chunksize)
+        for done, (k, (summary, days)) in enumerate(zip(pending, outcomes), start=1):
+            profits[k] = summary['profit']; self.days_simulated += days; self.evaluations += 1
+            if self.cache is not None: self.cache.put_summary(keys[k], summary)
+            if self.progress is not None: self.progress(len(tasks) - len(pending) + done, len(tasks), self.stage)
+        return profits
+
+    def swap_neighbor_profits(self, base_configs, phase, base_order, neighbor_configs):
+        # `neighbor_configs` suit l'ordre de generate_custom_order_neighbors(base_order) ; `phase` désigne l'ordre permuté
+        if not self.share_prefix: return self.profits(neighbor_configs)
+        base = SimulationEngine(self.heuristic, self.rels_df, self.orig_df, self.dest_df, *base_configs, self.num_wagons, self.rel_index, record_checkpoints=True, lean=True).run()
+        self.days_simulated += base.days_simulated; self.evaluations += 1
+        base_profit = base.results(self.rels_df)['profit']
+        profits = [base_profit] * len(neighbor_configs); pending = []
+        for k, resume_day in enumerate(base.swap_resume_days(phase, base_order)):
+            if resume_day is not None: pending.append((k, base.checkpoints[resume_day] if resume_day >= 1 else None))
+        pending_profits = self.profits([neighbor_configs[k] for k, _ in pending], [checkpoint for _, checkpoint in pending])
+        for (k, _), profit in zip(pending, pending_profits): profits[k] = profit
+        return profits
+
+    def close(self):
+        if self._pool is not None: self._pool.shutdown(cancel_futures=True); self._pool = None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+
+def best_improving_neighbor(profits, current_best_profit):
+    # Premier voisin atteignant le meilleur profit strictement supérieur (même départage que la boucle séquentielle)
+    best_k = None
+    for k, profit in enumerate(profits):
+        if profit > current_best_profit: current_best_profit = profit; best_k = k
+    return best_k
 
 # MODIFICATION : APPELS OPTIMISÉS DANS HILL CLIMBING
 def hill_climbing_maximizer_h1(rels_df_hc, orig_df_hc, dest_df_hc, 
                                initial_qmin_config_tuple, initial_phase2_config_tuple, 
-                               num_initial_wagons, max_iterations=10):
+                               num_initial_wagons, max_iterations=10, n_workers=1, share_prefix=True, cache=None, progress=None, coordinator=None,
+                               evaluator=None):
     current_best_qmin_cfg = initial_qmin_config_tuple
     current_best_phase2_cfg = initial_phase2_config_tuple
-    eval_result = run_simulation_h1(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), current_best_qmin_cfg, current_best_phase2_cfg, num_initial_wagons, True, _internal_call_copy=False)
-    current_best_profit_overall = eval_result['profit']
-    print(f"\nProfit initial pour l'optimisation (H1): {current_best_profit_overall:.2f}")
-    for iteration in range(max_iterations):
-        print(f"\n--- Itération de Montée H1 {iteration + 1}/{max_iterations} ---")
-        made_improvement = False
-        if current_best_qmin_cfg and current_best_qmin_cfg[0] == 'custom_order' and len(current_best_qmin_cfg[1]) >= 2:
-            for neighbor_qmin_list in generate_custom_order_neighbors(current_best_qmin_cfg[1]):
-                neighbor_qmin_cfg = ('custom_order', neighbor_qmin_list)
-                eval_n = run_simulation_h1(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), neighbor_qmin_cfg, current_best_phase2_cfg, num_initial_wagons, True, _internal_call_copy=False)
-                if eval_n['profit'] > current_best_profit_overall:
-                    current_best_profit_overall = eval_n['profit']; current_best_qmin_cfg = neighbor_qmin_cfg; made_improvement = True
-        if current_best_phase2_cfg and current_best_phase2_cfg[0] == 'custom_order' and len(current_best_phase2_cfg[1]) >= 2:
-            for neighbor_ph2_list in generate_custom_order_neighbors(current_best_phase2_cfg[1]):
-                neighbor_ph2_cfg = ('custom_order', neighbor_ph2_list)
-                eval_n = run_simulation_h1(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), current_best_qmin_cfg, neighbor_ph2_cfg, num_initial_wagons, True, _internal_call_copy=False)
-                if eval_n['profit'] > current_best_profit_overall:
-                    current_best_profit_overall = eval_n['profit']; current_best_phase2_cfg = neighbor_ph2_cfg; made_improvement = True
-        if not made_improvement: print("Aucune amélioration trouvée."); break
+    # `evaluator` : NeighborEvaluator déjà ouvert sur ce réseau (ses compteurs restent consultables) ; options d'évaluation alors ignorées
+    evaluator_context = contextlib.nullcontext(evaluator) if evaluator is not None else NeighborEvaluator('h1', rels_df_hc, orig_df_hc, dest_df_hc, num_initial_wagons, n_workers, share_prefix, cache, progress, coordinator)
+    with evaluator_context as evaluator:
+        current_best_profit_overall = evaluator.profits([(current_best_qmin_cfg, current_best_phase2_cfg)])[0]
+        print(f"\nProfit initial pour l'optimisation (H1): {current_best_profit_overall:.2f}")
+        for iteration in range(max_iterations):
+            print(f"\n--- Itération de Montée H1 {iteration + 1}/{max_iterations} ---")
+            made_improvement = False
+            if current_best_qmin_cfg and current_best_qmin_cfg[0] == 'custom_order' and len(current_best_qmin_cfg[1]) >= 2:
+                evaluator.stage = f"Montée H1 {iteration + 1}/{max_iterations} — ordre QMIN"
+                neighbor_cfgs = [('custom_order', neighbor_qmin_list) for neighbor_qmin_list in generate_custom_order_neighbors(current_best_qmin_cfg[1])]
+                profits = evaluator.swap_neighbor_profits((current_best_qmin_cfg, current_best_phase2_cfg), 'qmin', current_best_qmin_cfg[1], [(neighbor_qmin_cfg, current_best_phase2_cfg) for neighbor_qmin_cfg in neighbor_cfgs])
+                k = best_improving_neighbor(profits, current_best_profit_overall)
+                if k is not None: current_best_profit_overall = profits[k]; current_best_qmin_cfg = neighbor_cfgs[k]; made_improvement = True
+            if current_best_phase2_cfg and current_best_phase2_cfg[0] == 'custom_order' and len(current_best_phase2_cfg[1]) >= 2:
+                evaluator.stage = f"Montée H1 {iteration + 1}/{max_iterations} — ordre Phase 2"
+                neighbor_cfgs = [('custom_order', neighbor_ph2_list) for neighbor_ph2_list in generate_custom_order_neighbors(current_best_phase2_cfg[1])]
+                profits = evaluator.swap_neighbor_profits((current_best_qmin_cfg, current_best_phase2_cfg), 'phase2', current_best_phase2_cfg[1], [(current_best_qmin_cfg, neighbor_ph2_cfg) for neighbor_ph2_cfg in neighbor_cfgs])
+                k = best_improving_neighbor(profits, current_best_profit_overall)
+                if k is not None: current_best_profit_overall = profits[k]; current_best_phase2_cfg = neighbor_cfgs[k]; made_improvement = True
+            print(f"Jours simulés (cumul) : {evaluator.days_simulated}")
+            if not made_improvement: print("Aucune amélioration trouvée."); break
     print(f"\n--- Fin de l'Optimisation H1. Meilleur profit: {current_best_profit_overall:.2f} ---")
     return (current_best_qmin_cfg, current_best_qmin_cfg, current_best_phase2_cfg)
 
 # MODIFICATION : APPELS OPTIMISÉS DANS HILL CLIMBING
 def hill_climbing_maximizer_h2(rels_df_hc, orig_df_hc, dest_df_hc,
                                initial_qmin_order_list, initial_phase2_order_list, 
-                               num_initial_wagons, max_iterations=10):
+                               num_initial_wagons, max_iterations=10, n_workers=1, share_prefix=True, cache=None, progress=None, coordinator=None,
+                               evaluator=None):
     current_best_qmin_order = initial_qmin_order_list
     current_best_phase2_order = initial_phase2_order_list
-    eval_result = run_simulation_h2(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), current_best_qmin_order, current_best_phase2_order, num_initial_wagons, True, _internal_call_copy=False)
-    current_best_profit_overall = eval_result['profit']
-    print(f"\nProfit initial pour l'optimisation (H2): {current_best_profit_overall:.2f}")
-    for iteration in range(max_iterations):
-        print(f"\n--- Itération de Montée H2 {iteration + 1}/{max_iterations} ---")
-        made_improvement = False
-        if current_best_qmin_order and len(current_best_qmin_order) >= 2:
-            for neighbor_qmin_list in generate_custom_order_neighbors(current_best_qmin_order):
-                eval_n = run_simulation_h2(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), neighbor_qmin_list, current_best_phase2_order, num_initial_wagons, True, _internal_call_copy=False)
-                if eval_n['profit'] > current_best_profit_overall:
-                    current_best_profit_overall = eval_n['profit']; current_best_qmin_order = neighbor_qmin_list; made_improvement = True
-        if current_best_phase2_order and len(current_best_phase2_order) >= 2:
-            for neighbor_ph2_list in generate_custom_order_neighbors(current_best_phase2_order):
-                eval_n = run_simulation_h2(rels_df_hc, orig_df_hc.copy(), dest_df_hc.copy(), current_best_qmin_order, neighbor_ph2_list, num_initial_wagons, True, _internal_call_copy=False)
-                if eval_n['profit'] > current_best_profit_overall:
-                    current_best_profit_overall = eval_n['profit']; current_best_phase2_order = neighbor_ph2_list; made_improvement = True
-        if not made_improvement: print("Aucune amélioration trouvée."); break
+    # `evaluator` : NeighborEvaluator déjà ouvert sur ce réseau (ses compteurs restent consultables) ; options d'évaluation alors ignorées
+    evaluator_context = contextlib.nullcontext(evaluator) if evaluator is not None else NeighborEvaluator('h2', rels_df_hc, orig_df_hc, dest_df_hc, num_initial_wagons, n_workers, share_prefix, cache, progress, coordinator)
+    with evaluator_context as evaluator:
+        current_best_profit_overall = evaluator.profits([(current_best_qmin_order, current_best_phase2_order)])[0]
+        print(f"\nProfit initial pour l'optimisation (H2): {current_best_profit_overall:.2f}")
+        for iteration in range(max_iterations):
+            print(f"\n--- Itération de Montée H2 {iteration + 1}/{max_iterations} ---")
+            made_improvement = False
+            if current_best_qmin_order and len(current_best_qmin_order) >= 2:
+                evaluator.stage = f"Montée H2 {iteration + 1}/{max_iterations} — ordre QMIN"
+                neighbor_lists = generate_custom_order_neighbors(current_best_qmin_order)
+                profits = evaluator.swap_neighbor_profits((current_best_qmin_order, current_best_phase2_order), 'qmin', current_best_qmin_order, [(neighbor_qmin_list, current_best_phase2_order) for neighbor_qmin_list in neighbor_lists])
+                k = best_improving_neighbor(profits, current_best_profit_overall)
+                if k is not None: current_best_profit_overall = profits[k]; current_best_qmin_order = neighbor_lists[k]; made_improvement = True
+            if current_best_phase2_order and len(current_best_phase2_order) >= 2:
+                evaluator.stage = f"Montée H2 {iteration + 1}/{max_iterations} — ordre Phase 2"
+                neighbor_lists = generate_custom_order_neighbors(current_best_phase2_order)
+                profits = evaluator.swap_neighbor_profits((current_best_qmin_order, current_best_phase2_order), 'phase2', current_best_phase2_order, [(current_best_qmin_order, neighbor_ph2_list) for neighbor_ph2_list in neighbor_lists])
+                k = best_improving_neighbor(profits, current_best_profit_overall)
+                if k is not None: current_best_profit_overall = profits[k]; current_best_phase2_order = neighbor_lists[k]; made_improvement = True
+            print(f"Jours simulés (cumul) : {evaluator.days_simulated}")
+            if not made_improvement: print("Aucune amélioration trouvée."); break
     print(f"\n--- Fin de l'Optimisation H2. Meilleur profit: {current_best_profit_overall:.2f} ---")
     return (current_best_qmin_order, current_best_phase2_order)
 
+# --- Recherche locale sous budget ---
+SEARCH_STRATEGIES = ('first_improvement', 'sampled', 'annealing', 'tabu')
+
+def custom_order_of(heuristic, config):
+    # Ordre explorable d'une configuration : H1 ('custom_order', ids), H2 liste d'identifiants ; sinon None
+    if heuristic == 'h1': return list(config[1]) if config and config[0] == 'custom_order' else None
+    return list(config) if config else None
+
+class _OrderSearch:
+    """État d'une recherche : ordres et profit courants, meilleure solution, simulation de référence et budget."""
+    def __init__(self, evaluator, configs, moves, rng, max_evaluations, time_budget_s, share_prefix, progress, strategy):
+        self.evaluator = evaluator; self.heuristic = evaluator.heuristic; self.configs = dict(configs); self.moves = moves; self.rng = rng
+        self.orders = {phase: custom_order_of(self.heuristic, config) for phase, config in self.configs.items()}
+        self.phases = [phase for phase, order in self.orders.items() if order is not None and len(order) >= 2]
+        self.max_evaluations = max_evaluations; self.time_budget_s = time_budget_s; self.t0 = time.perf_counter()
+        self.share_prefix = share_prefix; self.progress = progress; self.strategy = strategy
+        self.evaluations = 0; self.accepted_moves = 0; self.base = None; self.profiles = {}; self.neighborhood_exhausted = False
+        self.profit = self._rebase() if share_prefix else self._simulate([self._configs_with(None, None)])[0]
+        self.initial_profit = self.best_profit = self.profit; self.best_configs = dict(self.configs)
+
+    def _configs_with(self, phase, order):
+        configs = dict(self.configs)
+        if phase is not None: configs[phase] = ('custom_order', order) if self.heuristic == 'h1' else order
+        return configs['qmin'], configs['phase2']
+
+    def _simulate(self, configs, checkpoints=None):
+        self.evaluations += len(configs)
+        return self.evaluator.profits(configs, checkpoints)
+
+    def _rebase(self):
+        # Simulation courante avec points de reprise : les voisins en repartent (move_resume_day)
+        ev = self.evaluator; self.evaluations += 1; self.profiles = {}
+        self.base = SimulationEngine(ev.heuristic, ev.rels_df, ev.orig_df, ev.dest_df, *self._configs_with(None, None), ev.num_wagons, ev.rel_index, record_checkpoints=True, lean=True).run()
+        ev.days_simulated += self.base.days_simulated; ev.evaluations += 1
+        return float(self.base.results(ev.rels_df)['profit'])
+
+    def exhausted(self):
+        return ((self.max_evaluations is not None and self.evaluations >= self.max_evaluations)
+                or (self.time_budget_s is not None and time.perf_counter() - self.t0 >= self.time_budget_s))
+
+    def candidates(self):
+        return _iter_moves([(phase, kind, len(self.orders[phase])) for phase in self.phases for kind in self.moves], self.rng)
+
+    def sample(self, candidates, size):
+        """Évalue jusqu'à `size` voisins tirés de `candidates` (par lots de la taille du pool, sans dépasser le budget).
+
+        Renvoie les voisins simulés [(phase, mouvement, ordre voisin, profit)] ; ceux qui ne peuvent rien changer à
+        la simulation courante (même profit, même trajectoire) sont écartés sans être simulés.
+        """
+        evaluated = []; self.neighborhood_exhausted = False
+        while len(evaluated) < size and not self.exhausted():
+            if self.share_prefix and self.base is None: self._rebase(); continue
+            room = self.evaluator.n_workers if self.max_evaluations is None else min(self.evaluator.n_workers, self.max_evaluations - self.evaluations)
+            batch = list(itertools.islice(candidates, min(size - len(evaluated), room)))
+            if not batch: self.neighborhood_exhausted = True; break
+            neighbors = []; checkpoints = []
+            for phase, move in batch:
+                resume_day = move_resume_day(self._profile(phase), move) if self.share_prefix else -1
+                if resume_day is None: continue
+                neighbors.append((phase, move, apply_order_move(self.orders[phase], move)))
+                checkpoints.append(self.base.checkpoints[resume_day] if resume_day >= 1 else None)
+            if neighbors:
+                profits = self._simulate([self._configs_with(phase, order) for phase, _, order in neighbors], checkpoints)
+                evaluated.extend(neighbor + (profit,) for neighbor, profit in zip(neighbors, profits))
+                self._report()
+        return evaluated
+
+    def _profile(self, phase):
+        if phase not in self.profiles: self.profiles[phase] = self.base.order_profile(phase, self.orders[phase])
+        return self.profiles[phase]
+
+    def accept(self, phase, order, profit):
+        self.orders[phase] = order; self.configs[phase] = self._configs_with(phase, order)[0 if phase == 'qmin' else 1]
+        # Simulation de référence refaite au prochain échantillon seulement : pas d'évaluation au-delà du budget
+        self.accepted_moves += 1; self.profit = profit; self.base = None; self.profiles = {}
+        if self.profit > self.best_profit: self.best_profit = self.profit; self.best_configs = dict(self.configs)
+
+    def _report(self):
+        if self.progress is None: return
+        fractions = [self.evaluations / self.max_evaluations] if self.max_evaluations else []
+        if self.time_budget_s: fractions.append((time.perf_counter() - self.t0) / self.time_budget_s)
+        stage = f"Recherche {self.strategy} — {self.evaluations} évaluations, meilleur profit {self.best_profit:,.0f}".replace(',', ' ')
+        self.progress(min(1000, int(1000 * max(fractions))), 1000, stage)
+
+def budgeted_order_search(heuristic, rels_df, orig_df, dest_df, qmin_config, phase2_config, num_initial_wagons,
+                          strategy='first_improvement', max_evaluations=None, time_budget_s=None, moves=ORDER_MOVES,
+                          sample_size=50, initial_temperature=None, cooling=0.98, tabu_tenure=7, seed=0,
+                          n_workers=1, share_prefix=True, cache=None, progress=None, coordinator=None):
+    """Recherche locale sur les ordres personnalisés QMIN / Phase 2 sous budget d'évaluations et/ou de temps (secondes).
+
+    Les voisins (ORDER_MOVES) sont tirés au hasard un par un, sans construire le voisinage :
+    - 'first_improvement' : le premier voisin meilleur est retenu ; arrêt sur un optimum local ;
+    - 'sampled' : le meilleur voisin d'un échantillon de `sample_size` est retenu s'il améliore ;
+    - 'annealing' : recuit simulé, un voisin moins bon est accepté avec la probabilité exp(écart / température),
+      la température étant multipliée par `cooling` à chaque évaluation ;
+    - 'tabu' : le meilleur voisin d'un échantillon est retenu même s'il est moins bon ; les destinations déplacées
+      restent taboues `tabu_tenure` itérations, sauf pour un voisin qui bat le meilleur profit.
+    Configurations au format de l'heuristique (H1 : seuls les ('custom_order', ids) sont explorés ; H2 : listes d'ids).
+    Une évaluation est une simulation, éventuellement reprise au premier jour que le mouvement peut modifier ;
+    leur nombre ne dépasse jamais `max_evaluations`.
+    Avec `coordinator`, les évaluations sont réparties sur ses processus de calcul (voir NeighborEvaluator).
+    Renvoie un dictionnaire : 'qmin_config', 'phase2_config' (meilleures), 'profit', 'initial_profit',
+    'evaluations', 'accepted_moves', 'seconds', 'stopped_by' ('budget', 'local_optimum' ou 'no_neighbor').
+    """
+    if strategy not in SEARCH_STRATEGIES: raise ValueError(f"Stratégie de recherche inconnue : {strategy!r}")
+    if max_evaluations is None and time_budget_s is None: raise ValueError("Un budget (max_evaluations ou time_budget_s) est requis.")
+    rng = np.random.default_rng(seed)
+    with NeighborEvaluator(heuristic, rels_df, orig_df, dest_df, num_initial_wagons, n_workers, share_prefix, cache, coordinator=coordinator) as evaluator:
+        search = _OrderSearch(evaluator, {'qmin': qmin_config, 'phase2': phase2_config}, moves, rng, max_evaluations, time_budget_s, share_prefix, progress, strategy)
+        print(f"\nProfit initial pour la recherche {strategy} ({heuristic.upper()}): {search.profit:.2f}")
+        stopped_by = 'no_neighbor' if not search.phases else None
+        temperature = initial_temperature if initial_temperature is not None else max(abs(search.profit) * 1e-3, 1.0)
+        tabu_until = {}; iteration = 0
+        while stopped_by is None:
+            if search.exhausted(): stopped_by = 'budget'; break
+            iteration += 1
+            if strategy in ('first_improvement', 'sampled'):
+                # Voisinage parcouru par échantillons jusqu'à une amélioration ; épuisé sans amélioration = optimum local
+                candidates = search.candidates(); accepted = False
+                while not accepted and not search.exhausted():
+                    evaluated = search.sample(candidates, evaluator.n_workers if strategy == 'first_improvement' else sample_size)
+                    profits = [profit for *_, profit in evaluated]
+                    k = best_improving_neighbor(profits, search.profit) if strategy == 'sampled' else next((k for k, profit in enumerate(profits) if profit > search.profit), None)
+                    if k is not None: phase, _, order, profit = evaluated[k]; search.accept(phase, order, profit); accepted = True
+                    elif search.neighborhood_exhausted: stopped_by = 'local_optimum'; break
+            elif strategy == 'annealing':
+                evaluated = search.sample(search.candidates(), 1)
+                if not evaluated: stopped_by = 'local_optimum'; break
+                phase, _, order, profit = evaluated[0]; delta = profit - search.profit
+                if delta > 0 or rng.random() < math.exp(delta / temperature): search.accept(phase, order, profit)
+                temperature *= cooling
+            else:
+                evaluated = search.sample(search.candidates(), sample_size)
+                if not evaluated: stopped_by = 'local_optimum'; break
+                admissible = [k for k, (phase, move, _, profit) in enumerate(evaluated)
+                              if profit > search.best_profit or all(tabu_until.get((phase, dest_id), 0) < iteration for dest_id in moved_destinations(search.orders[phase], move))]
+                if admissible:
+                    k = max(admissible, key=lambda k: evaluated[k][3]); phase, move, order, profit = evaluated[k]
+                    for dest_id in moved_destinations(search.orders[phase], move): tabu_until[(phase, dest_id)] = iteration + tabu_tenure
+                    search.accept(phase, order, profit)
+        seconds = time.perf_counter() - search.t0
+        print(f"Évaluations : {search.evaluations}, mouvements acceptés : {search.accepted_moves}, jours simulés (cumul) : {evaluator.days_simulated}")
+    print(f"\n--- Fin de la recherche {strategy}. Meilleur profit: {search.best_profit:.2f} ---")
+    return {'qmin_config': search.best_configs['qmin'], 'phase2_config': search.best_configs['phase2'], 'profit': search.best_profit,
+            'initial_profit': search.initial_profit, 'evaluations': search.evaluations, 'accepted_moves': search.accepted_moves,
+            'seconds': seconds, 'stopped_by': stopped_by or 'budget'}
+
+def _excel_rows(df, include_index=False):
+    # Lignes en types Python natifs ; NaN et infinis deviennent des cellules vides
+    columns = ([df.index.tolist()] if include_index else []) + [df[c].tolist() for c in df.columns]
+    for row in zip(*columns):
+        yield [None if isinstance(v, float) and not math.isfinite(v) else v for v in row]
+
+def _write_excel_sheet(workbook, title, df, include_index=False):
+    sheet = workbook.create_sheet(title=title[:31])
+    if df is None: return
+    header = ([df.index.name or 'id'] if include_index else []) + [str(c) for c in df.columns]
+    sheet.append(header)
+    for row in _excel_rows(df, include_index): sheet.append(row)
+
 def ecrire_resultats_excel(chemin_fichier_excel, nom_feuille_sortie, sim_results,
                            origins_initial_df_ref, destinations_initial_df_ref):
-    # Cette fonction est conservée pour la compatibilité
-    pass
-
-        
-    
-    
-     
-        
-
-        
-       
-          
-              
-        
-      
-        
+    """Écrit le rapport (chemin ou flux binaire) : synthèse, expéditions, destinations et origines finales, suivi des wagons.
+
+    Mode écriture seule d'openpyxl : les lignes sont écrites au fil de l'eau, sans arbre de cellules en mémoire.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    summary = workbook.create_sheet(title=nom_feuille_sortie[:31])
+    summary.append(['Indicateur', 'Valeur'])
+    summary.append(['Profit (tonnes * km)', float(sim_results.get('profit', 0.0))])
+    summary.append(['Jours de simulation', sim_results.get('days_taken_simulation_loop')])
+    summary.append(['Demande satisfaite', 'Oui' if sim_results.get('all_demand_met') else 'Non'])
+    shipments_df = sim_results.get('shipments_df')
+    summary.append(["Nombre d'expéditions", 0 if shipments_df is None else len(shipments_df)])
+    _write_excel_sheet(workbook, 'Expeditions', shipments_df)
+    destinations_df = sim_results.get('final_destinations_df')
+    if destinations_df is not None and {'annual_demand_tons', 'delivered_so_far_tons'} <= set(destinations_df.columns):
+        destinations_df = destinations_df.copy(); demand = destinations_df['annual_demand_tons']
+        destinations_df['satisfaction_%'] = (destinations_df['delivered_so_far_tons'] / demand.where(demand > 0) * 100).fillna(0)
+    _write_excel_sheet(workbook, 'Destinations', destinations_df, include_index=True)
+    origins_df = sim_results.get('final_origins_df')
+    if origins_df is not None and origins_initial_df_ref is not None and 'initial_available_product_tons' in origins_initial_df_ref.columns:
+        origins_df = origins_df.copy()
+        origins_df['stock_utilise_tons'] = origins_initial_df_ref['initial_available_product_tons'].reindex(origins_df.index) - origins_df['current_available_product_tons']
+    _write_excel_sheet(workbook, 'Origines', origins_df, include_index=True)
+    wagon_log = (sim_results.get('final_tracking_vars') or {}).get('daily_wagon_log')
+    _write_excel_sheet(workbook, 'Suivi_Wagons', pd.DataFrame(wagon_log, columns=list(WAGON_LOG_FIELDS)) if wagon_log is not None else None)
+    workbook.save(chemin_fichier_excel)
@@ -0,0 +1,161 @@
+# Fichier : dimensionnement_flotte.py
+# Dimensionnement de la flotte : plus petite flotte satisfaisant toute la demande (recherche exponentielle puis
+# dichotomie sur le nombre de wagons), tailles candidates évaluées en parallèle, courbe profit / jours par taille.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import combainaisonexceldescente as sim
+
+CURVE_COLUMNS = ['num_wagons', 'profit', 'days_taken_simulation_loop', 'all_demand_met', 'peak_wagons_in_transit', 'profit_per_wagon']
+
+_WORKER_NETWORK = None  # Par processus : (heuristique, relations, origines, destinations, ordres, index des relations)
+
+def evaluate_fleet(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, relation_index=None):
+    """Résumé d'une simulation `lean` avec `num_wagons` wagons (profit, all_demand_met, jours, pic de wagons en transit)."""
+    engine = sim.SimulationEngine(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, relation_index, lean=True).run()
+    results = engine.results(rels_df)
+    return {'profit': float(results['profit']), 'all_demand_met': bool(results['all_demand_met']),
+            'days_taken_simulation_loop': int(results['days_taken_simulation_loop']), 'peak_wagons_in_transit': int(engine.peak_wagons_in_transit)}
+
+def _init_fleet_worker(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg):
+    global _WORKER_NETWORK
+    _WORKER_NETWORK = (heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, sim.RelationIndex(rels_df, orig_df.index, dest_df.index))
+
+def _evaluate_in_worker(num_wagons):
+    heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, rel_index = _WORKER_NETWORK
+    return evaluate_fleet(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, num_wagons, rel_index)
+
+class FleetSizer:
+    """Évalue une même configuration (heuristique, ordres) pour plusieurs tailles de flotte.
+
+    Les tailles d'un appel à `evaluate` sont simulées ensemble sur un pool de processus avec `n_workers` > 1
+    (tous les cœurs si None) ; les données réseau sont transmises une fois à chaque processus. Une simulation
+    dont le pic de wagons en transit reste sous la flotte n'a jamais manqué de wagons : ses résultats valent pour
+    toute flotte d'au moins ce pic, qui est enregistrée sans nouvelle simulation (`saturation_fleet`, la plus petite).
+    Avec un `cache` (voir cache_simulation.SimulationCache), les résumés déjà calculés ne sont pas resimulés. Avec un
+    `coordinator` (voir calcul_distribue.Coordinator), les tailles sont simulées par ses processus de calcul.
+    """
+    def __init__(self, heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, n_workers=None, cache=None, progress=None, coordinator=None):
+        self.heuristic = heuristic; self.rels_df = rels_df; self.orig_df = orig_df; self.dest_df = dest_df
+        self.qmin_cfg = qmin_cfg; self.phase2_cfg = phase2_cfg; self.progress = progress
+        self.cache = cache; self.dataset_key = cache.dataset_key(rels_df, orig_df, dest_df) if cache is not None else None
+        self.rel_index = sim.RelationIndex(rels_df, orig_df.index, dest_df.index)
+        self.summaries = {}; self.evaluations = 0; self.saturation_fleet = None
+        self.n_workers = (os.cpu_count() or 1) if n_workers is None else max(1, n_workers)
+        self._pool = None; self.coordinator = coordinator
+        if coordinator is not None:
+            self.n_workers = max(1, coordinator.n_workers); self.remote_dataset_key = coordinator.register_dataset(rels_df, orig_df, dest_df)
+        elif self.n_workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_fleet_worker, initargs=(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg))
+
+    def known(self, num_wagons):
+        # Résumé connu pour cette taille, directement ou au-delà de la flotte de saturation
+        if num_wagons in self.summaries: return self.summaries[num_wagons]
+        if self.saturation_fleet is not None and num_wagons >= self.saturation_fleet: return self.summaries[self.saturation_fleet]
+        return None
+
+    def _record(self, num_wagons, summary):
+        self.summaries[num_wagons] = summary
+        peak = summary.get('peak_wagons_in_transit', num_wagons)
+        if peak < num_wagons:
+            saturation = max(peak, 1)
+            self.summaries.setdefault(saturation, summary)
+            if self.saturation_fleet is None or saturation < self.saturation_fleet: self.saturation_fleet = saturation
+
+    def evaluate(self, sizes, stage="Dimensionnement de la flotte"):
+        pending = sorted({int(n) for n in sizes if self.known(int(n)) is None})
+        keys = {}
+        if self.cache is not None:
+            for n in list(pending):
+                keys[n] = self.cache.key(self.dataset_key, self.heuristic, self.qmin_cfg, self.phase2_cfg, n, lean=True)
+                summary = self.cache.get_summary(keys[n])
+                if summary is not None: self._record(n, summary); pending.remove(n)
+        if self.coordinator is not None and pending:
+            outcomes = self.coordinator.map('evaluate_fleet', self.remote_dataset_key, [(self.heuristic, self.qmin_cfg, self.phase2_cfg, n) for n in pending])
+        elif self._pool is None or len(pending) < 2:
+            outcomes = (evaluate_fleet(self.heuristic, self.rels_df, self.orig_df, self.dest_df, self.qmin_cfg, self.phase2_cfg, n, self.rel_index) for n in pending)
+        else:
+            outcomes = self._pool.map(_evaluate_in_worker, pending)
+        for done, (n, summary) in enumerate(zip(pending, outcomes), start=1):
+            self._record(n, summary); self.evaluations += 1
+            if self.cache is not None: self.cache.put_summary(keys[n], summary)
+            if self.progress is not None: self.progress(done, len(pending), stage)
+        return [self.known(int(n)) for n in sizes]
+
+    def curve(self):
+        rows = [{'num_wagons': n, **summary} for n, summary in sorted(self.summaries.items())]
+        curve = pd.DataFrame(rows, columns=CURVE_COLUMNS[:-1])
+        curve['profit_per_wagon'] = curve['profit'] / curve['num_wagons']
+        return curve
+
+    def close(self):
+        if self._pool is not None: self._pool.shutdown(cancel_futures=True); self._pool = None
+
+    def __enter__(self): return self
+    def __exit__(self, *exc_info): self.close()
+
+def _interior_points(lo, hi, count):
+    # Jusqu'à `count` tailles régulièrement espacées strictement entre lo et hi
+    return sorted({int(round(x)) for x in np.linspace(lo, hi, count + 2)[1:-1]} - {lo, hi})
+
+def _largest_known_unmet(sizer, min_wagons, hi):
+    # Plus grande flotte connue insuffisante sous `hi` (min_wagons - 1 si aucune)
+    return max([n for n, summary in sizer.summaries.items() if min_wagons <= n < hi and not summary['all_demand_met']] + [min_wagons - 1])
+
+def _bisect(sizer, min_wagons, hi):
+    # Dichotomie entre la plus grande flotte connue insuffisante et `hi` (suffisante), `n_workers` tailles par tour
+    lo = _largest_known_unmet(sizer, min_wagons, hi)
+    while hi - lo > 1:
+        sizes = _interior_points(lo, hi, sizer.n_workers)
+        for n, summary in zip(sizes, sizer.evaluate(sizes, "Dimensionnement : dichotomie")):
+            if summary['all_demand_met']: hi = min(hi, n)
+        lo = _largest_known_unmet(sizer, min_wagons, hi)
+    return hi
+
+def size_fleet(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, min_wagons=1, max_wagons=5000, start_wagons=None,
+               curve_points=8, n_workers=None, cache=None, progress=None, coordinator=None):
+    """Plus petite flotte de [min_wagons, max_wagons] satisfaisant toute la demande, et courbe profit / jours.
+
+    Recherche exponentielle depuis `start_wagons` (doublée à chaque essai) jusqu'à une flotte qui satisfait la
+    demande, puis dichotomie : chaque tour évalue en parallèle autant de tailles qu'il y a de processus. Dès qu'une
+    simulation atteint la saturation (voir FleetSizer), les flottes plus grandes ne sont plus simulées.
+    `curve_points` tailles régulièrement espacées complètent ensuite la courbe. Les heuristiques étant gloutonnes,
+    all_demand_met n'est pas toujours croissant avec la flotte : si la courbe révèle une flotte suffisante plus
+    petite, la dichotomie reprend sous elle ; la flotte renvoyée satisfait la demande et celle qui la précède
+    immédiatement non. Renvoie un dictionnaire : min_fleet_all_demand_met (None si la demande n'est jamais satisfaite),
+    saturation_fleet (None si non atteinte), best_profit_per_wagon, evaluations, curve (DataFrame CURVE_COLUMNS).
+    `progress(évaluées, total, étape)` est appelé après chaque simulation ; il peut lever SimulationCancelled.
+    `n_workers`, `cache` et `coordinator` : voir FleetSizer.
+    """
+    if not 1 <= min_wagons <= max_wagons: raise ValueError(f"Bornes de flotte invalides : {min_wagons} à {max_wagons}")
+    with FleetSizer(heuristic, rels_df, orig_df, dest_df, qmin_cfg, phase2_cfg, n_workers, cache, progress, coordinator) as sizer:
+        batch = sizer.n_workers
+        # Recherche exponentielle : `lo` = plus grande flotte connue insuffisante, `hi` = plus petite flotte suffisante
+        lo, hi = min_wagons - 1, None; size = min(max(start_wagons or min_wagons, min_wagons), max_wagons)
+        while hi is None:
+            sizes = []
+            while len(sizes) < batch and size not in sizes:
+                sizes.append(size); size = min(size * 2, max_wagons)
+            for n, summary in zip(sizes, sizer.evaluate(sizes, "Dimensionnement : recherche exponentielle")):
+                if summary['all_demand_met']: hi = n if hi is None else min(hi, n)
+                elif hi is None: lo = max(lo, n)
+            if sizer.saturation_fleet is not None and hi is None: break  # Flottes plus grandes : mêmes résultats
+            if hi is None and sizes[-1] == max_wagons: break
+        if hi is not None:
+            if sizer.saturation_fleet is not None and sizer.known(sizer.saturation_fleet)['all_demand_met']: hi = min(hi, max(sizer.saturation_fleet, min_wagons))
+            hi = _bisect(sizer, min_wagons, hi)
+        ceiling = min(max_wagons, sizer.saturation_fleet or max_wagons, max(hi or 0, max(sizer.summaries)))
+        if curve_points > 0 and ceiling > min_wagons:
+            sizer.evaluate(_interior_points(min_wagons, ceiling, curve_points) + [min_wagons], "Dimensionnement : courbe")
+            # Demande non monotone : la courbe peut révéler une flotte suffisante plus petite
+            met = [n for n, summary in sizer.summaries.items() if min_wagons <= n < (hi or max_wagons + 1) and summary['all_demand_met']]
+            if met: hi = _bisect(sizer, min_wagons, min(met))
+        curve = sizer.curve(); curve = curve[curve['num_wagons'].between(min_wagons, max_wagons)].reset_index(drop=True)
+        best = curve.loc[curve['profit_per_wagon'].idxmax()] if len(curve) else None
+        return {'min_fleet_all_demand_met': hi, 'saturation_fleet': sizer.saturation_fleet,
+                'best_profit_per_wagon': None if best is None else {'num_wagons': int(best['num_wagons']), 'profit': float(best['profit']), 'profit_per_wagon': float(best['profit_per_wagon'])},
+                'evaluations': sizer.evaluations, 'curve': curve}
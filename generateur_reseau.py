@@ -0,0 +1,63 @@
+# Fichier : generateur_reseau.py
+# Génère un réseau logistique synthétique (relations, origines, destinations) au format lu par `load_data_csv`.
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+RELATIONS_FILE = 'relations.csv'
+ORIGINS_FILE = 'origines.csv'
+DESTINATIONS_FILE = 'destinations.csv'
+PARAMETERS_FILE = 'reseau.json'
+
+def generate_network(n_origins, n_destinations, density=0.3, stock_demand_ratio=1.2, seed=0,
+                     min_distance_km=50, max_distance_km=1500, profitable_share=0.7):
+    """Réseau aléatoire reproductible ; renvoie (relations_df, origins_df, destinations_df) avec une colonne `id`.
+
+    Chaque destination reçoit au moins une relation. Le stock initial total vaut `stock_demand_ratio` fois la
+    demande annuelle totale.
+    """
+    rng = np.random.default_rng(seed)
+    origin_ids = [f"O{i + 1:04d}" for i in range(n_origins)]
+    dest_ids = [f"D{i + 1:04d}" for i in range(n_destinations)]
+    annual_demand = rng.integers(4, 200, n_destinations) * 250.0
+    stock_weights = rng.uniform(0.2, 1.0, n_origins)
+    initial_stock = np.round(stock_weights / stock_weights.sum() * annual_demand.sum() * stock_demand_ratio, 0)
+    origins_df = pd.DataFrame({'id': origin_ids, 'daily_loading_capacity_tons': rng.integers(4, 40, n_origins) * 50.0,
+                               'initial_available_product_tons': initial_stock})
+    destinations_df = pd.DataFrame({'id': dest_ids, 'daily_unloading_capacity_tons': rng.integers(2, 20, n_destinations) * 25.0,
+                                    'annual_demand_tons': annual_demand})
+    linked = rng.random((n_origins, n_destinations)) < density
+    linked[rng.integers(0, n_origins, n_destinations), np.arange(n_destinations)] = True
+    origin_pos, dest_pos = np.nonzero(linked)
+    relations_df = pd.DataFrame({'origin': np.array(origin_ids)[origin_pos], 'destination': np.array(dest_ids)[dest_pos],
+                                 'distance_km': np.round(rng.uniform(min_distance_km, max_distance_km, len(origin_pos)), 0),
+                                 'profitability': (rng.random(len(origin_pos)) < profitable_share).astype(int)})
+    relations_df = relations_df.iloc[rng.permutation(len(relations_df))].reset_index(drop=True)
+    return relations_df, origins_df, destinations_df
+
+def write_network_csv(output_dir, n_origins, n_destinations, density=0.3, stock_demand_ratio=1.2, num_wagons=100, seed=0):
+    """Écrit les trois CSV et `reseau.json` (paramètres, dont la taille de flotte) ; renvoie les chemins des CSV."""
+    os.makedirs(output_dir, exist_ok=True)
+    frames = generate_network(n_origins, n_destinations, density, stock_demand_ratio, seed)
+    paths = tuple(os.path.join(output_dir, name) for name in (RELATIONS_FILE, ORIGINS_FILE, DESTINATIONS_FILE))
+    for df, path in zip(frames, paths): df.to_csv(path, index=False)
+    parameters = {'n_origins': n_origins, 'n_destinations': n_destinations, 'density': density,
+                  'stock_demand_ratio': stock_demand_ratio, 'num_wagons': num_wagons, 'seed': seed}
+    with open(os.path.join(output_dir, PARAMETERS_FILE), 'w') as f: json.dump(parameters, f, indent=2)
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Génère un réseau logistique synthétique au format CSV.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--origins', type=int, default=20)
+    parser.add_argument('--destinations', type=int, default=60)
+    parser.add_argument('--density', type=float, default=0.3)
+    parser.add_argument('--stock-demand-ratio', type=float, default=1.2)
+    parser.add_argument('--wagons', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in write_network_csv(args.output_dir, args.origins, args.destinations, args.density, args.stock_demand_ratio, args.wagons, args.seed): print(path)
@@ -0,0 +1,131 @@
+# Fichier : ingestion.py
+# Chargement commun des trois fichiers CSV (relations, origines, destinations) : nettoyage numérique vectorisé,
+# identifiants typés, validation et instantané binaire (Parquet) des données nettoyées.
+
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+
+import pandas as pd
+
+INGESTION_VERSION = 1  # À incrémenter si le nettoyage change : invalide les instantanés existants
+TABLES = ('relations', 'origins', 'destinations')
+ID_COLUMNS = {'relations': ('origin', 'destination'), 'origins': ('id',), 'destinations': ('id',)}
+NUMERIC_COLUMNS = {'relations': {'distance_km': float, 'profitability': int},
+                   'origins': {'daily_loading_capacity_tons': float, 'initial_available_product_tons': float},
+                   'destinations': {'daily_unloading_capacity_tons': float, 'annual_demand_tons': float}}
+THOUSANDS_SEPARATORS = '[\u202f\u00a0 ]'  # espace fine insécable, espace insécable, espace
+MAX_REPORTED_ROWS = 5
+
+class IngestionError(ValueError):
+    """Fichier d'entrée inutilisable (colonne manquante, identifiant vide, valeur numérique illisible)."""
+
+# --- Nettoyage ---
+def parse_numeric_column(series, table, column):
+    """Valeurs numériques d'une colonne lue en texte ; accepte l'espace fine insécable des milliers et la virgule décimale.
+
+    Conversion directe de toute la colonne ; le nettoyage des chaînes n'est fait que si elle échoue.
+    """
+    try: numbers = series.astype(float)
+    except (ValueError, TypeError):
+        cleaned = series.str.replace(THOUSANDS_SEPARATORS, '', regex=True).str.replace(',', '.', regex=False).str.strip()
+        try: numbers = cleaned.astype(float)
+        except (ValueError, TypeError): numbers = pd.to_numeric(cleaned, errors='coerce')
+    invalid = numbers.isna()
+    if NUMERIC_COLUMNS[table][column] is int: invalid = invalid | (numbers % 1 != 0)
+    invalid = invalid.to_numpy()
+    if invalid.any():
+        rows = [f"ligne {i + 2} ({series.iloc[i]!r})" for i in invalid.nonzero()[0][:MAX_REPORTED_ROWS]]
+        raise IngestionError(f"{table} : {int(invalid.sum())} valeur(s) illisible(s) dans '{column}' : {', '.join(rows)}")
+    return numbers.astype(NUMERIC_COLUMNS[table][column])
+
+def clean_table(raw_df, table):
+    """Table nettoyée : identifiants sans espaces, colonnes numériques typées ; les origines/destinations sont indexées par `id`."""
+    missing = [c for c in ID_COLUMNS[table] + tuple(NUMERIC_COLUMNS[table]) if c not in raw_df.columns]
+    if missing: raise IngestionError(f"{table} : colonne(s) manquante(s) : {', '.join(missing)}")
+    df = raw_df.copy()
+    for column in ID_COLUMNS[table]:
+        ids = df[column].str.strip()
+        if ids.isna().any() or (ids == '').any(): raise IngestionError(f"{table} : identifiant vide dans '{column}'")
+        df[column] = ids
+    for column in NUMERIC_COLUMNS[table]: df[column] = parse_numeric_column(df[column], table, column)
+    if table == 'relations':
+        for column in ID_COLUMNS[table]: df[column] = df[column].astype('category')
+        return df
+    return df.set_index('id')
+
+def validate_network(relations_df, origins_df, destinations_df, strict=False):
+    """Anomalies non bloquantes (doublons, identifiants inconnus, valeurs négatives) ; renvoie une liste de messages.
+
+    Avec `strict`, la moindre anomalie lève IngestionError (tous les messages réunis).
+    """
+    warnings = []
+    for table, df in (('origins', origins_df), ('destinations', destinations_df)):
+        duplicated = df.index[df.index.duplicated()].unique().tolist()
+        if duplicated: warnings.append(f"{table} : identifiant(s) en double : {', '.join(map(str, duplicated[:MAX_REPORTED_ROWS]))}")
+    for column, ids in (('origin', origins_df.index), ('destination', destinations_df.index)):
+        unknown = relations_df.loc[~relations_df[column].isin(ids), column].unique().tolist()
+        if unknown: warnings.append(f"relations : {len(unknown)} {column}(s) inconnue(s), relations ignorées : {', '.join(map(str, unknown[:MAX_REPORTED_ROWS]))}")
+    for table, df in zip(TABLES, (relations_df, origins_df, destinations_df)):
+        for column in NUMERIC_COLUMNS[table]:
+            if (df[column] < 0).any(): warnings.append(f"{table} : valeur(s) négative(s) dans '{column}'")
+    if not relations_df['profitability'].isin([0, 1]).all(): warnings.append("relations : 'profitability' contient des valeurs autres que 0 et 1")
+    if strict and warnings: raise IngestionError(' ; '.join(warnings))
+    return warnings
+
+# --- Lecture et instantanés ---
+def _read_source(source):
+    # Chemin ou objet fichier (fichier téléversé Streamlit, BytesIO)
+    if hasattr(source, 'read'):
+        if hasattr(source, 'seek'): source.seek(0)
+        return source.read()
+    with open(source, 'rb') as f: return f.read()
+
+def source_key(contents):
+    digest = hashlib.sha256(str(INGESTION_VERSION).encode())
+    for data in contents: digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+def sources_key(sources):
+    """Clé du contenu brut de fichiers sources (chemins ou objets fichiers) : celle des instantanés de load_network."""
+    return source_key([_read_source(source) for source in sources])
+
+def _snapshot_paths(cache_dir, key):
+    return [os.path.join(cache_dir, f"{key}.{table}.parquet") for table in TABLES]
+
+def _read_snapshot(cache_dir, key):
+    paths = _snapshot_paths(cache_dir, key)
+    if not all(os.path.exists(path) for path in paths): return None
+    try: return tuple(pd.read_parquet(path) for path in paths)
+    except (ImportError, OSError, ValueError): return None
+
+def _write_snapshot(cache_dir, key, frames):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for df, path in zip(frames, _snapshot_paths(cache_dir, key)):
+            # Nom temporaire unique : deux threads d'un même processus peuvent écrire le même instantané
+            with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=os.path.basename(path), suffix='.tmp', delete=False) as f: tmp_path = f.name
+            try: df.to_parquet(tmp_path); os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path): os.remove(tmp_path)
+                raise
+    except (ImportError, OSError):
+        pass  # Sans moteur Parquet ou sans droit d'écriture : pas d'instantané
+
+def load_network(relations_source, origins_source, destinations_source, cache_dir=None, strict=False):
+    """(relations_df, origins_df, destinations_df) nettoyés depuis des chemins ou objets fichiers CSV.
+
+    Avec `cache_dir`, les tables nettoyées sont conservées en Parquet sous une clé calculée sur le contenu brut
+    des trois fichiers : un nouveau chargement des mêmes fichiers ne relit pas les CSV. Avec `strict`, les
+    anomalies de validate_network (doublons, identifiants inconnus...) lèvent IngestionError.
+    """
+    contents = [_read_source(source) for source in (relations_source, origins_source, destinations_source)]
+    key = source_key(contents) if cache_dir is not None else None
+    if key is not None:
+        frames = _read_snapshot(cache_dir, key)
+    if key is None or frames is None:
+        frames = tuple(clean_table(pd.read_csv(BytesIO(data), dtype=str), table) for data, table in zip(contents, TABLES))
+        if key is not None: _write_snapshot(cache_dir, key, frames)
+    if strict: validate_network(*frames, strict=True)
+    return frames
@@ -0,0 +1,142 @@
+# Fichier : jobs_simulation.py
+# Simulations et optimisations exécutées en arrière-plan, avec progression et annulation.
+
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import combainaisonexceldescente as sim
+import dimensionnement_flotte
+import planificateur_flux
+import points_reprise
+
+JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_CANCELLED, JOB_FAILED = 'en_attente', 'en_cours', 'terminé', 'annulé', 'erreur'
+
+class SimulationJob:
+    """Travail en arrière-plan : état, progression (0 à 1), libellé de l'étape, résultat ou trace d'erreur."""
+    def __init__(self, job_id, label):
+        self.job_id = job_id; self.label = label
+        self.status = JOB_PENDING; self.progress = 0.0; self.stage = "En attente"
+        self.result = None; self.error = None; self.started_at = None; self.finished_at = None
+        self._cancel_requested = threading.Event()
+
+    def report(self, done, total, stage):
+        # Rappel de progression transmis au moteur ; lève SimulationCancelled si l'annulation a été demandée
+        if self._cancel_requested.is_set(): raise sim.SimulationCancelled()
+        self.progress = min(1.0, done / total) if total else 0.0; self.stage = stage
+
+    def cancel(self):
+        self._cancel_requested.set()
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+class JobManager:
+    """Pool de fils d'exécution partagé ; `submit(libellé, fonction, ...)` appelle `fonction(..., progress=job.report)`."""
+    def __init__(self, max_workers=2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='simulation')
+        self._jobs = {}; self._ids = itertools.count(1); self._lock = threading.Lock()
+
+    def submit(self, label, function, *args, **kwargs):
+        with self._lock: job = SimulationJob(next(self._ids), label); self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        if job._cancel_requested.is_set(): job.status = JOB_CANCELLED; return
+        job.status = JOB_RUNNING; job.started_at = time.time()
+        try:
+            job.result = function(*args, progress=job.report, **kwargs)
+            job.progress = 1.0; job.status = JOB_DONE
+        except sim.SimulationCancelled:
+            job.status = JOB_CANCELLED
+        except Exception:
+            job.error = traceback.format_exc(); job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def forget(self, job_id):
+        with self._lock: self._jobs.pop(job_id, None)
+
+# --- Travaux ---
+def with_upper_bound(results, relations_df, origins_df, destinations_df, num_wagons, progress=None):
+    # Copie des résultats avec la clé 'planner' du planificateur LP (borne supérieure du profit pour cette flotte)
+    plan = planificateur_flux.plan_network_flow(relations_df, origins_df, destinations_df, num_wagons, progress=progress)
+    return {**results, 'planner': {**plan['planner'], 'plan_profit': float(plan['profit'])}}
+
+def simulation_job(simulation_cache, heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, profiling=False,
+                   upper_bound=False, checkpoint_days=None, checkpoint_dir=None, progress=None):
+    # Avec `checkpoint_days`, la simulation est recalculée (hors cache) pour écrire ses points de reprise dans `checkpoint_dir`
+    if checkpoint_days:
+        results = points_reprise.simulate_with_checkpoints(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons,
+                                                           checkpoint_days, checkpoint_dir, profiling=profiling, progress=progress)
+    else:
+        results = simulation_cache.run_simulation(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, profiling=profiling, progress=progress)
+    return with_upper_bound(results, relations_df, origins_df, destinations_df, num_wagons, progress) if upper_bound else results
+
+def branch_job(checkpoint_path, relations_df, origins_df, destinations_df, base_results, extra_wagons=0, origin_load_caps=None, dest_unload_caps=None,
+               progress=None):
+    """Branche « et si » depuis un point de reprise de `base_results` (voir points_reprise.branch_from_checkpoint).
+
+    La clé 'branch' des résultats contient aussi le résumé de la simulation de base, et 'checkpoints' ceux de la
+    base : d'autres branches peuvent être lancées depuis les résultats affichés.
+    """
+    results = points_reprise.branch_from_checkpoint(checkpoint_path, relations_df, origins_df, destinations_df, extra_wagons=extra_wagons,
+                                                    origin_load_caps=origin_load_caps, dest_unload_caps=dest_unload_caps, progress=progress)
+    base = base_results.get('branch', {}).get('base') or {'profit': float(base_results['profit']), 'all_demand_met': bool(base_results['all_demand_met']),
+                                                          'days_taken_simulation_loop': base_results['days_taken_simulation_loop']}
+    results['branch']['base'] = base; results['checkpoints'] = base_results['checkpoints']
+    return results
+
+def fleet_sizing_job(simulation_cache, heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, max_wagons,
+                     start_wagons=None, n_workers=None, progress=None):
+    """Dimensionne la flotte (dimensionnement_flotte.size_fleet), puis simule complètement la flotte retenue.
+
+    Flotte retenue : la plus petite qui satisfait toute la demande, sinon la flotte de saturation, sinon `max_wagons`.
+    Les résultats contiennent en plus une clé 'fleet_sizing' (résultat de size_fleet et flotte retenue 'num_wagons').
+    """
+    sizing = dimensionnement_flotte.size_fleet(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, max_wagons=max_wagons,
+                                               start_wagons=start_wagons, n_workers=n_workers, cache=simulation_cache, progress=progress)
+    num_wagons = sizing['min_fleet_all_demand_met'] or min(sizing['saturation_fleet'] or max_wagons, max_wagons)
+    results = dict(simulation_cache.run_simulation(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, progress=progress))
+    results['fleet_sizing'] = {**sizing, 'num_wagons': num_wagons}
+    return results
+
+def planner_job(relations_df, origins_df, destinations_df, num_wagons, progress=None):
+    results = planificateur_flux.plan_network_flow(relations_df, origins_df, destinations_df, num_wagons, progress=progress)
+    results['planner']['plan_profit'] = float(results['profit'])
+    return results
+
+def optimization_job(simulation_cache, heuristic, relations_df, origins_df, destinations_df, qmin_order, phase2_order, num_wagons,
+                     max_iterations=5, n_workers=1, search=None, upper_bound=False, progress=None):
+    """Optimise les ordres QMIN / Phase 2 (listes d'identifiants), puis simule complètement le meilleur couple.
+
+    Sans `search`, montée complète par échanges (`max_iterations` itérations au plus) ; sinon recherche sous budget
+    (`search` = arguments de combainaisonexceldescente.budgeted_order_search : strategy, time_budget_s, ...).
+    Les résultats contiennent en plus une clé 'optimization' (ordres retenus et paramètres de la recherche), et
+    'planner' avec `upper_bound` (voir with_upper_bound).
+    """
+    qmin_start, phase2_start = (('custom_order', qmin_order), ('custom_order', phase2_order)) if heuristic == 'h1' else (qmin_order, phase2_order)
+    if search is not None:
+        found = sim.budgeted_order_search(heuristic, relations_df, origins_df, destinations_df, qmin_start, phase2_start, num_wagons,
+                                          n_workers=n_workers, cache=simulation_cache, progress=progress, **search)
+        qmin_config, phase2_config = found['qmin_config'], found['phase2_config']
+        optimization = {'method': search.get('strategy', 'first_improvement'), 'evaluations': found['evaluations'], 'stopped_by': found['stopped_by']}
+    elif heuristic == 'h1':
+        _, qmin_config, phase2_config = sim.hill_climbing_maximizer_h1(relations_df, origins_df, destinations_df, qmin_start, phase2_start,
+                                                                       num_wagons, max_iterations, n_workers, cache=simulation_cache, progress=progress)
+        optimization = {'method': 'hill_climbing', 'max_iterations': max_iterations}
+    else:
+        qmin_config, phase2_config = sim.hill_climbing_maximizer_h2(relations_df, origins_df, destinations_df, qmin_start, phase2_start,
+                                                                    num_wagons, max_iterations, n_workers, cache=simulation_cache, progress=progress)
+        optimization = {'method': 'hill_climbing', 'max_iterations': max_iterations}
+    results = dict(simulation_cache.run_simulation(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, progress=progress))
+    optimization['qmin_order'] = sim.custom_order_of(heuristic, qmin_config); optimization['phase2_order'] = sim.custom_order_of(heuristic, phase2_config)
+    results['optimization'] = optimization
+    return with_upper_bound(results, relations_df, origins_df, destinations_df, num_wagons, progress) if upper_bound else results
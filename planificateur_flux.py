@@ -0,0 +1,181 @@
+# Fichier : planificateur_flux.py
+# Planification par programme linéaire sur le réseau développé dans le temps (relations x jours) : solveur
+# primal-dual écrit en NumPy, borne supérieure du profit et plan d'expéditions rejoué au format des simulations.
+
+import time
+
+import numpy as np
+
+import combainaisonexceldescente as sim
+
+DEFAULT_MAX_ITERATIONS = 3000
+DEFAULT_TOLERANCE = 1e-3
+CHECK_EVERY = 100  # Itérations entre deux contrôles (borne, écart, redémarrage)
+INITIAL_PRIMAL_WEIGHT = 0.03
+
+class FlowPlanningProblem:
+    """Programme linéaire : max Σ distance_r · x[r, t], 0 ≤ x ≤ u, x[r, t] = tonnes expédiées sur la relation r le jour t + 1.
+
+    Contraintes (une ligne par origine, destination, jour) :
+    - stock initial de chaque origine et demande annuelle de chaque destination sur l'horizon ;
+    - capacités journalières de chargement et de déchargement, comptées le jour d'expédition comme dans process_shipment ;
+    - wagons : Σ x / WAGON_CAPACITY_TONS des expéditions dont l'aller-retour (2 · ceil(distance / KM_PER_DAY_FOR_WAGON_RETURN)
+      jours) couvre le jour t ≤ nombre de wagons ;
+    - QMIN : les relations non rentables ne servent qu'au QMIN, leur total vers une destination ≤ 20 % de sa demande.
+    C'est une relaxation des simulations H1 / H2 (wagons fractionnaires, pas de minimum par expédition ni d'ordre de
+    priorité) : son optimum majore leur profit. A x et Aᵀ y sont calculés par blocs (sommes par origine et par
+    destination, fenêtres glissantes pour les wagons), sans matrice explicite.
+    """
+    def __init__(self, relations_df, origins_df, destinations_df, num_wagons, horizon_days=sim.MAX_SIMULATION_DAYS, relation_index=None):
+        state = sim.SimulationState(origins_df, destinations_df, num_wagons)
+        index = sim.RelationIndex.for_state(relation_index, relations_df, state)
+        # Relations sans distance : aucun profit, elles ne feraient que consommer des capacités
+        kept = (index.rel_origin >= 0) & (index.rel_dest >= 0) & (index.rel_distance_km > 0)
+        self.origin = index.rel_origin[kept]; self.dest = index.rel_dest[kept]
+        self.distance_km = index.rel_distance_km[kept]; self.profitable = index.rel_profitable[kept]
+        self.n_orig = len(state.origin_ids); self.n_dest = len(state.dest_ids); self.horizon = horizon_days; self.num_wagons = num_wagons
+        self.round_trip_days = 2 * np.maximum(1, np.ceil(self.distance_km / sim.KM_PER_DAY_FOR_WAGON_RETURN)).astype(np.intp)
+        self.upper = np.minimum.reduce([state.orig_load_cap[self.origin], state.dest_unload_cap[self.dest], state.orig_stock[self.origin],
+                                        state.dest_annual_demand[self.dest], np.full(len(self.origin), num_wagons * float(sim.WAGON_CAPACITY_TONS)),
+                                        np.where(self.profitable, np.inf, state.dest_qmin_target[self.dest])])
+        self.qmin_rows = np.flatnonzero(~self.profitable)
+        self._origin_order, self._origin_present, self._origin_starts = self._groups(self.origin)
+        self._dest_order, self._dest_present, self._dest_starts = self._groups(self.dest)
+        self.windows, self._window_group = np.unique(self.round_trip_days, return_inverse=True)
+        self._window_rows = [np.flatnonzero(self._window_group == k) for k in range(len(self.windows))]
+        T = horizon_days
+        self.rhs = [state.orig_stock, state.dest_annual_demand, np.broadcast_to(state.orig_load_cap[:, None], (self.n_orig, T)),
+                    np.broadcast_to(state.dest_unload_cap[:, None], (self.n_dest, T)), np.full(T, float(num_wagons)), state.dest_qmin_target]
+        self.cost = np.broadcast_to(self.distance_km[:, None], (len(self.origin), T))
+
+    @staticmethod
+    def _groups(keys):
+        order = np.argsort(keys, kind='stable'); present, starts = np.unique(keys[order], return_index=True)
+        return order, present, starts
+
+    def _sum_by(self, x, order, present, starts, n):
+        out = np.zeros((n, x.shape[1]))
+        if len(order): out[present] = np.add.reduceat(x[order], starts, axis=0)
+        return out
+
+    def _wagons_in_use(self, x):
+        in_use = np.zeros(self.horizon)
+        for window, rows in zip(self.windows, self._window_rows):
+            cumulative = np.cumsum(x[rows].sum(axis=0)); shifted = np.zeros(self.horizon); shifted[window:] = cumulative[:self.horizon - window]
+            in_use += cumulative - shifted
+        return in_use / sim.WAGON_CAPACITY_TONS
+
+    def _wagons_adjoint(self, y):
+        # Pour (r, s) : Σ y[t] sur t = s .. s + aller-retour - 1, par somme cumulée inverse
+        suffix = np.concatenate([np.cumsum(y[::-1])[::-1], [0.0]]); days = np.arange(self.horizon)
+        by_window = np.array([suffix[:self.horizon] - suffix[np.minimum(days + window, self.horizon)] for window in self.windows])
+        return by_window[self._window_group] / sim.WAGON_CAPACITY_TONS
+
+    def apply(self, x):
+        """A x, dans l'ordre de `rhs` : stocks, demandes, chargement (origine x jour), déchargement, wagons (jour), QMIN."""
+        loaded = self._sum_by(x, self._origin_order, self._origin_present, self._origin_starts, self.n_orig)
+        unloaded = self._sum_by(x, self._dest_order, self._dest_present, self._dest_starts, self.n_dest)
+        qmin = np.bincount(self.dest[self.qmin_rows], x[self.qmin_rows].sum(axis=1), minlength=self.n_dest)
+        return [loaded.sum(axis=1), unloaded.sum(axis=1), loaded, unloaded, self._wagons_in_use(x), qmin]
+
+    def apply_adjoint(self, y):
+        y_stock, y_demand, y_load, y_unload, y_wagons, y_qmin = y
+        out = (y_stock[self.origin] + y_demand[self.dest])[:, None] + y_load[self.origin] + y_unload[self.dest] + self._wagons_adjoint(y_wagons)
+        out[self.qmin_rows] += y_qmin[self.dest[self.qmin_rows]][:, None]
+        return out
+
+    def dual_bound(self, y):
+        # Pour tout y ≥ 0 : c·x ≤ b·y + Σ u · max(0, c - Aᵀy) pour tout x admissible (borne valable à chaque itération)
+        reduced_cost = self.cost - self.apply_adjoint(y)
+        return float(sum((b * y_block).sum() for b, y_block in zip(self.rhs, y)) + (np.maximum(reduced_cost, 0) * self.upper[:, None]).sum())
+
+    def objective(self, x):
+        return float((self.cost * x).sum())
+
+    def max_violation(self, x):
+        # Plus grand dépassement relatif d'une contrainte
+        return max((float(np.max(np.maximum(ax - b, 0) / np.maximum(b, 1.0))) if ax.size else 0.0) for ax, b in zip(self.apply(x), self.rhs))
+
+def solve_flow_lp(problem, max_iterations=DEFAULT_MAX_ITERATIONS, tolerance=DEFAULT_TOLERANCE, time_budget_s=None, progress=None):
+    """Résout `problem` par la méthode primal-dual de Chambolle-Pock (PDHG) préconditionnée en diagonale.
+
+    Redémarrages sur la moyenne des itérés et poids primal adaptatif (comme PDLP) tous les CHECK_EVERY pas ; arrêt
+    quand l'écart relatif entre la meilleure borne et le profit de l'itéré courant, et son dépassement relatif des
+    contraintes, sont sous `tolerance`, ou au budget d'itérations / de temps. Renvoie un dictionnaire : 'x',
+    'upper_bound' (borne valable même sans convergence), 'lp_profit', 'max_violation', 'converged' (False si le
+    budget est atteint avant ces deux critères : 'lp_profit' n'est alors pas l'optimum), 'iterations', 'seconds'.
+    """
+    t0 = time.perf_counter()
+    x = np.zeros_like(problem.cost); y = [np.zeros(np.shape(b)) for b in problem.rhs]
+    if x.size == 0: return {'x': x, 'upper_bound': 0.0, 'lp_profit': 0.0, 'max_violation': 0.0, 'converged': True, 'iterations': 0, 'seconds': 0.0}
+    # Pas de Pock-Chambolle (α = 1) : 1 / somme des coefficients de chaque colonne et de chaque ligne
+    tau = 1.0 / problem.apply_adjoint([np.ones(np.shape(b)) for b in problem.rhs])
+    sigma = [1.0 / np.maximum(row_sum, 1e-12) for row_sum in problem.apply(np.ones_like(x))]
+    primal_weight = INITIAL_PRIMAL_WEIGHT; best_bound = np.inf; iteration = 0; lp_profit = violation = 0.0; converged = False
+    x_sum = np.zeros_like(x); y_sum = [np.zeros_like(b) for b in y]; x_restart = x.copy(); y_restart = [b.copy() for b in y]
+    while iteration < max_iterations:
+        steps = min(CHECK_EVERY, max_iterations - iteration)
+        for _ in range(steps):
+            x_next = np.clip(x + primal_weight * tau * (problem.cost - problem.apply_adjoint(y)), 0.0, problem.upper[:, None])
+            ax = problem.apply(2 * x_next - x)
+            y = [np.maximum(0.0, y_block + s / primal_weight * (ax_block - b)) for y_block, s, ax_block, b in zip(y, sigma, ax, problem.rhs)]
+            x = x_next; x_sum += x
+            for total, y_block in zip(y_sum, y): total += y_block
+            iteration += 1
+        x_average = x_sum / steps; y_average = [total / steps for total in y_sum]
+        current_bound, average_bound = problem.dual_bound(y), problem.dual_bound(y_average)
+        if average_bound < current_bound: x, y = x_average, y_average
+        best_bound = min(best_bound, current_bound, average_bound)
+        # Poids primal : moyenne géométrique avec le rapport des déplacements primal / dual depuis le dernier redémarrage
+        dx = np.sqrt((((x - x_restart) ** 2) / tau).sum()); dy = np.sqrt(sum((((b - b0) ** 2) / s).sum() for b, b0, s in zip(y, y_restart, sigma)))
+        if dx > 0 and dy > 0: primal_weight = float(np.sqrt(primal_weight * dx / dy))
+        x_restart = x.copy(); y_restart = [b.copy() for b in y]; x_sum[:] = 0; y_sum = [np.zeros_like(b) for b in y]
+        lp_profit = problem.objective(x); violation = problem.max_violation(x)
+        converged = best_bound - lp_profit <= tolerance * max(abs(best_bound), 1.0) and violation <= tolerance
+        if progress is not None: progress(iteration, max_iterations, f"Programme linéaire — borne {best_bound:,.0f}".replace(',', ' '))
+        if converged: break
+        if time_budget_s is not None and time.perf_counter() - t0 >= time_budget_s: break
+    return {'x': x, 'upper_bound': best_bound, 'lp_profit': lp_profit, 'max_violation': violation, 'converged': bool(converged),
+            'iterations': iteration, 'seconds': time.perf_counter() - t0}
+
+def replay_plan(problem, x, relations_df, origins_df, destinations_df, num_wagons, catch_up=True):
+    """Plan réalisable tiré de la solution `x` : chaque jour, les quantités du programme linéaire (arrondies au wagon)
+    sont expédiées par process_shipment, relations les plus longues d'abord ; stocks, capacités, wagons entiers et
+    minimum par expédition sont donc respectés. Avec `catch_up`, chaque relation expédie son cumul prévu jusqu'au jour
+    moins ce qu'elle a déjà expédié : les petites quantités étalées par le programme linéaire sont regroupées.
+    Renvoie les résultats au format de build_simulation_results.
+    """
+    state = sim.SimulationState(origins_df, destinations_df, num_wagons)
+    by_distance = np.argsort(-problem.distance_km, kind='stable'); day_t = 0
+    planned = np.cumsum(x, axis=1) if catch_up else x; shipped_by_relation = np.zeros(len(problem.origin))
+    for t in range(problem.horizon):
+        day_t = t + 1
+        returned_wagons = state.fleet.release(day_t); wagons_available_at_start = state.fleet.available
+        if day_t > 1: state.reset_daily_capacities()
+        wagons_sent = 0; quantities = planned[:, t] - shipped_by_relation if catch_up else planned[:, t]
+        for r in by_distance[quantities[by_distance] >= sim.MIN_SHIPMENT_FOR_ONE_WAGON_TONS]:
+            qty = max(round(quantities[r] / sim.WAGON_CAPACITY_TONS), 1) * sim.WAGON_CAPACITY_TONS; o = problem.origin[r]; d = problem.dest[r]
+            qmin_needed = state.qmin_needed(d)
+            if not problem.profitable[r]: qty = min(qty, qmin_needed)
+            shipped, wagons_used = sim.process_shipment(day_t, o, d, problem.distance_km[r], qty, state, "[PLAN_QMIN]" if qmin_needed > sim.EPSILON else "[PLAN]")
+            if shipped > sim.EPSILON:
+                wagons_sent += wagons_used; shipped_by_relation[r] += shipped; state.dest_qmin_delivered[d] += min(shipped, max(qmin_needed, 0.0))
+        sim.log_wagon_day(state, day_t, wagons_available_at_start, returned_wagons, wagons_sent)
+        if state.all_demand_met(): break
+    return sim.build_simulation_results(relations_df, state, bool(state.all_demand_met()), day_t)
+
+def plan_network_flow(relations_df, origins_df, destinations_df, num_wagons=500, max_iterations=DEFAULT_MAX_ITERATIONS,
+                      tolerance=DEFAULT_TOLERANCE, time_budget_s=None, relation_index=None, progress=None):
+    """Plan d'expéditions et borne supérieure du profit en une résolution du programme linéaire (FlowPlanningProblem).
+
+    Résultats au format de run_simulation_h1 / h2, avec une clé 'planner' : 'upper_bound' (majore le profit de
+    toute simulation H1 / H2 avec cette flotte), 'lp_profit', 'max_violation', 'converged', 'iterations', 'seconds'.
+    """
+    problem = FlowPlanningProblem(relations_df, origins_df, destinations_df, num_wagons, relation_index=relation_index)
+    solution = solve_flow_lp(problem, max_iterations, tolerance, time_budget_s, progress)
+    if progress is not None: progress(max_iterations, max_iterations, "Plan d'expéditions")
+    # Deux lectures de la solution (jour par jour, ou cumuls rattrapés) ; le plan le plus profitable est retenu
+    results = max((replay_plan(problem, solution['x'], relations_df, origins_df, destinations_df, num_wagons, catch_up) for catch_up in (False, True)),
+                  key=lambda plan: plan['profit'])
+    results['planner'] = {key: value for key, value in solution.items() if key != 'x'}
+    return results
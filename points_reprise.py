@@ -0,0 +1,108 @@
+# Fichier : points_reprise.py
+# Points de reprise des simulations enregistrés sur disque et branches « et si » : reprise au début d'un jour k
+# avec des paramètres modifiés (wagons, capacités journalières), sans resimuler les jours 1 à k - 1.
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import cache_simulation
+import combainaisonexceldescente as sim
+
+CHECKPOINT_FORMAT = 1
+
+def checkpoint_path(checkpoint_dir, run_key, day):
+    return os.path.join(checkpoint_dir, f"{run_key[:20]}_jour{day:03d}.npz")
+
+def save_checkpoint(path, checkpoint, meta):
+    """Écrit un point de reprise du moteur (SimulationEngine.snapshot) dans un fichier .npz compressé.
+
+    Le fichier contient les tableaux de l'état (stocks, demandes, progression QMIN, capacités), les wagons
+    disponibles, en transit et leur calendrier de retour, ainsi que les journaux des expéditions et des wagons
+    jusqu'à ce jour ; `meta` (empreinte des données, heuristique, ordres, flotte) est enregistré en JSON.
+    """
+    snapshot = checkpoint['state']
+    shipments_log, length = snapshot['logs']['shipments_log']; columns, type_names = shipments_log[:length].to_arrays()
+    wagon_log, wagon_length = snapshot['logs']['daily_wagon_log']
+    available, in_transit, returns_by_day = snapshot['fleet']
+    header = {**meta, 'format': CHECKPOINT_FORMAT, 'day_t': int(checkpoint['day_t']), 'finished': bool(checkpoint['finished']),
+              'all_demand_met': bool(checkpoint['all_demand_met']), 'wagons_available': int(available), 'wagons_in_transit': int(in_transit),
+              'type_names': type_names}
+    arrays = {f"state_{name}": values for name, values in snapshot['arrays'].items()}
+    arrays.update({f"shipments_{name}": values for name, values in columns.items()})
+    arrays['wagon_log'] = np.array([[row[field] for field in sim.WAGON_LOG_FIELDS] for row in wagon_log[:wagon_length]], dtype=np.int64).reshape(-1, len(sim.WAGON_LOG_FIELDS))
+    arrays['wagon_returns'] = np.array(sorted(returns_by_day.items()), dtype=np.int64).reshape(-1, 2)
+    # Nom temporaire unique dans le dossier du fichier : deux travaux peuvent enregistrer le même point de reprise
+    directory = os.path.dirname(path) or '.'; os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path), suffix='.tmp', delete=False) as f:
+        try: np.savez_compressed(f, header=np.array(json.dumps(header, default=str)), **arrays)
+        except BaseException: f.close(); os.remove(f.name); raise
+    os.replace(f.name, path)
+    return path
+
+def load_checkpoint(path, origins_df, destinations_df):
+    """Relit un point de reprise ; renvoie (point de reprise pour SimulationEngine.restore, métadonnées)."""
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(str(data['header']))
+        if header.get('format') != CHECKPOINT_FORMAT: raise ValueError(f"Format de point de reprise non pris en charge : {path}")
+        arrays = {name[len('state_'):]: data[name] for name in data.files if name.startswith('state_')}
+        columns = {name[len('shipments_'):]: data[name] for name in data.files if name.startswith('shipments_')}
+        wagon_rows = data['wagon_log'].tolist(); returns = data['wagon_returns'].tolist()
+    shipments_log = sim.ShipmentRecorder.from_arrays(origins_df.index.tolist(), destinations_df.index.tolist(), columns, header['type_names'])
+    wagon_log = [dict(zip(sim.WAGON_LOG_FIELDS, row)) for row in wagon_rows]
+    fleet = (header['wagons_available'], header['wagons_in_transit'], {return_day: num_wagons for return_day, num_wagons in returns})
+    checkpoint = {'day_t': header['day_t'], 'finished': header['finished'], 'all_demand_met': header['all_demand_met'],
+                  'state': {'arrays': arrays, 'fleet': fleet, 'logs': {'shipments_log': (shipments_log, len(shipments_log)), 'daily_wagon_log': (wagon_log, len(wagon_log))}}}
+    return checkpoint, header
+
+def simulate_with_checkpoints(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons, checkpoint_days,
+                              checkpoint_dir, profiling=False, progress=None):
+    """Simulation complète qui enregistre un point de reprise au début de chacun des `checkpoint_days`.
+
+    Mêmes conventions et mêmes résultats que run_simulation_h1 / run_simulation_h2, avec en plus 'checkpoints' :
+    {jour: chemin du fichier} (les jours atteints avant la fin de la simulation).
+    """
+    engine = sim.SimulationEngine(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, num_wagons,
+                                  profiling=profiling, progress=progress, checkpoint_days=checkpoint_days).run()
+    results = engine.results(relations_df)
+    dataset_key = cache_simulation.dataset_fingerprint(relations_df, origins_df, destinations_df)
+    run_key = cache_simulation.configuration_key(dataset_key, heuristic, qmin_config, phase2_config, num_wagons)
+    meta = {'dataset_key': dataset_key, 'heuristic': heuristic, 'qmin_config': qmin_config, 'phase2_config': phase2_config, 'num_wagons': int(num_wagons)}
+    results['checkpoints'] = {day: save_checkpoint(checkpoint_path(checkpoint_dir, run_key, day), checkpoint, meta) for day, checkpoint in sorted(engine.checkpoints.items())}
+    return results
+
+def _set_capacities(changes, slots, capacities, remaining, label):
+    for item_id, capacity in (changes or {}).items():
+        if item_id not in slots: raise ValueError(f"{label} inconnue : {item_id}")
+        if not capacity >= 0: raise ValueError(f"Capacité invalide pour {item_id} : {capacity}")
+        slot = slots[item_id]; capacities[slot] = capacity; remaining[slot] = min(remaining[slot], capacity)
+
+def branch_from_checkpoint(path, relations_df, origins_df, destinations_df, heuristic=None, qmin_config=None, phase2_config=None,
+                           extra_wagons=0, origin_load_caps=None, dest_unload_caps=None, progress=None):
+    """Reprend la simulation au début du jour enregistré dans `path`, avec des paramètres modifiés à partir de ce jour.
+
+    Sans `heuristic`, l'heuristique et les ordres de la simulation d'origine sont conservés. `extra_wagons` ajoute des
+    wagons disponibles (en retire s'il est négatif) ; `origin_load_caps` / `dest_unload_caps` ({identifiant: tonnes par
+    jour}) remplacent des capacités journalières de chargement / déchargement. Seuls les jours restants sont simulés.
+    Les résultats contiennent en plus 'branch' (jour de reprise, modifications, jours simulés). Lève ValueError si
+    les données ne sont pas celles de la simulation d'origine ou si une modification est impossible.
+    """
+    checkpoint, header = load_checkpoint(path, origins_df, destinations_df)
+    if header['dataset_key'] != cache_simulation.dataset_fingerprint(relations_df, origins_df, destinations_df):
+        raise ValueError("Le point de reprise a été enregistré avec d'autres données.")
+    if heuristic is None:
+        heuristic, qmin_config, phase2_config = header['heuristic'], header['qmin_config'], header['phase2_config']
+        if heuristic == 'h1': qmin_config, phase2_config = [tuple(config) if config is not None else None for config in (qmin_config, phase2_config)]
+    engine = sim.SimulationEngine(heuristic, relations_df, origins_df, destinations_df, qmin_config, phase2_config, header['num_wagons'], progress=progress).restore(checkpoint)
+    state = engine.state; from_day = header['day_t'] + 1
+    if state.fleet.available + extra_wagons < 0:
+        raise ValueError(f"Impossible de retirer {-extra_wagons} wagons : {state.fleet.available} disponibles au début du jour {from_day}.")
+    state.fleet.available += extra_wagons
+    _set_capacities(origin_load_caps, state.origin_slot, state.orig_load_cap, state.orig_load_remaining, "Origine")
+    _set_capacities(dest_unload_caps, state.dest_slot, state.dest_unload_cap, state.dest_unload_remaining, "Destination")
+    results = engine.run().results(relations_df)
+    results['branch'] = {'from_day': from_day, 'heuristic': heuristic, 'extra_wagons': int(extra_wagons), 'origin_load_caps': dict(origin_load_caps or {}),
+                         'dest_unload_caps': dict(dest_unload_caps or {}), 'days_simulated': engine.days_simulated}
+    return results
@@ -0,0 +1,8 @@
+# Fichier : tests/conftest.py
+# Les modules du simulateur sont à la racine du dépôt : les tests les importent directement.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,39 @@
+# Fichier : tests/outils.py
+# Réseaux de test tirés de generateur_reseau et comparaison de deux résultats de simulation.
+
+import pandas as pd
+
+import generateur_reseau
+
+# (origines, destinations, densité, graine) : le second réseau a des destinations à plus de
+# VECTORIZED_SELECTION_MIN_DEGREE origines rentables (sélection H2 vectorisée)
+NETWORKS = {'petit': (5, 10, 0.7, 25), 'dense': (20, 4, 1.0, 2)}
+
+def make_network(n_origins, n_destinations, density, seed):
+    """Réseau généré réduit pour que la demande soit satisfaite en quelques dizaines de jours.
+
+    Un tiers des origines ont le même stock, un tiers des destinations la même demande et les distances sont
+    arrondies à 300 km (dont des relations à 0 km) : les heuristiques doivent départager des égalités. Une
+    relation depuis une origine inconnue et une vers une destination inconnue sont ajoutées.
+    """
+    relations_df, origins_df, destinations_df = generateur_reseau.generate_network(n_origins, n_destinations, density, seed=seed)
+    origins_df = origins_df.set_index('id'); destinations_df = destinations_df.set_index('id')
+    destinations_df['annual_demand_tons'] = (destinations_df['annual_demand_tons'] / 20).round(-2) + 100
+    destinations_df['daily_unloading_capacity_tons'] *= 4
+    origins_df['initial_available_product_tons'] = (origins_df['initial_available_product_tons'] / 20).round(-2) + 100
+    origins_df.iloc[:n_origins // 3, origins_df.columns.get_loc('initial_available_product_tons')] = origins_df['initial_available_product_tons'].iloc[0]
+    destinations_df.iloc[:n_destinations // 3, destinations_df.columns.get_loc('annual_demand_tons')] = destinations_df['annual_demand_tons'].iloc[-1]
+    relations_df['distance_km'] = (relations_df['distance_km'] // 300) * 300
+    unknown = pd.DataFrame({'origin': ['OX', origins_df.index[0]], 'destination': [destinations_df.index[0], 'DX'],
+                            'distance_km': [300.0, 300.0], 'profitability': [1, 1]})
+    relations_df = pd.concat([relations_df, unknown], ignore_index=True)
+    return relations_df, origins_df, destinations_df
+
+def assert_same_results(expected, actual):
+    # Mêmes expéditions, tables finales, journal des wagons, profit et fin de simulation
+    assert actual['profit'] == expected['profit']
+    assert (actual['all_demand_met'], actual['days_taken_simulation_loop']) == (expected['all_demand_met'], expected['days_taken_simulation_loop'])
+    pd.testing.assert_frame_equal(actual['shipments_df'].reset_index(drop=True), expected['shipments_df'].reset_index(drop=True), check_dtype=False, check_categorical=False)
+    pd.testing.assert_frame_equal(actual['final_origins_df'], expected['final_origins_df'], check_dtype=False)
+    pd.testing.assert_frame_equal(actual['final_destinations_df'], expected['final_destinations_df'], check_dtype=False)
+    pd.testing.assert_frame_equal(pd.DataFrame(actual['final_tracking_vars']['daily_wagon_log']), pd.DataFrame(expected['final_tracking_vars']['daily_wagon_log']), check_dtype=False)
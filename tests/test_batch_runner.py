@@ -0,0 +1,61 @@
+# Fichier : tests/test_batch_runner.py
+# Reprise d'un lot : seuls les scénarios dont la définition ou les fichiers d'entrée ont changé sont relancés.
+
+import json
+import os
+
+import pytest
+
+import batch_runner
+from outils import NETWORKS, make_network
+
+@pytest.fixture
+def manifest(tmp_path):
+    relations_df, origins_df, destinations_df = make_network(*NETWORKS['petit'])
+    datasets = {}
+    for name in ('reseau_a', 'reseau_b'):
+        os.makedirs(tmp_path / name)
+        relations_df.to_csv(tmp_path / name / 'relations.csv', index=False)
+        origins_df.to_csv(tmp_path / name / 'origines.csv', index_label='id'); destinations_df.to_csv(tmp_path / name / 'destinations.csv', index_label='id')
+        datasets[name] = {'relations': f"{name}/relations.csv", 'origins': f"{name}/origines.csv", 'destinations': f"{name}/destinations.csv"}
+    manifest = {'datasets': datasets, 'defaults': {'dataset': 'reseau_a', 'num_wagons': 30},
+                'scenarios': [{'id': 'h1_demande', 'qmin': ['annual_demand_tons', False]},
+                              {'id': 'h2_ordre', 'heuristic': 'h2', 'qmin': ['D0003', 'D0001'], 'phase2': ['annual_demand_tons', False]},
+                              {'id': 'h1_autre_reseau', 'dataset': 'reseau_b'}]}
+    return tmp_path, manifest
+
+def _run(tmp_path, manifest, monkeypatch):
+    # Identifiants des scénarios réellement exécutés
+    path = tmp_path / 'manifeste.json'; path.write_text(json.dumps(manifest), encoding='utf-8'); executed = []
+    run_scenario = batch_runner.run_scenario
+    monkeypatch.setattr(batch_runner, 'run_scenario', lambda scenario, *args: executed.append(scenario['id']) or run_scenario(scenario, *args))
+    table = batch_runner.run_batch(str(path), str(tmp_path / 'sortie'))
+    return executed, table
+
+def test_resume_reruns_only_changed_scenarios(manifest, monkeypatch):
+    tmp_path, manifest = manifest
+    executed, table = _run(tmp_path, manifest, monkeypatch)
+    assert executed == ['h1_demande', 'h2_ordre', 'h1_autre_reseau'] and table['id'].tolist() == executed
+    assert _run(tmp_path, manifest, monkeypatch)[0] == []
+    manifest['scenarios'][1]['num_wagons'] = 3
+    executed, table = _run(tmp_path, manifest, monkeypatch)
+    assert executed == ['h2_ordre'] and table.set_index('id').loc['h2_ordre', 'num_wagons'] == 3
+    destinations_path = tmp_path / 'reseau_b' / 'destinations.csv'
+    destinations = bytearray(destinations_path.read_bytes()); last_digit = max(k for k, byte in enumerate(destinations) if chr(byte).isdigit())
+    destinations[last_digit] = ord('1') if destinations[last_digit] != ord('1') else ord('2'); destinations_path.write_bytes(bytes(destinations))  # Un seul octet modifié
+    profit = table.set_index('id').loc['h1_autre_reseau', 'profit']
+    executed, table = _run(tmp_path, manifest, monkeypatch)
+    assert executed == ['h1_autre_reseau'] and len(table) == 3 and table.set_index('id').loc['h1_autre_reseau', 'profit'] != profit
+    assert _run(tmp_path, manifest, monkeypatch)[0] == []
+
+def test_failed_scenario_writes_error_until_it_succeeds(manifest, monkeypatch):
+    tmp_path, manifest = manifest
+    manifest['scenarios'][0]['optimize'] = {'strategy': 'inconnue', 'max_evaluations': 5}
+    executed, table = _run(tmp_path, manifest, monkeypatch)
+    error_path = tmp_path / 'sortie' / 'scenarios' / 'h1_demande' / 'error.json'
+    assert executed == ['h1_demande', 'h2_ordre', 'h1_autre_reseau'] and table['id'].tolist() == ['h2_ordre', 'h1_autre_reseau']
+    assert json.loads(error_path.read_text(encoding='utf-8'))['id'] == 'h1_demande'
+    assert _run(tmp_path, manifest, monkeypatch)[0] == ['h1_demande'] and error_path.exists()
+    manifest['scenarios'][0]['optimize'] = False
+    executed, table = _run(tmp_path, manifest, monkeypatch)
+    assert executed == ['h1_demande'] and len(table) == 3 and not error_path.exists()
@@ -0,0 +1,52 @@
+# Fichier : tests/test_cache_simulation.py
+# Cache des résultats : écritures concurrentes sur le disque et taille suivie.
+
+import os
+import threading
+
+import cache_simulation
+from outils import NETWORKS, make_network
+
+def _disk_size(cache_dir):
+    return sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+
+def test_concurrent_writes_of_same_keys(tmp_path):
+    cache = cache_simulation.SimulationCache(cache_dir=str(tmp_path))
+    value = {'profit': 1.0, 'all_demand_met': True, 'days_taken_simulation_loop': 3, 'payload': 'x' * 10_000}
+
+    def write(k):
+        for n in range(40): cache.put_results(f"cle{(k + n) % 4}", value)
+    threads = [threading.Thread(target=write, args=(k,)) for k in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert sorted(os.listdir(tmp_path)) == sorted(f"cle{k}{suffix}" for k in range(4) for suffix in ('.json', '.pkl'))
+    assert cache._disk_bytes == _disk_size(str(tmp_path))
+    assert cache_simulation.SimulationCache(cache_dir=str(tmp_path)).get_results('cle0') == value
+
+def test_cached_run_matches_fresh_run(tmp_path):
+    relations_df, origins_df, destinations_df = make_network(*NETWORKS['petit'])
+    cache = cache_simulation.SimulationCache(cache_dir=str(tmp_path))
+    first = cache.run_simulation('h2', relations_df, origins_df, destinations_df, None, None, 30)
+    reloaded = cache_simulation.SimulationCache(cache_dir=str(tmp_path)).run_simulation('h2', relations_df, origins_df, destinations_df, None, None, 30)
+    assert reloaded['profit'] == first['profit'] and reloaded['shipments_df'].equals(first['shipments_df'])
+    assert cache.hits == 0 and cache._disk_bytes == _disk_size(str(tmp_path))
+
+def test_returned_results_are_copies(tmp_path):
+    network = make_network(*NETWORKS['petit'])
+    for cache in (cache_simulation.SimulationCache(), cache_simulation.SimulationCache(cache_dir=str(tmp_path))):
+        first = cache.run_simulation('h1', *network, None, None, 30); expected = first['shipments_df'].copy()
+        first['shipments_df']['quantity_tons'] *= 2; first['profit'] = -1.0
+        cached = cache.run_simulation('h1', *network, None, None, 30)
+        cached['shipments_df'].drop(cached['shipments_df'].index, inplace=True); cached['final_tracking_vars']['daily_wagon_log'].clear()
+        again = cache.run_simulation('h1', *network, None, None, 30)
+        assert cache.hits == 2 and again['profit'] > 0 and again['final_tracking_vars']['daily_wagon_log']
+        assert again['shipments_df'].equals(expected)
+
+def test_profiling_and_lean_runs_have_own_entries(tmp_path):
+    network = make_network(*NETWORKS['petit']); cache = cache_simulation.SimulationCache(cache_dir=str(tmp_path))
+    keys = {(profiling, lean): cache.key('jeu', 'h2', None, None, 30, profiling, lean) for profiling in (False, True) for lean in (False, True)}
+    assert len(set(keys.values())) == 4 and keys[(False, False)] == cache.key('jeu', 'h2', None, None, 30)
+    profiled = cache.run_simulation('h2', *network, None, None, 30, profiling=True)
+    plain = cache.run_simulation('h2', *network, None, None, 30)
+    assert 'profiling' in profiled and 'profiling' not in plain and cache.hits == 0
+    assert 'profiling' not in cache.run_simulation('h2', *network, None, None, 30) and cache.hits == 1
@@ -0,0 +1,45 @@
+# Fichier : tests/test_calcul_distribue.py
+# Coordinateur : résultats identiques au calcul local, erreur claire sans processus de calcul.
+
+import os
+import time
+
+import pytest
+
+import calcul_distribue
+import dimensionnement_flotte
+from outils import NETWORKS, make_network
+
+@pytest.fixture(scope='module')
+def network():
+    return make_network(*NETWORKS['petit'])
+
+def test_map_without_worker_fails_after_wait(network):
+    with calcul_distribue.Coordinator(b"cle-test", worker_wait_s=0.2) as coordinator:
+        dataset_key = coordinator.register_dataset(*network)
+        with pytest.raises(TimeoutError, match="Aucun processus de calcul"): coordinator.map('evaluate_fleet', dataset_key, [('h1', None, None, 30)])
+
+def test_remote_evaluations_match_local(network, tmp_path):
+    with calcul_distribue.Coordinator(b"cle-test") as coordinator:
+        calcul_distribue.start_local_workers(coordinator.address, b"cle-test", 2, str(tmp_path))
+        dataset_key = coordinator.register_dataset(*network)
+        tasks = [(heuristic, None, None, num_wagons) for heuristic in ('h1', 'h2') for num_wagons in (3, 30, 300)]
+        remote = list(coordinator.map('evaluate_fleet', dataset_key, tasks, timeout=120))
+    assert remote == [dimensionnement_flotte.evaluate_fleet(heuristic, *network, qmin, phase2, num_wagons) for heuristic, qmin, phase2, num_wagons in tasks]
+
+@pytest.mark.parametrize('worker_rejoins', [False, True])
+def test_tasks_of_lost_last_worker_wait_for_a_new_one(network, tmp_path, worker_rejoins):
+    tasks = [('h1', None, None, num_wagons) for num_wagons in range(1, 100)]
+    with calcul_distribue.Coordinator(b"cle-test", worker_wait_s=30.0 if worker_rejoins else 1.0) as coordinator:
+        dataset_key = coordinator.register_dataset(*network)
+        worker, = calcul_distribue.start_local_workers(coordinator.address, b"cle-test", 1, str(tmp_path))
+        results = coordinator.map('evaluate_fleet', dataset_key, tasks)
+        first = next(results); worker.terminate(); worker.join(); t0 = time.monotonic()
+        if worker_rejoins:
+            # Le nouveau processus reprend les tâches remises en file
+            calcul_distribue.start_local_workers(coordinator.address, b"cle-test", 1, str(tmp_path))
+            assert [first] + list(results) == [dimensionnement_flotte.evaluate_fleet(task[0], *network, *task[1:]) for task in tasks]
+        else:
+            with pytest.raises(TimeoutError, match="Aucun processus de calcul"): list(results)
+            assert time.monotonic() - t0 < 30 and coordinator.n_workers == 0
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.pkl')] and not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
@@ -0,0 +1,39 @@
+# Fichier : tests/test_dimensionnement_flotte.py
+# Saturation de la flotte et plus petite flotte satisfaisant la demande.
+
+import pytest
+
+import dimensionnement_flotte
+from outils import NETWORKS, make_network
+
+SUMMARY = ('profit', 'all_demand_met', 'days_taken_simulation_loop')
+
+@pytest.fixture(scope='module', params=list(NETWORKS))
+def network(request):
+    return make_network(*NETWORKS[request.param])
+
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_fleets_above_peak_give_same_results(network, heuristic):
+    saturated = dimensionnement_flotte.evaluate_fleet(heuristic, *network, None, None, 5000)
+    peak = saturated['peak_wagons_in_transit']
+    assert peak < 5000
+    for num_wagons in (peak, peak + 1, 2 * peak, 4999):
+        summary = dimensionnement_flotte.evaluate_fleet(heuristic, *network, None, None, num_wagons)
+        assert [summary[field] for field in SUMMARY] == [saturated[field] for field in SUMMARY]
+
+@pytest.mark.parametrize('start_wagons', [None, 1000])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_size_fleet_finds_smallest_sufficient_fleet(network, heuristic, start_wagons):
+    # Depuis 1000 wagons, la première simulation sature la flotte et la dichotomie part de sa flotte de saturation
+    sizing = dimensionnement_flotte.size_fleet(heuristic, *network, None, None, max_wagons=2000, start_wagons=start_wagons, n_workers=1)
+    fleet = sizing['min_fleet_all_demand_met']
+    if fleet is None:
+        assert not sizing['curve']['all_demand_met'].any()
+    else:
+        assert dimensionnement_flotte.evaluate_fleet(heuristic, *network, None, None, fleet)['all_demand_met']
+        assert fleet == 1 or not dimensionnement_flotte.evaluate_fleet(heuristic, *network, None, None, fleet - 1)['all_demand_met']
+    curve = sizing['curve']
+    assert curve['num_wagons'].is_monotonic_increasing and sizing['evaluations'] <= len(curve)
+    for row in curve.itertuples():
+        summary = dimensionnement_flotte.evaluate_fleet(heuristic, *network, None, None, row.num_wagons)
+        assert (summary['profit'], summary['all_demand_met']) == (row.profit, row.all_demand_met)
@@ -0,0 +1,57 @@
+# Fichier : tests/test_ingestion.py
+# Nettoyage numérique, validation et instantané Parquet du chargement commun des CSV.
+
+import os
+
+import pandas as pd
+import pytest
+
+import ingestion
+
+RELATIONS = "origin,destination,distance_km,profitability\nO1,D1,\"1 250,5\",1\nO2 ,D1,300,0\nO1,D2,0,1\n"
+ORIGINS = "id,daily_loading_capacity_tons,initial_available_product_tons\nO1,\"1 000\",\"12 500,25\"\nO2,400,800\n"
+DESTINATIONS = "id,daily_unloading_capacity_tons,annual_demand_tons\nD1,500,\"3 000\"\nD2,\"250,5\",1000\n"
+
+def _write(directory, relations=RELATIONS, origins=ORIGINS, destinations=DESTINATIONS):
+    paths = []
+    for table, text in zip(ingestion.TABLES, (relations, origins, destinations)):
+        path = os.path.join(directory, f"{table}.csv"); paths.append(path)
+        with open(path, 'w', encoding='utf-8') as f: f.write(text)
+    return paths
+
+def test_numeric_columns_accept_thousands_separators_and_decimal_comma():
+    series = pd.Series(['1 250,5', '1 000', '12 500,25', '300', ' 7,0 '])
+    assert ingestion.parse_numeric_column(series, 'relations', 'distance_km').tolist() == [1250.5, 1000.0, 12500.25, 300.0, 7.0]
+    assert ingestion.parse_numeric_column(pd.Series(['0', '1', '1']), 'relations', 'profitability').dtype == int
+    with pytest.raises(ingestion.IngestionError): ingestion.parse_numeric_column(pd.Series(['12', 'douze']), 'relations', 'distance_km')
+    with pytest.raises(ingestion.IngestionError): ingestion.parse_numeric_column(pd.Series(['1', '0,5']), 'relations', 'profitability')
+
+def test_load_network_cleans_tables(tmp_path):
+    relations_df, origins_df, destinations_df = ingestion.load_network(*_write(str(tmp_path)), strict=True)
+    assert relations_df['distance_km'].tolist() == [1250.5, 300.0, 0.0] and relations_df['origin'].tolist() == ['O1', 'O2', 'O1']
+    assert isinstance(relations_df['origin'].dtype, pd.CategoricalDtype)
+    assert origins_df.loc['O1', 'initial_available_product_tons'] == 12500.25 and destinations_df.loc['D2', 'daily_unloading_capacity_tons'] == 250.5
+
+def test_missing_column_duplicate_id_and_unknown_relation_are_rejected(tmp_path):
+    with pytest.raises(ingestion.IngestionError, match='annual_demand_tons'):
+        ingestion.load_network(*_write(str(tmp_path), destinations="id,daily_unloading_capacity_tons\nD1,500\n"))
+    duplicated = _write(str(tmp_path), origins=ORIGINS + "O2,10,10\n")
+    assert any('double' in message for message in ingestion.validate_network(*ingestion.load_network(*duplicated)))
+    with pytest.raises(ingestion.IngestionError, match='double'): ingestion.load_network(*duplicated, strict=True)
+    with pytest.raises(ingestion.IngestionError, match='inconnue'): ingestion.load_network(*_write(str(tmp_path), relations=RELATIONS + "O9,D1,300,1\n"), strict=True)
+
+def test_second_load_reads_snapshot(tmp_path, monkeypatch):
+    paths = _write(str(tmp_path)); cache_dir = str(tmp_path / 'cache')
+    expected = ingestion.load_network(*paths, cache_dir=cache_dir)
+    assert len([name for name in os.listdir(cache_dir) if name.endswith('.parquet')]) == len(ingestion.TABLES)
+    assert not [name for name in os.listdir(cache_dir) if name.endswith('.tmp')]
+    monkeypatch.setattr(ingestion.pd, 'read_csv', lambda *args, **kwargs: pytest.fail("CSV relu malgré l'instantané"))
+    for expected_df, actual_df in zip(expected, ingestion.load_network(*paths, cache_dir=cache_dir)):
+        pd.testing.assert_frame_equal(actual_df, expected_df)
+
+def test_changed_source_invalidates_snapshot(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    _, origins_df, _ = ingestion.load_network(*_write(str(tmp_path)), cache_dir=cache_dir)
+    assert origins_df.loc['O2', 'initial_available_product_tons'] == 800.0
+    _, origins_df, _ = ingestion.load_network(*_write(str(tmp_path), origins=ORIGINS.replace('400,800', '400,900')), cache_dir=cache_dir)
+    assert origins_df.loc['O2', 'initial_available_product_tons'] == 900.0
@@ -0,0 +1,53 @@
+# Fichier : tests/test_jobs_simulation.py
+# Travaux en arrière-plan : annulation par le rappel de progression et erreurs isolées du pool.
+
+import threading
+import time
+
+import pytest
+
+import combainaisonexceldescente as sim
+import jobs_simulation
+from outils import NETWORKS, make_network
+
+TIMEOUT_S = 30
+
+@pytest.fixture(scope='module')
+def network():
+    return make_network(*NETWORKS['petit'])
+
+def _wait(job):
+    for _ in range(TIMEOUT_S * 100):
+        if job.finished: return job
+        time.sleep(0.01)
+    pytest.fail(f"Travail {job.job_id} toujours {job.status}")
+
+def test_cancelled_job_stops_at_next_progress_report(network):
+    manager = jobs_simulation.JobManager(max_workers=1); started = threading.Event(); cancel_sent = threading.Event(); reported = []; raised = []
+    def simulate(progress=None):
+        def report(done, total, stage):
+            reported.append(done); started.set(); cancel_sent.wait(TIMEOUT_S)
+            try: progress(done, total, stage)
+            except sim.SimulationCancelled: raised.append(done); raise
+        return sim.run_simulation_h1(*network, None, None, 30, True, progress=report)
+    job = manager.submit("Simulation", simulate)
+    assert started.wait(TIMEOUT_S) and job.status == jobs_simulation.JOB_RUNNING
+    job.cancel(); cancel_sent.set(); _wait(job)
+    assert job.status == jobs_simulation.JOB_CANCELLED and job.result is None and job.error is None and raised == reported == reported[:1]
+
+def test_job_cancelled_before_start_never_runs():
+    manager = jobs_simulation.JobManager(max_workers=1); release = threading.Event(); calls = []
+    blocking = manager.submit("Bloquant", lambda progress=None: release.wait(TIMEOUT_S))
+    queued = manager.submit("En attente", lambda progress=None: calls.append(1)); queued.cancel(); release.set()
+    assert _wait(blocking).status == jobs_simulation.JOB_DONE
+    assert _wait(queued).status == jobs_simulation.JOB_CANCELLED and not calls
+
+def test_failed_job_keeps_pool_running(network):
+    def fail(progress=None):
+        progress(1, 2, "Avant l'erreur"); raise ValueError("Configuration invalide")
+    manager = jobs_simulation.JobManager(max_workers=1)
+    failing = manager.submit("Erreur", fail)
+    following = manager.submit("Suivant", jobs_simulation.planner_job, *network, 30)
+    assert _wait(failing).status == jobs_simulation.JOB_FAILED and failing.result is None and 'Configuration invalide' in failing.error
+    assert _wait(following).status == jobs_simulation.JOB_DONE and following.progress == 1.0 and 'planner' in following.result
+    assert manager.get(failing.job_id) is failing
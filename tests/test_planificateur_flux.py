@@ -0,0 +1,20 @@
+# Fichier : tests/test_planificateur_flux.py
+# Borne supérieure du programme linéaire et indicateur de convergence.
+
+import combainaisonexceldescente as sim
+import planificateur_flux
+from outils import NETWORKS, make_network
+
+def test_bound_dominates_simulations():
+    network = make_network(*NETWORKS['petit'])
+    plan = planificateur_flux.plan_network_flow(*network, num_wagons=30)
+    planner = plan['planner']
+    for run_simulation in (sim.run_simulation_h1, sim.run_simulation_h2):
+        assert run_simulation(*network, None, None, 30, True)['profit'] <= planner['upper_bound']
+    assert plan['profit'] <= planner['upper_bound']
+    assert planner['converged'] and planner['max_violation'] <= planificateur_flux.DEFAULT_TOLERANCE
+
+def test_iteration_budget_reports_non_convergence():
+    network = make_network(*NETWORKS['petit'])
+    planner = planificateur_flux.plan_network_flow(*network, num_wagons=30, max_iterations=100)['planner']
+    assert planner['iterations'] == 100 and not planner['converged']
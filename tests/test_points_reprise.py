@@ -0,0 +1,57 @@
+# Fichier : tests/test_points_reprise.py
+# Points de reprise sur disque : une branche sans modification rejoue la simulation d'origine.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import combainaisonexceldescente as sim
+import points_reprise
+from outils import NETWORKS, assert_same_results, make_network
+
+CHECKPOINT_DAYS = [1, 2, 5, 9, 17, 40, 120]
+
+@pytest.fixture(scope='module')
+def network():
+    return make_network(*NETWORKS['petit'])
+
+@pytest.mark.parametrize('heuristic, qmin, phase2, num_wagons', [('h1', None, None, 30), ('h1', ('annual_demand_tons', True), ('min_distance_km', True), 3),
+                                                                 ('h2', None, None, 3), ('h2', ['D0003', 'D0001'], ['D0002', 'D0010', 'D0004'], 30)])
+def test_branch_without_changes_replays_run(network, tmp_path, heuristic, qmin, phase2, num_wagons):
+    results = points_reprise.simulate_with_checkpoints(heuristic, *network, qmin, phase2, num_wagons, CHECKPOINT_DAYS, str(tmp_path))
+    run_simulation = sim.run_simulation_h1 if heuristic == 'h1' else sim.run_simulation_h2
+    assert_same_results(run_simulation(*network, qmin, phase2, num_wagons, True), results)
+    assert results['checkpoints'] and set(results['checkpoints']) <= set(CHECKPOINT_DAYS)
+    for day, path in results['checkpoints'].items():
+        branch = points_reprise.branch_from_checkpoint(path, *network)
+        assert_same_results(results, branch)
+        assert branch['branch']['from_day'] == day
+
+def test_branch_changes_match_in_memory_restore(network, tmp_path):
+    results = points_reprise.simulate_with_checkpoints('h1', *network, None, None, 3, [9], str(tmp_path))
+    branch = points_reprise.branch_from_checkpoint(results['checkpoints'][9], *network, extra_wagons=20, dest_unload_caps={'D0001': 150.0})
+    engine = sim.SimulationEngine('h1', *network, None, None, 3, checkpoint_days=[9]).run()
+    resumed = sim.SimulationEngine('h1', *network, None, None, 3).restore(engine.checkpoints[9])
+    resumed.state.fleet.available += 20
+    slot = resumed.state.dest_slot['D0001']; resumed.state.dest_unload_cap[slot] = 150.0
+    resumed.state.dest_unload_remaining[slot] = min(resumed.state.dest_unload_remaining[slot], 150.0)
+    assert_same_results(resumed.run().results(network[0]), branch)
+    assert branch['profit'] != results['profit']
+
+def test_branch_rejects_other_data(network, tmp_path):
+    results = points_reprise.simulate_with_checkpoints('h2', *network, None, None, 30, [5], str(tmp_path))
+    relations_df, origins_df, destinations_df = network
+    other_origins = origins_df.copy(); other_origins.iloc[0, 0] += 50
+    with pytest.raises(ValueError): points_reprise.branch_from_checkpoint(results['checkpoints'][5], relations_df, other_origins, destinations_df)
+    with pytest.raises(ValueError): points_reprise.branch_from_checkpoint(results['checkpoints'][5], *network, extra_wagons=-10 ** 6)
+    with pytest.raises(ValueError): points_reprise.branch_from_checkpoint(results['checkpoints'][5], *network, origin_load_caps={'OX': 100.0})
+
+def test_concurrent_saves_of_same_checkpoint(network, tmp_path):
+    engine = sim.SimulationEngine('h2', *network, None, None, 30, checkpoint_days=[5]).run(); path = str(tmp_path / 'jour005.npz')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(lambda _: points_reprise.save_checkpoint(path, engine.checkpoints[5], {'heuristic': 'h2'}), range(8))) == [path] * 8
+    assert os.listdir(tmp_path) == ['jour005.npz']
+    checkpoint, header = points_reprise.load_checkpoint(path, network[1], network[2])
+    resumed = sim.SimulationEngine('h2', *network, None, None, 30).restore(checkpoint).run()
+    assert header['heuristic'] == 'h2' and resumed.results(network[0])['profit'] == engine.results(network[0])['profit']
@@ -0,0 +1,209 @@
+# Fichier : tests/test_simulation.py
+# Le moteur optimisé doit reproduire exactement le moteur d'origine (tests/baseline_simulation.py).
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline_simulation
+import combainaisonexceldescente as sim
+from outils import NETWORKS, assert_same_results, make_network
+
+def _orders(destinations_df, seed=7):
+    order = list(np.random.default_rng(seed).permutation(destinations_df.index)) + ['DX']  # Destination inconnue : ignorée
+    return order, order[:len(order) // 2] + [order[0]]
+
+def _cases():
+    cases = []
+    for network in NETWORKS:
+        _, _, destinations_df = make_network(*NETWORKS[network]); order, partial = _orders(destinations_df)
+        h1_configs = [(None, None), (('q_min_initial_target_tons', False), ('annual_demand_tons', False)),
+                      (('remaining_annual_demand_tons', False), ('remaining_annual_demand_tons', True)),
+                      (('custom_order', order), ('custom_order', partial)), (('min_distance_km', True), ('custom_order', order))]
+        cases += [(network, 'h1', qmin, phase2, 30) for qmin, phase2 in h1_configs]
+        cases += [(network, 'h2', qmin, phase2, 30) for qmin, phase2 in [(None, None), (order, partial), (partial, order)]]
+        cases += [(network, heuristic, None, None, num_wagons) for heuristic in ('h1', 'h2') for num_wagons in ((3, 300) if network == 'petit' else (300,))]
+    return cases
+
+@pytest.fixture(scope='module')
+def networks():
+    return {network: make_network(*parameters) for network, parameters in NETWORKS.items()}
+
+def _run(module, heuristic, network, qmin, phase2, num_wagons):
+    run_simulation = module.run_simulation_h1 if heuristic == 'h1' else module.run_simulation_h2
+    return run_simulation(*network, qmin, phase2, num_wagons, True)
+
+@pytest.mark.parametrize('network, heuristic, qmin, phase2, num_wagons', _cases())
+def test_same_results_as_baseline(networks, network, heuristic, qmin, phase2, num_wagons):
+    expected = _run(baseline_simulation, heuristic, networks[network], qmin, phase2, num_wagons)
+    assert_same_results(expected, _run(sim, heuristic, networks[network], qmin, phase2, num_wagons))
+
+# --- Reprise d'une simulation et voisins par échange ---
+def _engine(heuristic, network, qmin, phase2, num_wagons, **options):
+    return sim.SimulationEngine(heuristic, *network, qmin, phase2, num_wagons, **options)
+
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_restored_engine_finishes_like_uninterrupted_run(networks, heuristic):
+    network = networks['petit']; relations_df = network[0]
+    reference = _engine(heuristic, network, None, None, 30, record_checkpoints=True).run()
+    expected = reference.results(relations_df)
+    for day in sorted(reference.checkpoints)[::7]:
+        resumed = _engine(heuristic, network, None, None, 30).restore(reference.checkpoints[day]).run()
+        assert_same_results(expected, resumed.results(relations_df))
+
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+@pytest.mark.parametrize('network', list(NETWORKS))
+def test_swap_neighbors_resumed_from_shared_prefix(networks, heuristic, network):
+    order, _ = _orders(networks[network][2]); order = order[:-1]
+    wrap = (lambda o: ('custom_order', o)) if heuristic == 'h1' else (lambda o: o)
+    neighbors = sim.generate_custom_order_neighbors(order)
+    for phase, base_configs, neighbor_configs in [('qmin', (wrap(order), wrap(order)), [(wrap(n), wrap(order)) for n in neighbors]),
+                                                 ('phase2', (wrap(order), wrap(order)), [(wrap(order), wrap(n)) for n in neighbors])]:
+        with sim.NeighborEvaluator(heuristic, *networks[network], 30, share_prefix=True) as shared, \
+             sim.NeighborEvaluator(heuristic, *networks[network], 30, share_prefix=False) as independent:
+            assert shared.swap_neighbor_profits(base_configs, phase, order, neighbor_configs) == independent.swap_neighbor_profits(base_configs, phase, order, neighbor_configs)
+
+# --- Simulation groupée ---
+@pytest.mark.parametrize('network', list(NETWORKS))
+def test_batch_matches_individual_runs(networks, network):
+    order, partial = _orders(networks[network][2])
+    scenarios = [('h1', None, None, 30), ('h1', ('custom_order', order), ('custom_order', partial), 3), ('h2', None, None, 300),
+                 ('h2', partial, order, 30), ('h1', ('annual_demand_tons', True), ('min_distance_km', True), 300)]
+    for (heuristic, qmin, phase2, num_wagons), results in zip(scenarios, sim.run_simulation_batch(*networks[network], scenarios)):
+        assert_same_results(_run(sim, heuristic, networks[network], qmin, phase2, num_wagons), results)
+
+# --- Jours sautés ---
+@pytest.mark.parametrize('num_wagons', [3, 30])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+@pytest.mark.parametrize('network', list(NETWORKS))
+def test_event_driven_run_matches_day_by_day_run(networks, network, heuristic, num_wagons):
+    relations_df = networks[network][0]
+    day_by_day = _engine(heuristic, networks[network], None, None, num_wagons, event_driven=False).run()
+    event_driven = _engine(heuristic, networks[network], None, None, num_wagons).run()
+    assert_same_results(day_by_day.results(relations_df), event_driven.results(relations_df))
+    assert event_driven.days_simulated < day_by_day.days_simulated
+
+# --- Sélection H2 vectorisée ---
+@pytest.mark.parametrize('num_wagons', [3, 30])
+@pytest.mark.parametrize('network', list(NETWORKS))
+def test_vectorized_h2_selection_breaks_ties_like_loop(networks, monkeypatch, network, num_wagons):
+    # Égalités de stocks, de demandes et de distances : argmax doit retenir la même origine que `>` strict
+    order, partial = _orders(networks[network][2])
+    monkeypatch.setattr(sim, 'VECTORIZED_SELECTION_MIN_DEGREE', 10 ** 9)
+    loop = [_run(sim, 'h2', networks[network], qmin, phase2, num_wagons) for qmin, phase2 in [(None, None), (order, partial)]]
+    monkeypatch.setattr(sim, 'VECTORIZED_SELECTION_MIN_DEGREE', 0)
+    vectorized = [_run(sim, 'h2', networks[network], qmin, phase2, num_wagons) for qmin, phase2 in [(None, None), (order, partial)]]
+    for expected, actual in zip(loop, vectorized): assert_same_results(expected, actual)
+
+# --- Mode lean des optimiseurs ---
+@pytest.mark.parametrize('network, heuristic, qmin, phase2, num_wagons', _cases())
+def test_lean_run_reports_same_profit(networks, network, heuristic, qmin, phase2, num_wagons):
+    full = _run(sim, heuristic, networks[network], qmin, phase2, num_wagons)
+    lean = _engine(heuristic, networks[network], qmin, phase2, num_wagons, lean=True).run().results(networks[network][0])
+    assert set(lean) == {'profit', 'all_demand_met', 'days_taken_simulation_loop'}
+    assert (lean['profit'], lean['all_demand_met'], lean['days_taken_simulation_loop']) == (full['profit'], full['all_demand_met'], full['days_taken_simulation_loop'])
+
+# --- Journal des expéditions écrit sur disque ---
+@pytest.mark.parametrize('extension', ['parquet', 'csv'])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_spilled_shipments_match_in_memory_log(networks, tmp_path, heuristic, extension):
+    network = networks['petit']; expected = _engine(heuristic, network, None, None, 30).run().results(network[0])
+    engine = _engine(heuristic, network, None, None, 30, shipments_spill_path=str(tmp_path / f"expeditions.{extension}"))
+    log = engine.state.tracking_vars['shipments_log']; log.chunk_rows = 5
+    spilled = engine.run().results(network[0])
+    assert log.spilled_rows and log.spilled_rows < len(log)
+    pd.testing.assert_frame_equal(spilled['shipments_df'], expected['shipments_df'])
+    assert_same_results(expected, spilled)
+
+@pytest.mark.parametrize('extension', ['parquet', 'csv'])
+def test_spilled_recorder_keeps_types_in_first_seen_order(tmp_path, extension):
+    in_memory = sim.ShipmentRecorder(['O1', 'O2'], ['D1', 'D2'])
+    spilled = sim.ShipmentRecorder(['O1', 'O2'], ['D1', 'D2'], str(tmp_path / f"expeditions.{extension}"), chunk_rows=2)
+    for k in range(5):
+        for recorder in (in_memory, spilled): recorder.append(k, k + 3, 1 - k % 2, k % 2, 10.5 * k, k, 'Z' if k < 2 else 'A')
+    pd.testing.assert_frame_equal(spilled.to_frame(), in_memory.to_frame())
+
+# --- Montée parallèle ---
+@pytest.mark.parametrize('share_prefix', [True, False])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_hill_climbing_with_pool_finds_same_configs(networks, heuristic, share_prefix):
+    network = networks['petit']; order, partial = _orders(network[2]); order = order[:-1]
+    if heuristic == 'h1': climb = sim.hill_climbing_maximizer_h1; configs = (('custom_order', order), ('custom_order', partial))
+    else: climb = sim.hill_climbing_maximizer_h2; configs = (order, partial)
+    serial, pooled = [climb(*network, *configs, 30, max_iterations=2, n_workers=n_workers, share_prefix=share_prefix) for n_workers in (1, 2)]
+    assert pooled == serial and serial[0] != configs[0]  # La montée a bien déplacé l'ordre QMIN
+
+@pytest.mark.parametrize('share_prefix', [True, False])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_evaluator_counts_configs_and_reference_runs(networks, heuristic, share_prefix):
+    network = networks['petit']; order, partial = _orders(network[2]); order = order[:-1]; reported = []; references = []
+    if heuristic == 'h1': climb = sim.hill_climbing_maximizer_h1; configs = (('custom_order', order), ('custom_order', partial))
+    else: climb = sim.hill_climbing_maximizer_h2; configs = (order, partial)
+    with sim.NeighborEvaluator(heuristic, *network, 30, share_prefix=share_prefix, progress=lambda *report: reported.append(report)) as evaluator:
+        swap_neighbor_profits = evaluator.swap_neighbor_profits
+        evaluator.swap_neighbor_profits = lambda *args: references.append(args) or swap_neighbor_profits(*args)
+        found = climb(*network, *configs, 30, max_iterations=2, evaluator=evaluator)
+    assert found == climb(*network, *configs, 30, max_iterations=2, share_prefix=share_prefix) and references
+    assert evaluator.evaluations == len(reported) + (len(references) if share_prefix else 0)
+
+# --- Recherche locale sous budget ---
+def _search(network, heuristic, strategy, **options):
+    order, partial = _orders(network[2]); order = order[:-1]
+    configs = (('custom_order', order), ('custom_order', partial)) if heuristic == 'h1' else (order, partial)
+    return sim.budgeted_order_search(heuristic, *network, *configs, 30, strategy, **options)
+
+@pytest.mark.parametrize('share_prefix', [True, False])
+@pytest.mark.parametrize('strategy', sim.SEARCH_STRATEGIES)
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_budgeted_search_respects_budget_and_reports_true_profit(networks, heuristic, strategy, share_prefix):
+    network = networks['petit']
+    for max_evaluations in (1, 2, 25):
+        result = _search(network, heuristic, strategy, max_evaluations=max_evaluations, sample_size=5, share_prefix=share_prefix)
+        assert result['evaluations'] <= max_evaluations and (result['stopped_by'] != 'budget' or result['evaluations'] == max_evaluations)
+        assert result['profit'] >= result['initial_profit']
+        assert result['profit'] == _run(sim, heuristic, network, result['qmin_config'], result['phase2_config'], 30)['profit']
+
+@pytest.mark.parametrize('strategy', ['sampled', 'annealing'])
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_budgeted_search_is_deterministic_for_a_seed(networks, heuristic, strategy):
+    first, second = [_search(networks['petit'], heuristic, strategy, max_evaluations=40, sample_size=5, seed=11) for _ in range(2)]
+    first.pop('seconds'); second.pop('seconds')
+    assert first == second and first['accepted_moves']
+
+def test_budgeted_search_rejects_unknown_strategy_or_missing_budget(networks):
+    with pytest.raises(ValueError): _search(networks['petit'], 'h2', 'random_restart', max_evaluations=10)
+    with pytest.raises(ValueError): _search(networks['petit'], 'h2', 'sampled')
+
+# --- Ordre Phase 2 tenu à jour ---
+@pytest.mark.parametrize('full_order', [lambda values: sim.sort_order(values, False), sim.open_destinations_order])
+@pytest.mark.parametrize('size', [6, 40, 300])
+def test_descending_order_matches_full_sort(full_order, size):
+    # Valeurs qui ne font que baisser, avec égalités, zéros et restes inférieurs à EPSILON
+    rng = np.random.default_rng(size); values = rng.integers(1, 50 * size, size).astype(float); values[:size // 5] = values[0]
+    full_sorts = []; order = sim.DescendingOrder(lambda values: full_sorts.append(1) or full_order(values))
+    for day in range(200):
+        expected = [k for k in full_order(values) if values[k] > sim.EPSILON]
+        assert order(values) == expected
+        changed = rng.choice(size, rng.integers(0, 4), replace=False)
+        values[changed] = np.maximum(values[changed] - rng.choice([0.5, 7.0, 300.0, values.max()], len(changed)), 0.0)
+        if day % 50 == 7: values[rng.integers(size)] = 1e-12
+    assert len(full_sorts) < 150  # Les égalités disparaissent au fil des baisses : l'ordre est alors tenu à jour sans tri complet
+
+# --- Rapport Excel ---
+@pytest.mark.parametrize('heuristic', ['h1', 'h2'])
+def test_excel_report_round_trip(networks, tmp_path, heuristic):
+    openpyxl = pytest.importorskip('openpyxl')
+    network = networks['petit']; results = _run(sim, heuristic, network, None, None, 30); path = tmp_path / 'rapport.xlsx'
+    sim.ecrire_resultats_excel(str(path), 'Synthèse', results, network[1], network[2])
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    assert workbook.sheetnames == ['Synthèse', 'Expeditions', 'Destinations', 'Origines', 'Suivi_Wagons']
+    sheets = {name: list(workbook[name].iter_rows(values_only=True)) for name in workbook.sheetnames}
+    assert dict(sheets['Synthèse'][1:])['Profit (tonnes * km)'] == results['profit']
+    shipments_df = results['shipments_df']; wagon_log = pd.DataFrame(results['final_tracking_vars']['daily_wagon_log'])
+    assert list(sheets['Expeditions'][0]) == list(shipments_df.columns) and len(sheets['Expeditions']) == len(shipments_df) + 1
+    assert [list(row) for row in sheets['Expeditions'][1:]] == shipments_df.astype(object).values.tolist()
+    assert list(sheets['Suivi_Wagons'][0]) == list(sim.WAGON_LOG_FIELDS) and len(sheets['Suivi_Wagons']) == len(wagon_log) + 1
+    assert [list(row) for row in sheets['Suivi_Wagons'][1:]] == wagon_log[list(sim.WAGON_LOG_FIELDS)].values.tolist()
+    assert len(sheets['Destinations']) == len(results['final_destinations_df']) + 1 and sheets['Destinations'][0][-1] == 'satisfaction_%'
+    assert len(sheets['Origines']) == len(results['final_origins_df']) + 1 and sheets['Origines'][0][-1] == 'stock_utilise_tons'
+    workbook.close()